@@ -93,6 +93,8 @@ hiddenimports = [
     'websockets','nacl','nacl.public','nacl.signing','nacl.bindings',
     'pyperclip','pygetwindow','pyrect',
     'anyio','starlette','nacl.utils','sniffio','llama_cpp',
+    'httpx','h2','hpack','hyperframe',  # h2 is imported lazily by httpx
+    'lxml','lxml.etree',
 ] + src_submodules
 
 for _pkg in ('gradio', 'gradio_client', 'safehttpx', 'groovy'):
@@ -0,0 +1,93 @@
+# benchmarks/common.py
+"""Helpers shared by the benchmark scripts (run from the repo root)."""
+import gc, json, os, platform, sys, time, tracemalloc, zlib
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+def parse_scales(spec: str) -> List[int]:
+    """"1k,10k,1m" -> [1000, 10000, 1000000]; plain integers pass through."""
+    out = []
+    for s in spec.split(","):
+        s = s.strip().lower()
+        if s.endswith("k"):
+            out.append(int(float(s[:-1]) * 1_000))
+        elif s.endswith("m"):
+            out.append(int(float(s[:-1]) * 1_000_000))
+        elif s:
+            out.append(int(s))
+    return out
+
+def percentile(values: List[float], p: float) -> float:
+    return float(np.percentile(np.asarray(values, dtype=np.float64), p)) if values else 0.0
+
+def latency_stats(samples_s: List[float]) -> Dict[str, float]:
+    ms = [s * 1000 for s in samples_s]
+    return {"n": len(ms), "p50_ms": percentile(ms, 50), "p99_ms": percentile(ms, 99),
+            "mean_ms": float(np.mean(ms)) if ms else 0.0, "max_ms": max(ms) if ms else 0.0}
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes.
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except Exception:
+        return 0.0
+
+def measure(fn: Callable[[], object]):
+    """Run fn once; return (result, seconds, tracemalloc peak MiB)."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        res = fn()
+    finally:
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return res, elapsed, peak / (1024 * 1024)
+
+class StubEmbedder:
+    """Deterministic hashing-trick embedder with the SentenceTransformer encode() shape.
+
+    Each token is hashed (crc32) to a fixed random unit direction, so texts that
+    share words get similar vectors. No model download, no torch, and vectors are
+    identical across runs and machines.
+    """
+
+    def __init__(self, dim: int = 384, seed: int = 0):
+        self.dim, self.seed = dim, seed
+        self._dirs: Dict[int, np.ndarray] = {}
+
+    def _dir(self, h: int) -> np.ndarray:
+        v = self._dirs.get(h)
+        if v is None:
+            v = np.random.default_rng((self.seed << 32) ^ h).standard_normal(self.dim).astype(np.float32)
+            self._dirs[h] = v
+        return v
+
+    def encode(self, texts, normalize_embeddings: bool = True, **_kw) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for tok in t.lower().split():
+                out[i] += self._dir(zlib.crc32(tok.encode()) & 0xFFFF)
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.where(norms == 0, 1, norms)
+        return out
+
+def load_real_embedder(model_name: str):
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+def environment() -> Dict[str, str]:
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "cpu_count": str(os.cpu_count())}
+
+def write_report(path: str, report: dict):
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {p}")
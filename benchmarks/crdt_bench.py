@@ -0,0 +1,129 @@
+# benchmarks/crdt_bench.py
+"""Benchmark for applying replicated CRDT ops to the fact graph.
+
+Builds a base graph, then applies a deterministic stream of peer ops (new
+relations, newer updates, stale updates, a few removals and malformed ops)
+three ways, each on a fresh copy of the base database:
+
+  batch    LWWGraph.apply_ops in chunks of --chunk (what SyncService does)
+  per_op   LWWGraph.apply_op once per op (the old _on_ops loop)
+  legacy   INSERT OR REPLACE + commit per op on a plain connection, as the
+           store did before the write queue (capped at --legacy-max ops)
+
+Times are until the writes are durable (writer flushed), and the number of
+write transactions is reported alongside.
+
+    python -m benchmarks.crdt_bench                       # 100k ops on a 100k graph
+    python -m benchmarks.crdt_bench --ops 10k --base 10k --out data/bench/crdt.json
+"""
+import argparse, os, shutil, sqlite3, tempfile, time
+
+import numpy as np
+
+from .common import environment, parse_scales, write_report
+from .graph_bench import build_db, synthetic_relations
+from src.memory.graph_crdt import LWWGraph
+from src.utils.db import configure_sqlite
+from src.utils.db_writer import close_all_writers
+
+ORIGIN = "bench-peer"
+
+def synthetic_ops(base, n: int, seed: int):
+    """n ops: 60% new, 22% newer updates, 10% stale, 5% removals, 3% malformed."""
+    rng = np.random.default_rng(seed)
+    fresh = iter(synthetic_relations(n, seed + 7))
+    ops, seq = [], 0
+    for kind in rng.choice(5, n, p=[0.60, 0.22, 0.10, 0.05, 0.03]).tolist():
+        if kind == 4:
+            ops.append([{"op": "upsert_relation", "src": "x", "rel": "y"},
+                        {"op": "upsert_relation", "src": "x", "rel": "y", "dst": "z", "ts": "soon"},
+                        {"op": "merge_everything"}][int(rng.integers(0, 3))])
+            continue
+        if kind == 0:
+            s, r, d, ts = next(fresh)
+            s, d = "new_" + s, "new_" + d
+        else:
+            s, r, d, ts = base[int(rng.integers(0, len(base)))]
+            ts = ts - 1e6 if kind == 2 else ts + 1e6
+        seq += 1
+        ops.append({"op": "remove_relation" if kind == 3 else "upsert_relation",
+                    "src": s, "rel": r, "dst": d, "ts": ts, "origin": ORIGIN, "seq": seq})
+    return ops
+
+def run_graph(path: str, ops, chunk: int) -> dict:
+    graph = LWWGraph(path)
+    len(graph)  # load outside the timed region
+    writer = graph.db.writer
+    batches0 = writer.batches
+    counts = {"applied": 0, "stale": 0, "invalid": 0}
+    t = time.perf_counter()
+    # chunk=1 is the per-op path: apply_op is apply_ops([op]).
+    for i in range(0, len(ops), chunk):
+        for k, v in graph.apply_ops(ops[i:i + chunk]).items():
+            counts[k] += v
+    applied_s = time.perf_counter() - t
+    graph.db.flush()
+    total_s = time.perf_counter() - t
+    res = {"ops": len(ops), "apply_s": applied_s, "durable_s": total_s, "ops_per_s": len(ops) / total_s,
+           "transactions": writer.batches - batches0, "live_relations": len(graph), "counts": counts}
+    graph.db.close()
+    close_all_writers()
+    return res
+
+def run_legacy(path: str, ops) -> dict:
+    conn = sqlite3.connect(path)
+    configure_sqlite(conn)
+    t = time.perf_counter()
+    for op in ops:
+        if "dst" not in op or not isinstance(op.get("ts"), float):
+            continue
+        row = conn.execute("SELECT ts FROM relations WHERE key=?", (f"{op['src']}|{op['rel']}|{op['dst']}",)).fetchone()
+        if row is None or op["ts"] > row[0]:
+            conn.execute("INSERT OR REPLACE INTO relations (key, src, rel, dst, ts) VALUES (?, ?, ?, ?, ?)",
+                         (f"{op['src']}|{op['rel']}|{op['dst']}", op["src"], op["rel"], op["dst"], op["ts"]))
+            conn.commit()
+    total_s = time.perf_counter() - t
+    conn.close()
+    return {"ops": len(ops), "durable_s": total_s, "ops_per_s": len(ops) / total_s}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--ops", default="100k", help="number of ops (10k, 100k, ...)")
+    ap.add_argument("--base", default="100k", help="relations in the graph before the ops arrive")
+    ap.add_argument("--chunk", type=int, default=500, help="ops per apply_ops call (one sync message)")
+    ap.add_argument("--legacy-max", type=int, default=5_000, help="ops to time on the commit-per-op path")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--workdir", default=None, help="where to build the databases (default: temp dir, removed afterwards)")
+    ap.add_argument("--out", default="data/bench/crdt.json")
+    args = ap.parse_args()
+
+    n_ops, n_base = parse_scales(args.ops)[0], parse_scales(args.base)[0]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="aegis-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    report = {"benchmark": "crdt", "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "env": environment(), "params": vars(args), "results": {}}
+    try:
+        base = synthetic_relations(n_base, args.seed)
+        base_path = os.path.join(workdir, "base.db")
+        build_db(base_path, base)
+        LWWGraph(base_path).db.close()  # one-time migration, not timed below
+        close_all_writers()
+        ops = synthetic_ops(base, n_ops, args.seed + 1)
+        print(f"{n_ops} ops onto {n_base} relations ...")
+        for name, chunk in (("batch", args.chunk), ("per_op", 1)):
+            path = os.path.join(workdir, f"{name}.db")
+            shutil.copy(base_path, path)
+            res = report["results"][name] = run_graph(path, ops, chunk)
+            print(f"  {name:7s} {res['durable_s']:.2f} s ({res['ops_per_s']:,.0f} ops/s), "
+                  f"{res['transactions']} transactions, {res['counts']}")
+        path = os.path.join(workdir, "legacy.db")
+        shutil.copy(base_path, path)
+        res = report["results"]["legacy"] = run_legacy(path, ops[:args.legacy_max])
+        print(f"  legacy  {res['durable_s']:.2f} s for {res['ops']} ops ({res['ops_per_s']:,.0f} ops/s)")
+        write_report(args.out, report)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
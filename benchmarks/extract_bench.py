@@ -0,0 +1,149 @@
+# benchmarks/extract_bench.py
+"""Benchmark for HTML-to-text extraction (what fetch_url keeps of a page).
+
+Runs every extractor over a corpus of saved HTML pages and reports time per
+page and the quality of the kept text against the page's main content:
+
+  legacy        BeautifulSoup(html.parser), drop script/style/nav/footer/aside,
+                whole-page text cut to --max-chars (the old fetch_text)
+  html.parser   internet.extract.extract_text on the stdlib parser
+  lxml          the same on lxml's C parser (when installed)
+
+Quality is a bag-of-words overlap with the main content: precision is the
+share of kept words that belong to it, recall the share of its first
+--max-chars characters that were kept.
+
+By default the corpus is generated: news/blog/docs-style pages with menus,
+cookie banners, teaser rails, comment threads, big inline scripts and footers
+around an article whose text is known; every 20th page is a long docs-style
+page (400 paragraphs). With --corpus DIR every DIR/*.html is
+used, scored against DIR/<name>.txt when that file exists (timed only
+otherwise).
+
+    python -m benchmarks.extract_bench
+    python -m benchmarks.extract_bench --corpus saved_pages/ --out data/bench/extract.json
+"""
+import argparse, glob, os, random, re, time
+from collections import Counter
+
+from .common import environment, latency_stats, write_report
+from src.internet.extract import PARSERS, extract_text
+
+_WORD = re.compile(r"\w+")
+_ARTICLE_WORDS = [f"{a}{b}" for a in ("ana", "bel", "cor", "dam", "eri", "fol", "gar", "hes", "ilo", "jun", "kav", "lum",
+                                      "mor", "nev", "ost", "pra", "qui", "res", "sil", "tor")
+                  for b in ("", "a", "en", "is", "ity", "ous", "ment", "ing", "al", "ed")]
+_BOILER_WORDS = ["home", "news", "sport", "login", "subscribe", "share", "tweet", "cookies", "accept", "privacy",
+                 "terms", "contact", "careers", "advertise", "trending", "popular", "sponsored", "reply", "menu",
+                 "search", "newsletter", "copyright", "settings", "follow", "weather", "markets", "video", "podcasts"]
+# Class names real sites use for the article body, some with no hint at all.
+_BODY_CLASSES = ["story-body", "post-content", "entry-content", "article__body", "c-8f3a", "", "content main", "rich-text"]
+_RAIL_CLASSES = ["rail", "sidebar", "col-right", "c-91bd", "more-stories"]
+
+def _sentence(rng: random.Random, words, lo=8, hi=24, commas=True) -> str:
+    w = rng.choices(words, k=rng.randint(lo, hi))
+    if commas:
+        for i in range(3, len(w) - 2, rng.randint(4, 9)):
+            w[i] += ","
+    return " ".join(w).capitalize() + "."
+
+def synthetic_page(i: int):
+    """(html, main text) for page i."""
+    rng = random.Random(i)
+    boiler = lambda lo=2, hi=6: " ".join(rng.choices(_BOILER_WORDS, k=rng.randint(lo, hi))).title()
+    title = _sentence(rng, _ARTICLE_WORDS, 4, 9, commas=False)[:-1]
+    # Every 20th page is a long reference/docs page.
+    n_paras = 400 if i % 20 == 19 else rng.randint(3, 30)
+    paras = [" ".join(_sentence(rng, _ARTICLE_WORDS) for _ in range(rng.randint(2, 6))) for _ in range(n_paras)]
+    icon = '<span class="icon"><svg viewBox="0 0 24 24"><path d="M12 2L2 7l10 5 10-5-10-5z"/><path d="M2 17l10 5 10-5"/></svg></span>'
+    links = lambda n: "".join(f'<li class="nav-item"><a href="/{rng.randint(0, 9999)}">{icon}<span>{boiler(1, 3)}</span></a></li>'
+                              for _ in range(n))
+    teasers = "".join(f'<div class="teaser"><a href="/t{j}"><h3>{boiler(3, 6)}</h3></a><p>{boiler(12, 30)}.</p></div>'
+                      for j in range(rng.randint(3, 12)))
+    comments = "".join(f'<div class="comment"><p>{boiler(10, 40)}, {boiler(5, 15)}.</p><a href="#r">Reply</a></div>'
+                       for _ in range(rng.randint(0, 25)))
+    script = "<script>window.__STATE__=" + "{" + ",".join(f'"k{j}":"{boiler(3, 8)}"' for j in range(rng.randint(100, 3000))) + "}</script>"
+    menu = f'<div class="{rng.choice(["menu", "c-00a1", "topbar"])}"><ul>{links(rng.randint(10, 80))}</ul></div>'
+    body_cls = rng.choice(_BODY_CLASSES)
+    article = f'<h1>{title}</h1><div class="byline">By {boiler(2, 3)}</div>' + "".join(f"<p>{p}</p>" for p in paras)
+    article = rng.choice([f'<article><div class="{body_cls}">{article}</div></article>',
+                          f'<div class="{body_cls}">{article}</div>',
+                          f'<div id="main"><div class="{body_cls}">{article}</div></div>'])
+    html = (f"<!DOCTYPE html><html><head><title>{title} | {boiler(1, 2)}</title>{script}<style>.a{{color:red}}</style></head><body>"
+            f'<div class="cookie-banner"><p>{boiler(20, 40)}.</p><button>Accept</button></div>'
+            f'<header>{menu}</header><div class="wrap">{article}'
+            f'<div class="{rng.choice(_RAIL_CLASSES)}">{teasers}</div></div>'
+            f'<div id="comments">{comments}</div>'
+            f'<div class="site-footer"><ul>{links(rng.randint(10, 60))}</ul><p>{boiler(10, 20)}.</p></div></body></html>')
+    return html, title + " " + " ".join(paras)
+
+def legacy_extract(html: str, max_chars: int) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    for t in soup(["script", "style", "noscript", "nav", "footer", "aside"]): t.decompose()
+    text = " ".join(soup.get_text(" ").split())
+    return text[:max_chars]
+
+def quality(kept: str, truth: str, max_chars: int):
+    k = Counter(_WORD.findall(kept.lower()))
+    t = Counter(_WORD.findall(truth.lower()))
+    head = Counter(_WORD.findall(truth[:max_chars].lower()))
+    n_kept, n_head = sum(k.values()), sum(head.values())
+    precision = sum((k & t).values()) / n_kept if n_kept else 0.0
+    recall = sum((k & head).values()) / n_head if n_head else 0.0
+    return precision, recall
+
+def load_corpus(args):
+    if not args.corpus:
+        return [synthetic_page(i) for i in range(args.pages)]
+    pages = []
+    for path in sorted(glob.glob(os.path.join(args.corpus, "*.html")))[:args.pages or None]:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        truth_path = path[:-5] + ".txt"
+        truth = open(truth_path, encoding="utf-8", errors="replace").read() if os.path.exists(truth_path) else None
+        pages.append((html, truth))
+    return pages
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", default=None, help="directory of saved *.html pages (optional *.txt main text beside them)")
+    ap.add_argument("--pages", type=int, default=200, help="synthetic pages to generate (or max pages read from --corpus)")
+    ap.add_argument("--max-chars", type=int, default=9000)
+    ap.add_argument("--out", default="data/bench/extract.json")
+    args = ap.parse_args()
+
+    pages = load_corpus(args)
+    mb = sum(len(h) for h, _ in pages) / 1e6
+    extractors = {"legacy": legacy_extract}
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        extractors.pop("legacy")
+        print("bs4 not installed: skipping the legacy extractor")
+    for name in PARSERS:
+        extractors[name] = lambda html, n, _p=name: extract_text(html, n, parser=_p)
+
+    report = {"benchmark": "extract", "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "env": environment(),
+              "params": {**vars(args), "pages": len(pages), "corpus_mb": mb}, "results": {}}
+    print(f"{len(pages)} pages, {mb:.1f} MB of HTML ...")
+    for name, fn in extractors.items():
+        samples, prec, rec, kept_chars = [], [], [], 0
+        for html, truth in pages:
+            t = time.perf_counter()
+            kept = fn(html, args.max_chars)
+            samples.append(time.perf_counter() - t)
+            kept_chars += len(kept)
+            if truth is not None:
+                p, r = quality(kept, truth, args.max_chars)
+                prec.append(p); rec.append(r)
+        res = report["results"][name] = {
+            "latency": latency_stats(samples), "mb_per_s": mb / sum(samples), "avg_kept_chars": kept_chars / len(pages),
+            "precision": sum(prec) / len(prec) if prec else None, "recall": sum(rec) / len(rec) if rec else None}
+        q = f", precision {res['precision']:.2f}, recall {res['recall']:.2f}" if prec else ""
+        print(f"  {name:12s} p50 {res['latency']['p50_ms']:.1f} ms, p99 {res['latency']['p99_ms']:.1f} ms, "
+              f"{res['mb_per_s']:.1f} MB/s, {res['avg_kept_chars']:.0f} chars kept{q}")
+    write_report(args.out, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# benchmarks/fetch_bench.py
+"""Benchmark for page fetching (fetch_url / ingest_url) against a local stand-in server.
+
+Starts a threaded HTTP/1.1 server on 127.0.0.1 that serves deterministic HTML
+pages with ETag and Last-Modified, answers conditional GETs with 304, and
+counts TCP connections and body bytes. Every new connection is delayed by
+--handshake-ms to stand in for the TCP + TLS setup of a real site. Each page
+is fetched twice, the second time after its cache entry expired (TTL 0), the
+way a long-running assistant sees the same sources again:
+
+  legacy   a fresh connection and a full download per request, as the
+           requests.get-per-call fetcher did
+  pooled   internet.fetch.fetch_text with the shared HttpClient and WebCache:
+           kept-alive connections, and the second pass is revalidated
+  swr      the same with stale-while-revalidate: the second pass returns the
+           cached text at once and revalidates in the background
+
+Second-pass latency is what the user waits for on a page seen before. The
+WebCache hit/stale/miss ratios and its compressed size are reported too.
+
+Then checks that oversized and trickling bodies are cut at --max-bytes and
+--read-timeout.
+
+    python -m benchmarks.fetch_bench
+    python -m benchmarks.fetch_bench --pages 200 --page-kb 80 --concurrency 8
+"""
+import argparse, asyncio, hashlib, http.client, os, random, shutil, tempfile, threading, time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .common import environment, latency_stats, write_report
+from src.internet.cache import WebCache
+from src.internet import fetch as fetch_mod
+from src.internet.extract import extract_text
+from src.internet.fetch import fetch_text
+from src.internet.http import HttpClient
+from src.utils.db_writer import close_all_writers
+
+_MODIFIED = formatdate(1.7e9, usegmt=True)
+
+_WORDS = [f"{a}{b}" for a in ("ka", "lo", "mi", "ne", "su", "ta", "ver", "dor", "pel", "quin", "ra", "bo")
+          for b in ("", "n", "s", "tal", "mer", "ing", "ed", "ion", "ar", "ust", "em", "ol")]
+
+def page_html(i: int, kb: int) -> bytes:
+    rng = random.Random(i)
+    paras, size = [], 0
+    while size < kb * 1024:
+        words = rng.choices(_WORDS, k=rng.randint(40, 120), weights=[1 / (r + 1) for r in range(len(_WORDS))])
+        paras.append(f"<p>Page {i}: {' '.join(words)}.</p>\n")
+        size += len(paras[-1])
+    body = "".join(paras)
+    return f"<html><head><title>Page {i}</title><script>var x={i};</script></head><body><nav>menu</nav>{body}</body></html>".encode()
+
+class StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, page_kb: int, handshake_s: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.page_kb, self.handshake_s, self.lock = page_kb, handshake_s, threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "not_modified": 0, "body_bytes": 0}
+
+    def count(self, **kw):
+        with self.lock:
+            for k, v in kw.items():
+                self.stats[k] += v
+
+    def reset(self):
+        with self.lock:
+            self.stats = dict.fromkeys(self.stats, 0)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.count(connections=1)
+        time.sleep(self.server.handshake_s)
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        self.server.count(requests=1)
+        if self.path.startswith("/huge"):
+            return self._stream(b"<p>" + b"x" * 65536 + b"</p>", 200, delay=0.0)
+        if self.path.startswith("/slow"):
+            return self._stream(b"<p>slow chunk</p>", 40, delay=0.05)
+        i = int(self.path.rsplit("/", 1)[-1] or 0)
+        body = page_html(i, self.server.page_kb)
+        etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.count(not_modified=1)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", _MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(body_bytes=len(body))
+
+    def _stream(self, chunk: bytes, n: int, delay: float):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for _ in range(n):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.flush()
+                self.server.count(body_bytes=len(chunk))
+                if delay:
+                    time.sleep(delay)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading, as it should
+        self.close_connection = True
+
+async def _two_passes(urls, concurrency: int, fetch, between=None) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    samples = []
+    async def guarded(u):
+        async with sem:
+            t = time.perf_counter()
+            await fetch(u)
+            samples.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    await asyncio.gather(*(guarded(u) for u in urls))
+    if between:
+        between()
+    samples.clear()
+    await asyncio.gather(*(guarded(u) for u in urls))
+    return {"seconds": time.perf_counter() - t, "second_pass": latency_stats(samples)}
+
+def run_legacy(base: str, urls, concurrency: int) -> dict:
+    host, port = base.split("//", 1)[1].split(":")
+
+    def one(url: str):
+        conn = http.client.HTTPConnection(host, int(port), timeout=12)
+        conn.request("GET", url[len(base):], headers={"User-Agent": "Aegis/1.0"})
+        extract_text(conn.getresponse().read().decode())
+        conn.close()
+
+    async def fetch(u):
+        await asyncio.get_running_loop().run_in_executor(None, one, u)
+    return asyncio.run(_two_passes(urls, concurrency, fetch))
+
+def run_pooled(urls, concurrency: int, cache_path: str, max_bytes: int, read_timeout: float, swr: bool) -> dict:
+    async def main():
+        t0 = time.perf_counter()
+        client = HttpClient(max_bytes=max_bytes, read_timeout=read_timeout, max_connections=concurrency)
+        cache = WebCache(cache_path, ttl_minutes=0, stale_while_revalidate=swr)
+        # The second pass must see the rows and validators of the first.
+        res = await _two_passes(urls, concurrency, lambda u: fetch_text(u, client, cache, []), cache.db.flush)
+        while fetch_mod._refreshing:  # background revalidations still running
+            await asyncio.sleep(0.01)
+        res["until_revalidated_s"] = time.perf_counter() - t0
+        cache.db.flush()
+        stats = cache.stats()
+        text_mb = sum(len(cache.entry(u).text.encode()) for u in urls) / 1e6
+        stored_mb = cache.db.query_one("SELECT sum(size) FROM web_cache")[0] / 1e6
+        res.update({"cache": stats, "text_mb": text_mb, "cached_mb": stored_mb})
+        await client.aclose()
+        cache.db.close()
+        return res
+    return asyncio.run(main())
+
+def check_caps(base: str, max_bytes: int, read_timeout: float) -> dict:
+    async def main():
+        client = HttpClient(max_bytes=max_bytes, read_timeout=read_timeout)
+        out = {}
+        for name in ("huge", "slow"):
+            t = time.perf_counter()
+            res = await client.get(f"{base}/{name}")
+            out[name] = {"chars": len(res.text), "truncated": res.truncated, "seconds": time.perf_counter() - t}
+        await client.aclose()
+        return out
+    return asyncio.run(main())
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=100)
+    ap.add_argument("--page-kb", type=int, default=60, help="HTML size per page")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--handshake-ms", type=float, default=30.0, help="added latency per new connection")
+    ap.add_argument("--max-bytes", type=int, default=1_000_000)
+    ap.add_argument("--read-timeout", type=float, default=0.5)
+    ap.add_argument("--out", default="data/bench/fetch.json")
+    args = ap.parse_args()
+
+    server = StandIn(args.page_kb, args.handshake_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/page/{i}" for i in range(args.pages)]
+    workdir = tempfile.mkdtemp(prefix="aegis-bench-")
+    report = {"benchmark": "fetch", "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "env": environment(), "params": vars(args), "results": {}}
+    try:
+        print(f"{args.pages} pages of {args.page_kb} KB, fetched twice, concurrency {args.concurrency} ...")
+        for name in ("legacy", "pooled", "swr"):
+            server.reset()
+            if name == "legacy":
+                res = run_legacy(base, urls, args.concurrency)
+            else:
+                res = run_pooled(urls, args.concurrency, os.path.join(workdir, f"{name}.db"), args.max_bytes,
+                                 args.read_timeout, swr=name == "swr")
+                close_all_writers()
+            res = report["results"][name] = {**res, **server.stats}
+            print(f"  {name:7s} {res['seconds']:.2f} s, second pass p50 {res['second_pass']['p50_ms']:.1f} ms, "
+                  f"{res['connections']} connections, {res['not_modified']} not modified, "
+                  f"{res['body_bytes'] / 1e6:.1f} MB of bodies")
+            if "cache" in res:
+                c = res["cache"]
+                print(f"          cache {res['text_mb']:.2f} MB of text stored in {res['cached_mb']:.2f} MB; "
+                      f"{c['hits_ratio']:.0%} fresh, {c['stale_ratio']:.0%} stale, {c['misses_ratio']:.0%} miss")
+        caps = report["results"]["caps"] = check_caps(base, args.max_bytes, args.read_timeout)
+        for name, c in caps.items():
+            print(f"  {name:7s} {c['chars']} chars in {c['seconds']:.2f} s, truncated={c['truncated']}")
+        write_report(args.out, report)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/graph_bench.py
+"""Benchmark for the LWWGraph fact store.
+
+Builds deterministic synthetic relation sets at several scales directly in
+SQLite, then measures lazy-load time, in-memory footprint, recency top-k
+(`facts_for_prompt`) and neighbourhood query latency, and single-upsert
+latency. For scales up to --legacy-max the old representation (a dict of
+dataclass relations, fully sorted per query) is measured alongside for
+comparison.
+
+    python -m benchmarks.graph_bench                          # 10k..1m
+    python -m benchmarks.graph_bench --scales 100k --out data/bench/graph.json
+"""
+import argparse, os, shutil, sqlite3, tempfile, time
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from .common import environment, latency_stats, measure, parse_scales, write_report
+from src.memory.graph_crdt import LWWGraph
+from src.utils.db_writer import close_all_writers
+
+RELS = ["likes", "works_on", "lives_in", "knows", "uses", "owns", "prefers", "visited",
+        "studies", "plays", "reads", "wants", "dislikes", "member_of", "related_to"]
+
+def synthetic_relations(n: int, seed: int):
+    """n unique (src, rel, dst, ts) rows; Zipf-skewed nodes like a real fact graph."""
+    rng = np.random.default_rng(seed)
+    n_nodes = max(100, n // 4)
+    seen, out = set(), []
+    t0 = 1.7e9
+    while len(out) < n:
+        m = n - len(out)
+        src = np.minimum(rng.zipf(1.3, m), n_nodes) - 1
+        dst = rng.integers(0, n_nodes, m)
+        rel = rng.integers(0, len(RELS), m)
+        for s, r, d in zip(src.tolist(), rel.tolist(), dst.tolist()):
+            key = (s, r, d)
+            if key in seen:
+                continue
+            seen.add(key)
+            out.append((f"entity_{s}", RELS[r], f"entity_{d}", t0 + len(out) * 0.5 + float(rng.random())))
+    return out
+
+def build_db(path: str, rows) -> float:
+    conn = sqlite3.connect(path)
+    LWWGraph._setup(conn)
+    conn.executemany("INSERT INTO relations(key, src, rel, dst, ts) VALUES (?,?,?,?,?)",
+                     ((f"{s}|{r}|{d}", s, r, d, ts) for s, r, d, ts in rows))
+    conn.commit()
+    conn.close()
+    return os.path.getsize(path) / (1024 * 1024)
+
+@dataclass
+class _LegacyRel:
+    src: str; rel: str; dst: str; ts: float
+
+def bench_legacy(path: str, n_queries: int):
+    def load():
+        conn = sqlite3.connect(path)
+        rels = {(r[0], r[1], r[2]): _LegacyRel(*r) for r in conn.execute("SELECT src, rel, dst, ts FROM relations")}
+        conn.close()
+        return rels
+    rels, load_s, mem_mb = measure(load)
+    samples = []
+    for _ in range(n_queries):
+        t = time.perf_counter()
+        sorted(list(rels.values()), key=lambda r: r.ts, reverse=True)[:8]
+        samples.append(time.perf_counter() - t)
+    return {"load_s": load_s, "memory_mb": mem_mb, "top8": latency_stats(samples)}
+
+def bench_scale(n: int, args, workdir: str) -> dict:
+    path = os.path.join(workdir, f"graph_{n}.db")
+    rows = synthetic_relations(n, args.seed)
+    result = {"relations": n, "db_size_mb": build_db(path, rows)}
+
+    # Footprint from one instance under tracemalloc, load time from a second
+    # one without it (tracemalloc slows allocation-heavy code several-fold).
+    probe = LWWGraph(path)
+    _, _, mem_mb = measure(lambda: len(probe))
+    del probe
+    graph = LWWGraph(path)
+    t = time.perf_counter(); len(graph); load_s = time.perf_counter() - t
+    result.update({"load_s": load_s, "memory_mb": mem_mb, "bytes_per_relation": mem_mb * 1024 * 1024 / n})
+
+    rng = np.random.default_rng(args.seed + 1)
+    top, nb, up = [], [], []
+    for _ in range(args.queries):
+        t = time.perf_counter(); graph.facts_for_prompt(8); top.append(time.perf_counter() - t)
+    hubs = [rows[int(i)][0] for i in rng.integers(0, n, args.queries)]
+    for node in hubs:
+        t = time.perf_counter(); graph.neighbors(node, limit=20); nb.append(time.perf_counter() - t)
+    for i in range(args.queries):
+        s, r, d, _ = rows[int(rng.integers(0, n))]
+        t = time.perf_counter(); graph.upsert(s, r, d); up.append(time.perf_counter() - t)
+    result.update({"top8": latency_stats(top), "neighbors20": latency_stats(nb), "upsert": latency_stats(up)})
+    graph.db.close()
+    close_all_writers()
+
+    if n <= args.legacy_max:
+        result["legacy"] = bench_legacy(path, min(args.queries, 20))
+    return result
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="10k,100k,1m", help="comma list: 10k,100k,1m or raw relation counts")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--legacy-max", type=int, default=100_000, help="largest scale to also run the old dict+sort representation at")
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--workdir", default=None, help="where to build the databases (default: temp dir, removed afterwards)")
+    ap.add_argument("--out", default="data/bench/graph.json")
+    args = ap.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="aegis-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    report = {"benchmark": "graph", "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "env": environment(), "params": vars(args), "results": []}
+    try:
+        for n in parse_scales(args.scales):
+            print(f"{n} relations ...")
+            res = bench_scale(n, args, workdir)
+            report["results"].append(res)
+            print(f"  load {res['load_s']:.2f} s, {res['memory_mb']:.1f} MB ({res['bytes_per_relation']:.0f} B/rel), "
+                  f"top8 p50 {res['top8']['p50_ms']:.3f} ms, neighbors p50 {res['neighbors20']['p50_ms']:.3f} ms")
+            if "legacy" in res:
+                lg = res["legacy"]
+                print(f"  legacy: load {lg['load_s']:.2f} s, {lg['memory_mb']:.1f} MB, top8 p50 {lg['top8']['p50_ms']:.3f} ms")
+            write_report(args.out, report)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
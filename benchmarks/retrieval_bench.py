@@ -0,0 +1,143 @@
+# benchmarks/retrieval_bench.py
+"""Retrieval benchmark for LiteVectorStore.
+
+Builds deterministic synthetic corpora at several scales, then measures
+ingest throughput, query p50/p99 latency and memory footprint of the store's
+(exact, brute-force) search. An approximate index would add a recall@k
+comparison against it.
+
+    python -m benchmarks.retrieval_bench                      # stub embedder, 1k..1m
+    python -m benchmarks.retrieval_bench --scales 1k,10k --embedder real
+    python -m benchmarks.retrieval_bench --out data/bench/retrieval.json
+
+The stub embedder needs no model download and is the one to track for
+regressions in the store itself; the real embedder adds encode cost and
+realistic vector geometry. Large scales take a while: 1m chunks is several
+minutes of ingest even with the stub.
+"""
+import argparse, os, shutil, tempfile, time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .common import (StubEmbedder, environment, latency_stats, load_real_embedder,
+                     measure, parse_scales, peak_rss_mb, write_report)
+from src.memory.vector_store import LiteVectorStore
+
+CHUNK_SIZE, OVERLAP = 500, 50
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "po", "qua", "fen", "dor", "lim", "bar", "tis"]
+
+def _vocabulary(n_words: int, rng: np.random.Generator) -> List[str]:
+    words = set()
+    while len(words) < n_words:
+        words.add("".join(rng.choice(SYLLABLES, size=int(rng.integers(2, 5)))))
+    return sorted(words)
+
+class SyntheticCorpus:
+    """Topic-clustered pseudo-text so nearest neighbours are meaningful.
+
+    Every document draws its words (Zipf-weighted) from one of `n_topics`
+    overlapping sub-vocabularies. Everything is derived from `seed`, so a
+    given (seed, scale) is byte-identical.
+    """
+
+    def __init__(self, seed: int = 1234, n_words: int = 20_000, n_topics: int = 256, topic_words: int = 300):
+        self.rng = np.random.default_rng(seed)
+        self.vocab = _vocabulary(n_words, self.rng)
+        self.topics = [self.rng.choice(n_words, size=topic_words, replace=False) for _ in range(n_topics)]
+        w = 1.0 / np.arange(1, topic_words + 1)
+        self.weights = w / w.sum()
+
+    def _paragraph(self, topic: int, n_chars: int) -> str:
+        ids = self.rng.choice(self.topics[topic], size=n_chars // 3, p=self.weights)
+        return " ".join(self.vocab[i] for i in ids)[:n_chars]
+
+    def documents(self, n_chunks: int, chunks_per_doc: int = 8):
+        """Yield (source, text) until the store would hold >= n_chunks chunks."""
+        step = CHUNK_SIZE - OVERLAP
+        made, doc = 0, 0
+        while made < n_chunks:
+            per = min(chunks_per_doc, n_chunks - made)
+            topic = int(self.rng.integers(len(self.topics)))
+            # A text of per*step - 1 chars chunks into exactly `per` chunks.
+            yield f"doc-{doc}", self._paragraph(topic, per * step - 1)
+            made += per; doc += 1
+
+    def queries(self, n: int, words: int = 6) -> List[str]:
+        out = []
+        for _ in range(n):
+            topic = int(self.rng.integers(len(self.topics)))
+            ids = self.rng.choice(self.topics[topic], size=words, p=self.weights)
+            out.append(" ".join(self.vocab[i] for i in ids))
+        return out
+
+def bench_scale(n_chunks: int, embedder, args, workdir: str) -> Dict:
+    corpus = SyntheticCorpus(seed=args.seed)
+    db_path = os.path.join(workdir, f"kb_{n_chunks}.db")
+    store = LiteVectorStore(db_path, args.model, encoder=embedder)
+
+    rss_before = peak_rss_mb()
+    t0 = time.perf_counter()
+    stored = 0
+    for source, text in corpus.documents(n_chunks):
+        stored += store.add_document(text, source, CHUNK_SIZE, OVERLAP)
+    ingest_s = time.perf_counter() - t0
+
+    qvecs = store.encode(corpus.queries(args.queries))
+
+    result = {
+        "chunks": stored,
+        "ingest": {"seconds": ingest_s, "chunks_per_sec": stored / ingest_s if ingest_s else 0.0},
+        "db_size_mb": os.path.getsize(db_path) / (1024 * 1024),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - rss_before,
+    }
+    store.search_vector(qvecs[0], args.k)  # warm page cache
+    _, _, query_peak_mib = measure(lambda: store.search_vector(qvecs[0], args.k))
+    samples = []
+    for qv in qvecs:
+        t = time.perf_counter()
+        store.search_vector(qv, args.k)
+        samples.append(time.perf_counter() - t)
+    result["query"] = {"latency": latency_stats(samples), "query_peak_alloc_mb": query_peak_mib}
+    lat = result["query"]["latency"]
+    print(f"  query p50 {lat['p50_ms']:.2f} ms  p99 {lat['p99_ms']:.2f} ms  peak alloc {query_peak_mib:.1f} MB")
+    store.db.close()
+    store.db.writer.close()
+    return result
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="1k,10k,100k,1m", help="comma list: 1k,10k,100k,1m or raw chunk counts")
+    ap.add_argument("--embedder", choices=["stub", "real", "both"], default="stub")
+    ap.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2", help="model for --embedder real")
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--workdir", default=None, help="where to build the corpora (default: temp dir, removed afterwards)")
+    ap.add_argument("--out", default="data/bench/retrieval.json")
+    args = ap.parse_args()
+
+    embedders: List[Tuple[str, object]] = []
+    if args.embedder in ("stub", "both"): embedders.append(("stub", StubEmbedder()))
+    if args.embedder in ("real", "both"): embedders.append(("real", load_real_embedder(args.model)))
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="aegis-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    report = {"benchmark": "retrieval", "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "env": environment(), "params": vars(args), "results": []}
+    try:
+        for name, emb in embedders:
+            for n in parse_scales(args.scales):
+                print(f"[{name}] {n} chunks ...")
+                res = bench_scale(n, emb, args, workdir)
+                res.update({"embedder": name, "target_chunks": n})
+                report["results"].append(res)
+                print(f"  ingest {res['ingest']['chunks_per_sec']:.0f} chunks/s, db {res['db_size_mb']:.1f} MB")
+                write_report(args.out, report)  # keep partial results if a big scale is interrupted
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/sandbox_bench.py
+"""Benchmark for code_exec dispatch latency (tools.sandbox.CodeSandbox).
+
+Runs the same small snippet repeatedly, the way a turn calls code_exec a few
+times, and reports the latency of one call:
+
+  legacy    temp file plus a new `python -I -S` process per snippet under the
+            resource limits (the old execute_python)
+  pool      pre-started workers, one per snippet, replaced in the background
+  session   one kept worker per session (globals persist between snippets)
+
+--gap-ms is the pause between calls (the model generates in between); with
+0 the pool has no time to refill and some calls wait for a starting worker.
+The *_burst modes make --burst calls back to back after each pause, like a
+turn that runs several code_exec calls at once, so they show the pool
+running dry.
+
+    python -m benchmarks.sandbox_bench
+    python -m benchmarks.sandbox_bench --runs 200 --gap-ms 0
+    python -m benchmarks.sandbox_bench --burst 8
+"""
+import argparse, asyncio, os, subprocess, sys, tempfile, time
+from pathlib import Path
+
+from .common import environment, latency_stats, write_report
+from src.tools.sandbox import CodeSandbox, _posix_limits
+
+SNIPPET = "import math\nprint(sum(math.sqrt(i) for i in range(1000)))"
+
+def legacy_run(code: str, timeout: int = 10):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        script_path = Path(tmpdir) / "script.py"
+        script_path.write_text(code)
+        res = subprocess.run([sys.executable, "-I", "-S", str(script_path)], capture_output=True, text=True,
+                             timeout=timeout, cwd=tmpdir, env={}, preexec_fn=_posix_limits if os.name == "posix" else None)
+        return res.stdout, res.stderr, res.returncode
+
+async def _time_calls(call, runs: int, gap_s: float, burst: int = 1):
+    samples = []
+    for i in range(runs):
+        if i % burst == 0:
+            await asyncio.sleep(gap_s)
+        t = time.perf_counter()
+        out, err, rc = await call()
+        samples.append(time.perf_counter() - t)
+        assert rc == 0, err
+    return latency_stats(samples)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=50)
+    ap.add_argument("--gap-ms", type=float, default=100.0, help="pause between calls")
+    ap.add_argument("--pool-size", type=int, default=2)
+    ap.add_argument("--burst", type=int, default=4, help="back-to-back calls per pause in the *_burst modes")
+    ap.add_argument("--out", default="data/bench/sandbox.json")
+    args = ap.parse_args()
+    gap = args.gap_ms / 1000
+    pause = max(gap, 0.5)  # between bursts: time for the pool to refill, as between turns
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        sb = CodeSandbox(pool_size=args.pool_size, sessions=True)
+        await asyncio.sleep(0.5)  # the pool starts in the background
+        try:
+            return {
+                "legacy": await _time_calls(lambda: loop.run_in_executor(None, legacy_run, SNIPPET), args.runs, gap),
+                "pool": await _time_calls(lambda: sb.execute_python(SNIPPET), args.runs, gap),
+                "session": await _time_calls(lambda: sb.execute_python(SNIPPET, "bench"), args.runs, gap),
+                "legacy_burst": await _time_calls(lambda: loop.run_in_executor(None, legacy_run, SNIPPET), args.runs, pause, args.burst),
+                "pool_burst": await _time_calls(lambda: sb.execute_python(SNIPPET), args.runs, pause, args.burst),
+            }
+        finally:
+            sb.close()
+
+    print(f"{args.runs} code_exec calls per mode, {args.gap_ms:.0f} ms apart ...")
+    results = asyncio.run(run())
+    for name, s in results.items():
+        print(f"  {name:12s} p50 {s['p50_ms']:.1f} ms, p99 {s['p99_ms']:.1f} ms, max {s['max_ms']:.1f} ms")
+    write_report(args.out, {"benchmark": "sandbox", "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                            "env": environment(), "params": vars(args), "results": results})
+
+if __name__ == "__main__":
+    main()
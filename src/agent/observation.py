@@ -0,0 +1,100 @@
+# src/agent/observation.py
+import asyncio, hashlib, re, threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from ..core.prompt_budget import estimate_tokens
+from ..memory.vector_store import LiteVectorStore
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+def split_passages(text: str, target_chars: int = 600) -> List[str]:
+    """Pack sentences into passages of about target_chars.
+
+    fetch_text collapses whitespace, so sentence ends are the only reliable
+    boundaries; over-long "sentences" (tables, minified text) are hard-split.
+    """
+    passages, cur = [], ""
+    for sent in _SENTENCE_END.split(text):
+        sent = sent.strip()
+        while len(sent) > target_chars:
+            if cur:
+                passages.append(cur); cur = ""
+            passages.append(sent[:target_chars]); sent = sent[target_chars:]
+        if not sent:
+            continue
+        if cur and len(cur) + 1 + len(sent) > target_chars:
+            passages.append(cur); cur = sent
+        else:
+            cur = f"{cur} {sent}" if cur else sent
+    if cur:
+        passages.append(cur)
+    return passages
+
+class ObservationCompressor:
+    """Shrinks large tool outputs to the passages relevant to the user's question.
+
+    Outputs that already fit `budget_tokens` pass through untouched. Larger ones
+    are split into passages, embedded with the knowledge-base encoder and
+    scored against the query; the best passages are kept, in document order,
+    until the budget is full. Passage embeddings are cached per source (the
+    URL when known), so a page that is fetched again, or re-read by a later
+    router step, is not re-embedded.
+    """
+
+    def __init__(self, kb: LiteVectorStore, budget_tokens: int = 600, passage_chars: int = 600, cache_size: int = 64):
+        self.kb, self.budget_tokens, self.passage_chars = kb, budget_tokens, passage_chars
+        self._cache: "OrderedDict[str, Tuple[str, List[str], np.ndarray]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._queries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # compress() runs on executor threads, possibly several at once.
+        self._lock = threading.Lock()
+
+    def _passages(self, text: str, key: Optional[str]) -> Tuple[List[str], np.ndarray]:
+        digest = hashlib.sha1(text.encode("utf-8", "ignore")).hexdigest()
+        key = key or digest
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] == digest:
+                self._cache.move_to_end(key)
+                return hit[1], hit[2]
+        passages = split_passages(text, self.passage_chars)
+        embs = self.kb.encode(passages)
+        with self._lock:
+            self._cache[key] = (digest, passages, embs)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return passages, embs
+
+    def _query_vec(self, query: str) -> np.ndarray:
+        with self._lock:
+            q = self._queries.get(query)
+        if q is None:
+            q = self.kb.embed_query(query)
+            with self._lock:
+                self._queries[query] = q
+                while len(self._queries) > 16:
+                    self._queries.popitem(last=False)
+        return q
+
+    def compress(self, query: str, text: str, key: Optional[str] = None,
+                 count_tokens: Callable[[str], int] = estimate_tokens, budget_tokens: Optional[int] = None) -> str:
+        budget = budget_tokens or self.budget_tokens
+        if count_tokens(text) <= budget:
+            return text
+        passages, embs = self._passages(text, key)
+        scores = embs @ self._query_vec(query)
+        keep, used = [], 0
+        for i in np.argsort(-scores):
+            cost = count_tokens(passages[i])
+            if used + cost > budget:
+                continue
+            keep.append(int(i)); used += cost
+        keep.sort()
+        body = "\n...\n".join(passages[i] for i in keep)
+        return f"[{len(keep)} of {len(passages)} passages, most relevant to the question]\n{body}"
+
+    async def acompress(self, query: str, text: str, key: Optional[str] = None,
+                        count_tokens: Callable[[str], int] = estimate_tokens, budget_tokens: Optional[int] = None) -> str:
+        # Embedding is CPU-bound; never on the event loop.
+        return await asyncio.get_event_loop().run_in_executor(None, self.compress, query, text, key, count_tokens, budget_tokens)
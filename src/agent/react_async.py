@@ -1,17 +1,33 @@
+import os
 import json
 import asyncio
 from typing import AsyncGenerator, Optional
 from pydantic import ValidationError
 from ..core.llm_async import AsyncLocalLLM
-from ..core.prompt import react_step_prompt, final_answer_prompt
-from ..core.schemas import ToolCall
+from ..core.prompt import react_step_sections, final_answer_sections
+from ..core.prompt_budget import PromptBudgeter, estimate_tokens
+from ..core.schemas import ToolCall, ToolStep
 from ..tools.registry_async import AsyncToolRegistry
 from ..memory.vector_store import LiteVectorStore
 from ..memory.conversation_store import ConversationMemory
 from ..memory.graph_crdt import LWWGraph
 from ..memory.inbox import MemoryInbox
+from ..memory.context_manager import RollingSummarizer
+from ..memory.turn_recall import TurnRecall
+from .observation import ObservationCompressor
 from ..core.user_profile import UserProfile
 from ..learning.style_adapter import StyleAdapter
+from ..utils.timing import StageTimer
+
+# Print per-turn stage timings (start/end offsets, so overlapping stages are
+# visible) to the console. Set AEGIS_TIMINGS=1 to enable.
+TIMINGS_ENABLED = os.getenv("AEGIS_TIMINGS", "") == "1"
+
+# Generation lengths; also the part of n_ctx each prompt must leave free.
+ROUTE_MAX_TOKENS = 220
+ANSWER_MAX_TOKENS = 512
+# Extra routing room for each additional call a step may batch.
+ROUTE_TOKENS_PER_CALL = 48
 
 def _extract_first_json(text: str) -> Optional[str]:
     start = text.find("{")
@@ -25,85 +41,192 @@ def _extract_first_json(text: str) -> Optional[str]:
             if depth == 0: return text[start:i+1]
     return None
 
+def _discard_pending(tasks):
+    # Background lookups that were never awaited (stop pressed, error) must not
+    # leak: cancel the ones still running and consume the result of the ones
+    # that finished so asyncio does not warn about unretrieved exceptions.
+    for t in tasks:
+        if not t.done():
+            t.cancel()
+        elif not t.cancelled():
+            t.exception()
+
 class ReActAgent:
-    def __init__(self, llm: AsyncLocalLLM, tools: AsyncToolRegistry, mem: ConversationMemory, kb: LiteVectorStore, graph: LWWGraph, system_prompt: str, max_steps: int, inbox: MemoryInbox, user_profile: UserProfile, style_adapter: StyleAdapter, distill_facts: bool = True):
+    def __init__(self, llm: AsyncLocalLLM, tools: AsyncToolRegistry, mem: ConversationMemory, kb: LiteVectorStore, graph: LWWGraph, system_prompt: str, max_steps: int, inbox: MemoryInbox, user_profile: UserProfile, style_adapter: StyleAdapter, distill_facts: bool = True, summarizer: Optional[RollingSummarizer] = None, compressor: Optional[ObservationCompressor] = None, recall: Optional[TurnRecall] = None, recall_k: int = 3, recall_budget_tokens: int = 400, max_parallel_tools: int = 1):
         self.llm, self.tools, self.mem, self.kb, self.graph, self.inbox = llm, tools, mem, kb, graph, inbox
         self.system_prompt, self.max_steps = system_prompt, max_steps
         self.profile = user_profile
         self.style_adapter = style_adapter
         self.distill_facts = distill_facts
+        self.summarizer = summarizer
+        if summarizer and hasattr(tools, "on_idle"):
+            # Summary folds run between turns, never holding the LLM a turn needs.
+            summarizer.busy = lambda: tools.interactive_turns > 0
+            tools.on_idle(summarizer.run_due)
+        self.compressor = compressor
+        self.recall, self.recall_k, self.recall_budget_tokens = recall, recall_k, recall_budget_tokens
+        self.max_parallel_tools = max(1, max_parallel_tools)
+
+    def _retrieve(self, q, session_id: str) -> str:
+        rag = "\n\n".join(t for _, _, t in self.kb.search_vector(q, 3))
+        if self.recall and self.recall_k > 0:
+            count = getattr(self.llm, "count_tokens", estimate_tokens)
+            past = self.recall.recall_vector(q, session_id, self.recall_k, self.recall_budget_tokens, count)
+            if past:
+                rag = (rag + "\n\nRelevant earlier conversations:\n" + past).strip()
+        return rag
+
+    def _facts(self, q) -> str:
+        # Relevance to this question blended with recency, so older but
+        # pertinent facts still reach the prompt.
+        return self.graph.facts_for_query(q, 8, self.kb.encode)
+
+    async def _after(self, timer: StageTimer, name: str, q_task, fn, *args):
+        # The stage starts once the shared query vector is ready: the wait for
+        # it is timed once, as embed_query, not again in every stage using it.
+        q = await q_task
+        return await timer.track(name, asyncio.get_event_loop().run_in_executor(None, fn, q, *args))
+
+    async def _history(self, session_id: str):
+        # (summary, recent turns). Without a summarizer the prompt carries the
+        # last six turns verbatim, as before.
+        if self.summarizer:
+            return await self.summarizer.context(session_id)
+        return "", await self.mem.aget_recent_context(session_id)
 
     async def run(self, session_id: str, user: str, cancel: asyncio.Event) -> AsyncGenerator[str, None]:
-        # 1. Update style model based on user input
-        self.style_adapter.analyze_message(user)
-
-        # 2. Get contextual system prompt parts
-        profile_prompt = self.profile.get_system_prompt_addon()
-        style_prompt = self.style_adapter.get_adapted_prompt_prefix()
-
-        full_system_prompt = f"{self.system_prompt} {profile_prompt} {style_prompt}".strip()
-
-        scratch = self.mem.get_recent_context(session_id)
-        rag = await asyncio.get_event_loop().run_in_executor(None, self.kb.retrieve_context, user, 3)
-        facts = self.graph.facts_for_prompt(8)
-        if facts: rag = (rag + "\n\nPersonal facts:\n" + facts).strip()
-        observations = []
-        seen_actions = set()  # signatures of (tool, args) already executed
-
-        for step in range(self.max_steps):
-            if cancel.is_set():
-                yield "\n[Stopped by user]\n"; return
-
-            step_prompt = react_step_prompt(full_system_prompt, self.tools.list_tools(), scratch, user)
-            # Hard stop sequences for the router: the model must emit ONE JSON
-            # object and stop. Small models otherwise keep going and hallucinate
-            # a whole fake transcript (Observation:/Assistant:/User: lines, made-
-            # up tool calls and URLs). Stopping on a blank line or any of those
-            # role markers ends generation right after the JSON object.
-            route_stop = ["\n\n", "\nObservation:", "\nAssistant:", "\nUser:", "\nSystem:"]
-            route_text = await self.llm.generate_async(step_prompt, 220, 0.1, 0.9, 40, 1.1, stop=route_stop)
-
-            js = _extract_first_json(route_text.strip())
-            call = None
-            if js:
-                try: call = ToolCall.model_validate(json.loads(js))
-                except ValidationError: pass
-
-            if not call or call.tool == "none":
-                full_answer = ""
-                final_prompt = final_answer_prompt(full_system_prompt, scratch, rag, "\n".join(observations), user)
-                async for tok in self.llm.stream_async(final_prompt, 512, 0.6, 0.9, 40, 1.1, cancel_event=cancel):
+        timer = StageTimer()
+        loop = asyncio.get_event_loop()
+
+        # Kick off every context lookup before doing anything else. Only the
+        # conversation history feeds the router prompt; RAG text and personal
+        # facts are used by the final-answer prompt alone, so they keep running
+        # in the background while the routing generation(s) happen and are
+        # awaited only when the final prompt is built.
+        history_task = asyncio.ensure_future(timer.track("history", self._history(session_id)))
+        # The question is embedded once; KB search, past-turn recall and fact
+        # ranking all reuse the vector.
+        q_task = asyncio.ensure_future(timer.track("embed_query", loop.run_in_executor(None, self.kb.embed_query, user)))
+        rag_task = asyncio.ensure_future(self._after(timer, "retrieval", q_task, self._retrieve, session_id))
+        facts_task = asyncio.ensure_future(self._after(timer, "facts", q_task, self._facts))
+        pending = (history_task, q_task, rag_task, facts_task)
+        # Peer-delegated tasks are held back while the user waits on a turn.
+        if hasattr(self.tools, "begin_turn"):
+            self.tools.begin_turn()
+
+        try:
+            with timer.stage("prompt_setup"):
+                # 1. Update style model based on user input
+                self.style_adapter.analyze_message(user)
+
+                # 2. Get contextual system prompt parts
+                profile_prompt = self.profile.get_system_prompt_addon()
+                style_prompt = self.style_adapter.get_adapted_prompt_prefix()
+
+                full_system_prompt = f"{self.system_prompt} {profile_prompt} {style_prompt}".strip()
+
+            summary, scratch = await history_task
+            route_tokens = ROUTE_MAX_TOKENS + ROUTE_TOKENS_PER_CALL * (self.max_parallel_tools - 1)
+            route_budget = PromptBudgeter.for_llm(self.llm, route_tokens)
+            answer_budget = PromptBudgeter.for_llm(self.llm, ANSWER_MAX_TOKENS)
+            observations = []
+            seen_actions = set()  # signatures of (tool, args) already executed
+
+            for _ in range(self.max_steps):
+                if cancel.is_set():
+                    yield "\n[Stopped by user]\n"; return
+
+                step_prompt = await self._fit(route_budget, react_step_sections(full_system_prompt, self.tools.list_tools(), scratch, user, summary, self.max_parallel_tools), "router")
+                # Hard stop sequences for the router: the model must emit ONE JSON
+                # object and stop. Small models otherwise keep going and hallucinate
+                # a whole fake transcript (Observation:/Assistant:/User: lines, made-
+                # up tool calls and URLs). Stopping on a blank line or any of those
+                # role markers ends generation right after the JSON object.
+                route_stop = ["\n\n", "\nObservation", "\nAssistant:", "\nUser:", "\nSystem:"]
+                route_text = await timer.track("route", self.llm.generate_async(step_prompt, route_tokens, 0.1, 0.9, 40, 1.1, stop=route_stop))
+
+                js = _extract_first_json(route_text.strip())
+                step = None
+                if js:
+                    try: step = ToolStep.parse(json.loads(js))
+                    except (ValidationError, ValueError): pass
+
+                # Loop guard: if the model picks a tool call it has already run
+                # (same tool + same args), it is stuck repeating itself instead of
+                # answering. Repeats are dropped (also within one step); a step
+                # with nothing new left stops iterating and composes the final
+                # answer from the observations gathered so far rather than
+                # burning more steps.
+                calls = []
+                for call in (step.calls if step else []):
+                    sig = f"{call.tool}:{json.dumps(call.args, sort_keys=True)}"
+                    if call.tool != "none" and sig not in seen_actions:
+                        seen_actions.add(sig)
+                        calls.append(call)
+                if len(calls) > self.max_parallel_tools:
+                    print(f"[Agent] router asked for {len(calls)} calls; running the first {self.max_parallel_tools}")
+                    calls = calls[:self.max_parallel_tools]
+                if not calls:
+                    break
+
+                thought = step.rationale or calls[0].rationale or "Planning next step."
+                actions = ", ".join(f"`{c.tool}` {c.args}" for c in calls)
+                yield f"\n---\n*Thinking:* {thought}\n*Action:* {actions}\n---\n"
+
+                # Independent calls run concurrently, each under its own timeout
+                # (AsyncToolRegistry.call never raises); results keep call order.
+                results = await asyncio.gather(*(self._run_tool(timer, session_id, user, c) for c in calls))
+                for call, obs in zip(calls, results):
+                    observations.append(f"{call.tool} -> {obs if self.compressor else obs[:800]}")
+                if len(calls) == 1:
+                    scratch += f"\nAssistant: {json.dumps(calls[0].model_dump(exclude_none=True))}\nObservation: {results[0]}"
+                else:
+                    batch = {"calls": [c.model_dump(exclude_none=True) for c in calls], "rationale": step.rationale}
+                    scratch += f"\nAssistant: {json.dumps(batch)}" + "".join(
+                        f"\nObservation {i} ({c.tool}): {obs}" for i, (c, obs) in enumerate(zip(calls, results), 1))
+
+            # Reached here on a "none" route, by exhausting max_steps, or by the
+            # loop guard above. Stream the final answer using whatever
+            # observations were gathered; this is the first point that needs the
+            # retrieval results.
+            rag = await rag_task
+            facts = await facts_task
+            if facts: rag = (rag + "\n\nPersonal facts:\n" + facts).strip()
+
+            full_answer = ""
+            final_prompt = await self._fit(answer_budget, final_answer_sections(full_system_prompt, scratch, rag, "\n".join(observations), user, summary), "final")
+            with timer.stage("final"):
+                async for tok in self.llm.stream_async(final_prompt, ANSWER_MAX_TOKENS, 0.6, 0.9, 40, 1.1, cancel_event=cancel):
                     full_answer += tok
                     yield tok
-                self.mem.add_message(session_id, user, full_answer, context="\n".join(observations))
-                await self._maybe_distill_facts(user, full_answer)
-                return
-
-            # Loop guard: if the model picks a tool call it has already run
-            # (same tool + same args), it is stuck repeating itself instead of
-            # answering. Stop iterating and compose the final answer from the
-            # observations gathered so far rather than burning more steps.
-            sig = f"{call.tool}:{json.dumps(call.args, sort_keys=True)}"
-            if sig in seen_actions:
-                break
-            seen_actions.add(sig)
-
-            thought = call.rationale or "Planning next step."
-            yield f"\n---\n*Thinking:* {thought}\n*Action:* `{call.tool}` {call.args}\n---\n"
-
-            obs = await self.tools.call(call.tool, call.args)
-            observations.append(f"{call.tool} -> {obs[:800]}")
-            scratch += f"\nAssistant: {json.dumps(call.model_dump(exclude_none=True))}\nObservation: {obs}"
-
-        # Reached here by exhausting max_steps or by the loop guard above.
-        # Stream the final answer using whatever observations were gathered.
-        full_answer = ""
-        final_prompt = final_answer_prompt(full_system_prompt, scratch, rag, "\n".join(observations), user)
-        async for tok in self.llm.stream_async(final_prompt, 512, 0.6, 0.9, 40, 1.1, cancel_event=cancel):
-            full_answer += tok
-            yield tok
-        self.mem.add_message(session_id, user, full_answer, context="\n".join(observations))
-        await self._maybe_distill_facts(user, full_answer)
+            self.mem.add_message(session_id, user, full_answer, context="\n".join(observations))
+            if self.summarizer:
+                self.summarizer.schedule(session_id, self.llm)
+            if self.recall:
+                self.recall.schedule()
+            await timer.track("distill", self._maybe_distill_facts(user, full_answer))
+        finally:
+            _discard_pending(pending)
+            if hasattr(self.tools, "end_turn"):
+                self.tools.end_turn()
+            if TIMINGS_ENABLED:
+                print(f"[Agent] turn stage timings ({session_id[:8]}):\n{timer.summary()}")
+
+    async def _run_tool(self, timer: StageTimer, session_id: str, user: str, call: ToolCall) -> str:
+        obs = await timer.track(f"tool:{call.tool}", self.tools.call(call.tool, call.args, session_id))
+        if self.compressor:
+            # Keep only the passages relevant to the question, before the
+            # observation is repeated in every later router prompt.
+            count = getattr(self.llm, "count_tokens", estimate_tokens)
+            obs = await timer.track("compress", self.compressor.acompress(user, obs, call.args.get("url"), count))
+        return obs
+
+    async def _fit(self, budgeter: PromptBudgeter, sections, label: str):
+        # Tokenizing a long observation takes a few ms; keep it off the loop.
+        prompt, report = await asyncio.get_event_loop().run_in_executor(None, budgeter.fit, sections)
+        if report.cuts or TIMINGS_ENABLED:
+            print(f"[Agent] {label} prompt: {report}")
+        return prompt
 
     async def _maybe_distill_facts(self, user: str, reply: str):
         # Skipping this saves one full LLM generation per chat turn.
@@ -119,7 +242,6 @@ class ReActAgent:
         try:
             items = json.loads(js)
             if isinstance(items, list):
-                for it in items:
-                    if it.get("confidence", 0) >= 0.8:
-                        self.inbox.add(str(it["src"]), str(it["rel"]), str(it["dst"]), float(it["confidence"]))
+                await self.inbox.aadd_many([(str(it["src"]), str(it["rel"]), str(it["dst"]), float(it["confidence"]))
+                                     for it in items if it.get("confidence", 0) >= 0.8])
         except Exception: pass
@@ -14,6 +14,54 @@ class AssistantConfig(BaseModel):
     allow_domains: List[str] = Field(default_factory=list)
     distill_facts: bool = True  # NEW: run fact-extraction generation after each turn
     allow_code_exec: bool = False
+    # code_exec workers started ahead of use; with sessions, variables persist
+    # between the snippets of one chat session (one kept worker per session).
+    code_exec_pool: int = 2
+    code_exec_sessions: bool = False
+    # Tasks delegated by one peer (SessionExec) that may run at the same time.
+    peer_task_concurrency: int = 2
+    # Admission control for delegated tasks: running tasks across all peers
+    # (fewer while a local turn is in flight), tasks allowed to wait, and a
+    # per-peer token bucket (rate, burst). Over them a peer is told to retry.
+    peer_tasks_total: int = 4
+    peer_tasks_during_turn: int = 1
+    peer_task_queue: int = 32
+    peer_task_rate_per_min: float = 30.0
+    peer_task_burst: int = 5
+    # Rolling conversation summary: fold old turns once the unsummarized
+    # history exceeds this many tokens (0 disables), keeping the last N verbatim.
+    summary_threshold_tokens: int = 1200
+    summary_keep_turns: int = 3
+    # Tool outputs larger than this are cut down to their most query-relevant
+    # passages before entering the prompts (0 disables).
+    observation_budget_tokens: int = 600
+    # Semantic recall of past turns (any session) into the knowledge context.
+    recall_turns: int = 3
+    recall_budget_tokens: int = 400
+    # fetch_url/ingest_url: stop reading a page after this many bytes or seconds.
+    fetch_max_bytes: int = 2_000_000
+    fetch_read_timeout_sec: float = 10.0
+    # Web page cache: fresh for ttl, then served stale (and revalidated in the
+    # background) for up to max_stale more; compressed bodies kept under max_mb.
+    web_cache_ttl_minutes: int = 720
+    web_cache_max_stale_minutes: int = 10080
+    web_cache_max_mb: int = 64
+    web_cache_stale_while_revalidate: bool = True
+    # Tool-result cache (search_web, kb_query); per-tool TTL overrides in
+    # seconds, 0 turns caching off for that tool.
+    tool_cache: bool = True
+    tool_cache_entries: int = 512
+    tool_cache_ttl_sec: Dict[str, float] = Field(default_factory=dict)
+    # Independent tool calls the router may batch into one step (run
+    # concurrently); per-tool timeouts in seconds override tool_timeout_sec.
+    max_parallel_tools: int = 4
+    tool_timeouts_sec: Dict[str, float] = Field(default_factory=dict)
+    # search_and_read pages per call; downloads in flight overall and per
+    # domain; result pages of search_web fetched ahead of time (0 disables).
+    search_read_pages: int = 3
+    fetch_concurrency: int = 6
+    fetch_per_domain: int = 2
+    prefetch_results: int = 3
 
 class UserProfileConfig(BaseModel):
     enabled: bool = True
@@ -29,6 +77,7 @@ class EmbeddingsConfig(BaseModel):
 
 class PathsConfig(BaseModel):
     conversation_db: str; knowledge_base_db: str; web_cache_db: str
+    tool_cache_db: str = "data/kb/tool_cache.db"
     memory_graph_db: str; inbox_db: str; contacts_db: str; keys_dir: str
 
 class AppConfig(BaseModel):
@@ -1,5 +1,6 @@
 # src/core/llm_async.py
-import asyncio, threading
+import asyncio, hashlib, threading
+from collections import OrderedDict
 from typing import AsyncGenerator, Optional, List
 from pathlib import Path
 from llama_cpp import Llama
@@ -21,6 +22,43 @@ class AsyncLocalLLM:
         # llama.cpp is NOT reentrant: only one inference may touch self._llm at a time.
         self._sem = asyncio.Semaphore(1)
         self.n_ctx = n_ctx  # Expose context window size
+        # Token counts of stable prompt fragments (system prompt, tool menu and
+        # examples, finished history), per instance since tokenizers differ.
+        # Keyed by a digest so the cache does not hold the texts themselves.
+        self._counts: "OrderedDict[bytes, int]" = OrderedDict()
+        self._counts_lock = threading.Lock()
+
+    # Tokenizing only reads the model vocabulary, so unlike inference it is
+    # safe to run while another thread is generating; no semaphore needed.
+    def _tokenize(self, text: str) -> List[int]:
+        return self._llm.tokenize(text.encode("utf-8"), add_bos=False, special=False)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._tokenize(text)) if text else 0
+
+    def count_tokens_cached(self, text: str) -> int:
+        """count_tokens for text that recurs across prompts. Volatile text
+        (scratchpad, observations, truncation candidates) should use
+        count_tokens, or it would push the stable entries out."""
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._counts_lock:
+            if (n := self._counts.get(key)) is not None:
+                self._counts.move_to_end(key)
+                return n
+        n = self.count_tokens(text)
+        with self._counts_lock:
+            self._counts[key] = n
+            if len(self._counts) > 256:
+                self._counts.popitem(last=False)
+        return n
+
+    def truncate_tokens(self, text: str, n: int, keep: str = "head") -> str:
+        """The first (keep="head") or last (keep="tail") n tokens of text."""
+        toks = self._tokenize(text)
+        if len(toks) <= n:
+            return text
+        toks = toks[:n] if keep == "head" else toks[len(toks) - n:] if n > 0 else []
+        return self._llm.detokenize(toks).decode("utf-8", errors="ignore")
 
     def _generate_blocking(self, prompt: str, max_tokens: int, temperature: float = 0.6, top_p: float = 0.9, top_k: int = 40, repeat_penalty: float = 1.1, stop: Optional[List[str]] = None) -> str:
         stop = stop or ["\nUser:", "\nSystem:"]
@@ -1,7 +1,10 @@
+from .prompt_budget import Section
+
 # Tool descriptions shown to the router so the model knows WHAT each tool does
 # and WHEN to use it. Keep this in sync with AsyncToolRegistry.
 TOOL_DESCRIPTIONS = {
     "search_web": "Search the live internet for current, factual, or recent information (news, prices, releases, people, events, anything that may have changed or that you are unsure about). args: {\"query\": \"...\", \"k\": 5}",
+    "search_and_read": "Search the web AND read the top result pages in one step; returns the relevant passages of each page with its URL. Use instead of search_web when the answer needs the pages themselves, not just snippets. args: {\"query\": \"...\", \"k\": 3}",
     "fetch_url": "Download and read the text of a specific web page. args: {\"url\": \"https://...\"}",
     "ingest_url": "Download a web page and store it in the knowledge base for later. args: {\"url\": \"https://...\"}",
     "calc": "Evaluate a arithmetic expression exactly. args: {\"expr\": \"23 * 456\"}",
@@ -9,6 +12,7 @@ TOOL_DESCRIPTIONS = {
     "kb_query": "Search the user's private local knowledge base. args: {\"query\": \"...\", \"k\": 3}",
     "kb_add": "Store a piece of text in the local knowledge base. args: {\"text\": \"...\", \"source\": \"...\"}",
     "code_exec": "Run a short Python snippet in a sandbox. args: {\"code\": \"...\"}",
+    "search_history": "Search earlier conversations with the user (any session) by keywords, when they refer to something discussed before. args: {\"query\": \"...\", \"k\": 5}",
     "none": "Use this when you already know the answer and no tool is needed.",
 }
 
@@ -21,6 +25,18 @@ Output the single JSON object and then STOP. Do not write an Observation,
 do not write the answer, do not continue the conversation, do not invent
 further turns. Exactly one JSON object, nothing before or after it."""
 
+# Only shown when the agent may batch calls (assistant.max_parallel_tools > 1).
+# One step with several calls saves a routing generation per extra call, and
+# the calls run at the same time.
+PARALLEL_SCHEMA = """When the question needs several lookups that do NOT depend on each other's
+results (several pages, or a web search plus the knowledge base), request them
+all in one object and they run at the same time (at most {n} calls):
+{{ "calls": [ {{ "tool": "<tool_name>", "args": {{ ... }} }}, ... ], "rationale": "<one short sentence>" }}
+Example:
+User: Compare the population of Norway and Sweden.
+{{ "calls": [ {{ "tool": "search_web", "args": {{ "query": "Norway population", "k": 5 }} }}, {{ "tool": "search_web", "args": {{ "query": "Sweden population", "k": 5 }} }} ], "rationale": "Two independent lookups." }}
+If a call needs the result of another (e.g. fetching a URL found by a search), make only the first call now."""
+
 # Few-shot examples steer small models hard. The web-search examples are the
 # ones that were previously missing, which is why the model rarely searched.
 ROUTER_EXAMPLES = """Examples:
@@ -57,12 +73,15 @@ def _tool_menu(tools_list: list[str]) -> str:
     return "\n".join(lines)
 
 
-def react_step_prompt(system: str, tools_list: list[str], scratchpad: str, user: str) -> str:
-    return (
+def react_step_sections(system: str, tools_list: list[str], scratchpad: str, user: str, summary: str = "",
+                        max_calls: int = 1) -> list[Section]:
+    parallel = f"{PARALLEL_SCHEMA.format(n=max_calls)}\n\n" if max_calls > 1 else ""
+    head = (
         f"System:\n{system}\n\n"
-        f"You can call ONE tool to help answer the user. Available tools:\n"
+        f"You can call {'tools' if max_calls > 1 else 'ONE tool'} to help answer the user. Available tools:\n"
         f"{_tool_menu(tools_list)}\n\n"
         f"{TOOLS_SCHEMA}\n\n"
+        f"{parallel}"
         f"Guidance: Most messages need NO tool. For greetings, small talk, "
         f"questions about yourself (your name, your purpose, what you can do), "
         f"opinions, explanations, writing, or anything you can answer from what you "
@@ -71,31 +90,43 @@ def react_step_prompt(system: str, tools_list: list[str], scratchpad: str, user:
         f"is only for information the user explicitly asked you to store or look up.\n"
         f"Only use a tool when the question genuinely requires one: search_web for "
         f"current events, recent facts, prices, versions, or people you are not "
-        f"certain about; calc for arithmetic; now for the current time; fetch_url "
+        f"certain about; search_and_read when the answer needs the content of the "
+        f"result pages, not just snippets; calc for arithmetic; now for the current time; fetch_url "
         f"for a specific page. If in doubt for a conversational message, choose "
         f"\"none\".\n\n"
-        f"{ROUTER_EXAMPLES}\n\n"
-        f"Conversation and observations so far:\n{scratchpad}\n\n"
-        f"User: {user}\n"
-        f"Respond with the JSON object only:"
-    )
-
-
-def final_answer_prompt(system: str, chat: str, rag: str, observations: str, user: str) -> str:
-    parts = [f"System:\n{system}"]
-    if chat:
-        parts.append("Recent conversation:\n" + chat)
-    if rag:
-        parts.append("Knowledge context:\n" + rag)
-    if observations:
-        parts.append("Tool observations (use these for your answer; cite URLs when present):\n" + observations)
-    # Small models, primed by the JSON of the routing step, tend to answer in
-    # JSON or key/value form. Explicitly require a natural-language reply so the
-    # user sees a sentence, not a {"name": ...} object.
-    parts.append(
-        "Answer the user directly in plain, natural English prose, as a friendly "
-        "assistant speaking to a person. Do NOT output JSON, key/value pairs, code "
-        "blocks, curly braces, or field names. Write normal sentences."
+        f"{ROUTER_EXAMPLES}"
     )
-    parts.append("User:\n" + user + "\nAssistant:")
-    return "\n\n".join(parts)
+    return [
+        Section("instructions", head, stable=True),
+        Section("summary", summary, priority=1, header="Summary of the earlier conversation:\n", stable=True),
+        # The scratchpad ends with the latest tool observations; cutting it from
+        # the front drops the oldest history first.
+        Section("scratchpad", scratchpad, priority=2, keep="tail", min_tokens=0, header="Conversation and observations so far:\n"),
+        Section("user", f"User: {user}\nRespond with the JSON object only:"),
+    ]
+
+
+def final_answer_sections(system: str, chat: str, rag: str, observations: str, user: str, summary: str = "") -> list[Section]:
+    return [
+        Section("system", f"System:\n{system}", stable=True),
+        Section("summary", summary, priority=2, header="Summary of the earlier conversation:\n", stable=True),
+        Section("history", chat, priority=3, keep="tail", header="Recent conversation:\n", stable=True),
+        Section("knowledge", rag, priority=4, header="Knowledge context:\n"),
+        Section("observations", observations, priority=1, header="Tool observations (use these for your answer; cite URLs when present):\n"),
+        # Small models, primed by the JSON of the routing step, tend to answer in
+        # JSON or key/value form. Explicitly require a natural-language reply so the
+        # user sees a sentence, not a {"name": ...} object.
+        Section("style",
+            "Answer the user directly in plain, natural English prose, as a friendly "
+            "assistant speaking to a person. Do NOT output JSON, key/value pairs, code "
+            "blocks, curly braces, or field names. Write normal sentences.", stable=True),
+        Section("user", "User:\n" + user + "\nAssistant:"),
+    ]
+
+
+def react_step_prompt(system: str, tools_list: list[str], scratchpad: str, user: str, summary: str = "", max_calls: int = 1) -> str:
+    return "\n\n".join(s.render() for s in react_step_sections(system, tools_list, scratchpad, user, summary, max_calls) if s.text)
+
+
+def final_answer_prompt(system: str, chat: str, rag: str, observations: str, user: str, summary: str = "") -> str:
+    return "\n\n".join(s.render() for s in final_answer_sections(system, chat, rag, observations, user, summary) if s.text)
@@ -0,0 +1,111 @@
+# src/core/prompt_budget.py
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English with the Llama/Qwen BPE vocabularies.
+    # Only used when no model tokenizer is available.
+    return (len(text) + 3) // 4
+
+def _truncate_chars(text: str, n: int, keep: str = "head") -> str:
+    n_chars = max(0, n * 4)
+    if len(text) <= n_chars:
+        return text
+    return text[:n_chars] if keep == "head" else text[len(text) - n_chars:]
+
+@dataclass
+class Section:
+    """One block of a prompt.
+
+    priority 0 is never cut; among the others the highest number is cut first.
+    `keep` says which end survives truncation (history keeps its newest tail,
+    ranked context its best-ranked head). A section that would shrink below
+    `min_tokens` is dropped whole rather than left as a useless stub. The
+    header is never truncated and is omitted with an empty or dropped body.
+    A `stable` section's text recurs across prompts, so its token count is
+    cached.
+    """
+    name: str
+    text: str
+    priority: int = 0
+    keep: str = "head"
+    min_tokens: int = 48
+    header: str = ""
+    stable: bool = False
+
+    def render(self, text: Optional[str] = None) -> str:
+        text = self.text if text is None else text
+        return self.header + text if text else ""
+
+@dataclass
+class BudgetReport:
+    budget: int
+    used: int = 0
+    # (section, tokens before, tokens after) for every section that was cut.
+    cuts: List[Tuple[str, int, int]] = field(default_factory=list)
+
+    @property
+    def dropped(self) -> List[str]:
+        return [name for name, _, after in self.cuts if after == 0]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.used > self.budget
+
+    def __str__(self) -> str:
+        s = f"{self.used}/{self.budget} tokens"
+        if self.cuts:
+            s += "; " + ", ".join(f"{name} {before}->{after}" if after else f"{name} dropped ({before})"
+                                  for name, before, after in self.cuts)
+        return s
+
+class PromptBudgeter:
+    """Fits prompt sections into the context window.
+
+    The budget is n_ctx minus the tokens reserved for the generation. When the
+    sections do not fit, the lowest-priority ones are truncated (or dropped)
+    first until they do. Counting uses the model's own tokenizer when given.
+    """
+
+    SEP = "\n\n"
+
+    def __init__(self, budget: int, count_tokens: Callable[[str], int] = estimate_tokens,
+                 truncate: Callable[[str, int, str], str] = _truncate_chars, margin: int = 16,
+                 count_cached: Optional[Callable[[str], int]] = None):
+        # Sections are counted separately; the margin absorbs the few tokens
+        # that merge across section boundaries in the joined prompt.
+        self.budget, self.margin = budget, margin
+        self.count_tokens, self.truncate = count_tokens, truncate
+        self.count_cached = count_cached or count_tokens  # for stable sections
+
+    @classmethod
+    def for_llm(cls, llm, reserve: int) -> "PromptBudgeter":
+        count = getattr(llm, "count_tokens", None)
+        truncate = getattr(llm, "truncate_tokens", None)
+        n_ctx = getattr(llm, "n_ctx", 4096)
+        return cls(n_ctx - reserve, count or estimate_tokens, truncate or _truncate_chars,
+                   count_cached=getattr(llm, "count_tokens_cached", None))
+
+    def fit(self, sections: List[Section]) -> Tuple[str, BudgetReport]:
+        sections = [s for s in sections if s.text]
+        sizes = [(self.count_cached if s.stable else self.count_tokens)(s.render()) for s in sections]
+        sep_cost = self.count_cached(self.SEP) * max(0, len(sections) - 1)
+        report = BudgetReport(self.budget)
+        over = sum(sizes) + sep_cost + self.margin - self.budget
+        texts = [s.text for s in sections]
+        order = sorted((i for i, s in enumerate(sections) if s.priority > 0), key=lambda i: -sections[i].priority)
+        for i in order:
+            if over <= 0:
+                break
+            s, before = sections[i], sizes[i]
+            target = before - over - self.count_cached(s.header)
+            if target < s.min_tokens:
+                texts[i], after = "", 0
+            else:
+                texts[i] = self.truncate(texts[i], target, s.keep)
+                after = self.count_tokens(s.render(texts[i]))
+            over -= before - after
+            sizes[i] = after
+            report.cuts.append((sections[i].name, before, after))
+        report.used = sum(sizes) + self.count_cached(self.SEP) * max(0, sum(1 for t in texts if t) - 1)
+        return self.SEP.join(s.render(t) for s, t in zip(sections, texts) if t), report
@@ -3,6 +3,7 @@ from typing import Dict, Any, Optional, Literal, List
 
 ToolName = Literal[
     "search_web",
+    "search_and_read",
     "fetch_url",
     "kb_add",
     "kb_query",
@@ -10,6 +11,7 @@ ToolName = Literal[
     "now",
     "calc",
     "code_exec", # Added for sandbox
+    "search_history",
     "none"
 ]
 
@@ -18,6 +20,19 @@ class ToolCall(BaseModel):
     args: Dict[str, Any] = Field(default_factory=dict)
     rationale: Optional[str] = None
 
+class ToolStep(BaseModel):
+    """One routing decision: a single call, or several independent calls the
+    agent runs concurrently ({"calls": [...], "rationale": ...})."""
+    calls: List[ToolCall] = Field(default_factory=list)
+    rationale: Optional[str] = None
+
+    @classmethod
+    def parse(cls, obj: Any) -> "ToolStep":
+        if isinstance(obj, dict) and "calls" in obj:
+            return cls.model_validate(obj)
+        call = ToolCall.model_validate(obj)
+        return cls(calls=[call], rationale=call.rationale)
+
 class SuggestionEvent(BaseModel):
     type: Literal["suggestion", "consent_request"] = "suggestion"
     text: str
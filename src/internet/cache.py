@@ -1,30 +1,186 @@
-import sqlite3
+import sqlite3, threading, time, zlib
 from datetime import datetime, timedelta
-from pathlib import Path
-from ..utils.db import configure_sqlite
+from typing import Dict, NamedTuple, Optional
+from ..utils.storage import SQLiteStore
+
+# Page text is stored compressed; each row names its codec so a cache written
+# with zstd stays readable as long as zstd is, and zlib is always there.
+_CODECS = {"zlib": (lambda b: zlib.compress(b, 6), zlib.decompress)}
+try:
+    from compression import zstd  # Python 3.14+
+    _CODECS["zstd"] = (lambda b: zstd.compress(b, 3), zstd.decompress)
+except ImportError:
+    try:
+        import zstandard
+        _CODECS["zstd"] = (lambda b: zstandard.ZstdCompressor(level=3).compress(b),
+                           lambda b: zstandard.ZstdDecompressor().decompress(b))
+    except ImportError:
+        pass
+_CODEC = "zstd" if "zstd" in _CODECS else "zlib"
+
+# Recording every hit as a write would turn reads into writes; access times
+# only need minute resolution for LRU.
+_TOUCH_EVERY = 60.0
+_PURGE_EVERY = 600.0
+# Eviction goes down to this fraction of the budget so it does not run on every put.
+_LOW_WATER = 0.9
+
+def _compress(text: str) -> tuple[bytes, str]:
+    return _CODECS[_CODEC][0](text.encode("utf-8")), _CODEC
+
+def _schema(conn: sqlite3.Connection):
+    conn.execute("CREATE TABLE IF NOT EXISTS web_cache(url TEXT PRIMARY KEY, fetched_at TEXT, text TEXT, etag TEXT, last_modified TEXT, "
+                 "body BLOB, codec TEXT, size INTEGER DEFAULT 0, accessed_at REAL DEFAULT 0)")
+    cols = {row[1] for row in conn.execute("PRAGMA table_info(web_cache)")}
+    for col, typ in (("etag", "TEXT"), ("last_modified", "TEXT"), ("body", "BLOB"), ("codec", "TEXT"),
+                     ("size", "INTEGER DEFAULT 0"), ("accessed_at", "REAL DEFAULT 0")):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE web_cache ADD COLUMN {col} {typ}")
+    # Rows from before compression: compress them once.
+    legacy = conn.execute("SELECT url, text FROM web_cache WHERE body IS NULL AND text IS NOT NULL").fetchall()
+    if legacy:
+        now = time.time()
+        conn.executemany("UPDATE web_cache SET body=?, codec=?, size=?, accessed_at=?, text=NULL WHERE url=?",
+                         [(b, c, len(b), now, url) for url, text in legacy for b, c in (_compress(text),)])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_web_cache_accessed ON web_cache(accessed_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_web_cache_fetched ON web_cache(fetched_at)")
+
+class CacheEntry(NamedTuple):
+    text: str
+    fresh: bool
+    etag: Optional[str]
+    last_modified: Optional[str]
+    age: float  # seconds since fetched or last revalidated
 
 class WebCache:
-    def __init__(self, db_path: str, ttl_minutes: int = 720):
-        Path(Path(db_path).parent).mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        configure_sqlite(self.conn)
+    """Extracted page text by URL, with the validators to revalidate it.
+
+    Entries older than the TTL are still returned by `entry` (fresh=False) so
+    the caller can serve them while revalidating, or send a conditional GET
+    and, on 304, `touch` the row instead of downloading the page again. Rows
+    past TTL + max_stale are purged at most every 10 minutes, queued on the
+    store's writer thread by whichever comes first, a `put` or a lookup (so a
+    cache that is only read is purged too). The compressed bodies are kept
+    under `max_bytes` by evicting the least recently accessed rows inside the
+    write transaction of `put`.
+    """
+
+    def __init__(self, db_path: str, ttl_minutes: int = 720, max_bytes: int = 64 * 1024 * 1024,
+                 max_stale_minutes: int = 7 * 24 * 60, stale_while_revalidate: bool = True):
+        self.db = SQLiteStore(db_path, _schema)
         self.ttl = timedelta(minutes=ttl_minutes)
-        c = self.conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS web_cache(url TEXT PRIMARY KEY, fetched_at TEXT, text TEXT)")
-        self.conn.commit()
+        self.max_stale = timedelta(minutes=max_stale_minutes)
+        self.max_bytes, self.stale_while_revalidate = max_bytes, stale_while_revalidate
+        # Only touched on the writer thread.
+        self._bytes: Optional[int] = None
+        self._purged_at = 0.0
+        self._purge_queued = False  # a lookup has queued a purge transaction
+        self._stats_lock = threading.Lock()
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "revalidated": 0, "evicted": 0, "purged": 0}
+
+    def _count(self, key: str, n: int = 1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def entry(self, url: str) -> CacheEntry | None:
+        if not self._purge_queued and time.time() - self._purged_at > _PURGE_EVERY:
+            self._purge_queued = True
+            self.db.transact(self._purge_due, urgent=False)
+        row = self.db.query_one("SELECT fetched_at, body, codec, etag, last_modified, accessed_at FROM web_cache WHERE url = ?", (url,))
+        if row is None or row[2] not in _CODECS:
+            self._count("misses")
+            return None
+        age = (datetime.utcnow() - datetime.fromisoformat(row[0])).total_seconds()
+        if age > (self.ttl + self.max_stale).total_seconds():
+            self._count("misses")
+            return None
+        fresh = age <= self.ttl.total_seconds()
+        self._count("hits" if fresh else "stale")
+        now = time.time()
+        if now - (row[5] or 0) > _TOUCH_EVERY:
+            self.db.write("UPDATE web_cache SET accessed_at = ? WHERE url = ?", (now, url))
+        return CacheEntry(_CODECS[row[2]][1](row[1]).decode("utf-8"), fresh, row[3], row[4], age)
+
+    async def aentry(self, url: str) -> CacheEntry | None:
+        return await self.db.run_read(self.entry, url)
 
     def get(self, url: str) -> str | None:
-        c = self.conn.cursor()
-        c.execute("SELECT fetched_at, text FROM web_cache WHERE url = ?", (url,))
-        row = c.fetchone()
-        if row and datetime.utcnow() - datetime.fromisoformat(row[0]) <= self.ttl:
-            return row[1]
-        return None
-
-    def put(self, url: str, text: str):
-        c = self.conn.cursor()
-        c.execute(
-            "INSERT OR REPLACE INTO web_cache(url, fetched_at, text) VALUES (?,?,?)",
-            (url, datetime.utcnow().isoformat(), text)
+        e = self.entry(url)
+        return e.text if e and e.fresh else None
+
+    async def aget(self, url: str) -> str | None:
+        return await self.db.run_read(self.get, url)
+
+    def put(self, url: str, text: str, etag: str | None = None, last_modified: str | None = None):
+        body, codec = _compress(text)
+        fetched_at, now = datetime.utcnow().isoformat(), time.time()
+
+        def store(conn: sqlite3.Connection):
+            self._load_bytes(conn)
+            old = conn.execute("SELECT size FROM web_cache WHERE url = ?", (url,)).fetchone()
+            conn.execute("INSERT OR REPLACE INTO web_cache(url, fetched_at, text, etag, last_modified, body, codec, size, accessed_at) "
+                         "VALUES (?,?,NULL,?,?,?,?,?,?)", (url, fetched_at, etag, last_modified, body, codec, len(body), now))
+            self._bytes += len(body) - ((old[0] or 0) if old else 0)
+            self._purge_due(conn)
+            if self._bytes > self.max_bytes:
+                self._evict(conn)
+        return self.db.transact(store, urgent=False)
+
+    def touch(self, url: str, etag: str | None = None, last_modified: str | None = None):
+        """The server confirmed the cached copy (304): restart its TTL."""
+        self._count("revalidated")
+        self.db.write(
+            "UPDATE web_cache SET fetched_at = ?, accessed_at = ?, etag = coalesce(?, etag), last_modified = coalesce(?, last_modified) WHERE url = ?",
+            (datetime.utcnow().isoformat(), time.time(), etag, last_modified, url)
         )
-        self.conn.commit()
\ No newline at end of file
+
+    def _load_bytes(self, conn: sqlite3.Connection):
+        if self._bytes is None:
+            self._bytes = conn.execute("SELECT coalesce(sum(size), 0) FROM web_cache").fetchone()[0]
+
+    def _purge_due(self, conn: sqlite3.Connection):
+        # Writer thread: from put's transaction or one queued by a lookup.
+        self._purge_queued = False
+        now = time.time()
+        if now - self._purged_at > _PURGE_EVERY:
+            self._load_bytes(conn)
+            self._purge(conn, now)
+
+    def _purge(self, conn: sqlite3.Connection, now: float):
+        self._purged_at = now
+        cutoff = (datetime.utcnow() - self.ttl - self.max_stale).isoformat()
+        n, size = conn.execute("SELECT count(*), coalesce(sum(size), 0) FROM web_cache WHERE fetched_at < ?", (cutoff,)).fetchone()
+        if n:
+            conn.execute("DELETE FROM web_cache WHERE fetched_at < ?", (cutoff,))
+            self._bytes -= size
+            self._count("purged", n)
+            print(f"[WebCache] purged {n} expired pages; {self.format_stats()}")
+
+    def _evict(self, conn: sqlite3.Connection):
+        target, n = int(self.max_bytes * _LOW_WATER), 0
+        while self._bytes > target:
+            rows = conn.execute("SELECT url, size FROM web_cache ORDER BY accessed_at LIMIT 256").fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                if self._bytes <= target:
+                    break
+                conn.execute("DELETE FROM web_cache WHERE url = ?", (url,))
+                self._bytes -= size or 0
+                n += 1
+        self._count("evicted", n)
+
+    def stats(self) -> Dict[str, float]:
+        """Lookup counts since start, with hit/stale/miss ratios over all lookups."""
+        with self._stats_lock:
+            s = dict(self._stats)
+        lookups = s["hits"] + s["stale"] + s["misses"]
+        for k in ("hits", "stale", "misses"):
+            s[f"{k}_ratio"] = s[k] / lookups if lookups else 0.0
+        s["lookups"], s["bytes"] = lookups, self._bytes
+        return s
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (f"{s['lookups']} lookups: {s['hits_ratio']:.0%} fresh, {s['stale_ratio']:.0%} stale, "
+                f"{s['misses_ratio']:.0%} miss; {s['revalidated']} revalidated, {s['evicted']} evicted")
@@ -0,0 +1,235 @@
+# src/internet/extract.py
+import os, re
+from html.parser import HTMLParser
+from typing import Callable, Dict, List, Optional
+
+try:
+    from lxml import etree
+except ImportError:  # stdlib html.parser only
+    etree = None
+
+# Subtrees that never carry page content.
+_SKIP = {"script", "style", "noscript", "template", "svg", "math", "canvas", "object", "iframe", "head",
+         "nav", "footer", "aside", "form", "button", "select", "textarea"}
+# Tags that end a run of text (a "block").
+_BLOCK = {"p", "div", "section", "article", "main", "header", "li", "ul", "ol", "dl", "dd", "dt", "td", "th", "tr",
+          "table", "pre", "blockquote", "figure", "figcaption", "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr", "body"}
+# Elements scored as possible main-content containers.
+_CONTAINERS = {"div", "section", "article", "main", "td", "table", "ul", "ol", "blockquote", "pre", "body", "header"}
+_VOID = {"br", "hr", "img", "input", "meta", "link", "source", "area", "base", "col", "embed", "param", "track", "wbr"}
+# A new <p>/<li> closes an open one (html.parser reports no implied end tags).
+_AUTOCLOSE = {"p": {"p"}, "li": {"li"}, "dt": {"dt", "dd"}, "dd": {"dt", "dd"}, "tr": {"tr"}, "td": {"td", "th"}, "th": {"td", "th"}}
+
+_POSITIVE = re.compile(r"article|body|content|entry|main|page|post|text|blog|story|prose", re.I)
+_NEGATIVE = re.compile(r"comment|meta|foot|nav|menu|sidebar|side-|related|share|social|sponsor|\bads?\b|promo|banner|"
+                       r"header|breadcrumb|cookie|subscribe|newsletter|popup|modal|widget|masthead|signup|login", re.I)
+
+_FEED_CHARS = 16 * 1024
+# Blocks shorter than this are not scored (captions, buttons, bylines).
+_MIN_BLOCK = 25
+
+class _Collector:
+    """Parser target: splits the page into text blocks under scored containers.
+
+    Works with lxml's target interface directly and with html.parser through
+    `_StdlibParser`. Stops collecting once `scan_chars` of text were seen, so
+    the parser can stop being fed.
+    """
+
+    def __init__(self, scan_chars: int):
+        self.scan_chars, self.chars, self.full = scan_chars, 0, False
+        self.stack: List[tuple] = []             # (tag, node id or -1, skipped)
+        self.containers = [0]                    # open container node ids; 0 = document
+        self.parent, self.weight = [-1], [0.0]   # per node
+        self.blocks: List[tuple] = []            # (text, link_chars, node)
+        self.buf: List[str] = []
+        self.link_chars = self.skip = self.in_a = 0
+        self.title: List[str] = []
+        self.in_title = False
+
+    def start(self, tag: str, attrs: Dict[str, str]):
+        if self.full:
+            return
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag == "title":
+            self.in_title = True
+        if self.skip:
+            if tag not in _VOID:
+                self.stack.append((tag, -1, True))
+                self.skip += 1
+            return
+        for t in _AUTOCLOSE.get(tag, ()):
+            if self.stack and self.stack[-1][0] == t:
+                self.end(t)
+        if tag in _BLOCK:
+            self._flush()
+        if tag in _VOID:
+            return
+        if tag in _SKIP:
+            self.stack.append((tag, -1, True))
+            self.skip = 1
+            return
+        node = -1
+        if tag in _CONTAINERS:
+            node = len(self.parent)
+            self.parent.append(self.containers[-1])
+            hint = f"{attrs.get('id') or ''} {attrs.get('class') or ''}"
+            w = 25.0 if tag in ("article", "main") else 0.0
+            if hint.strip():
+                w += (25.0 if _POSITIVE.search(hint) else 0.0) - (25.0 if _NEGATIVE.search(hint) else 0.0)
+            self.weight.append(w)
+            self.containers.append(node)
+        elif tag == "a":
+            self.in_a += 1
+        self.stack.append((tag, node, False))
+
+    def end(self, tag: str):
+        if self.full:
+            return
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if tag == "title":
+            self.in_title = False
+        if not any(t == tag for t, _, _ in self.stack):
+            return  # stray end tag
+        while self.stack:
+            t, node, skipped = self.stack.pop()
+            if skipped:
+                self.skip -= 1
+            else:
+                if t in _BLOCK:
+                    self._flush()
+                if node >= 0:
+                    self.containers.pop()
+                elif t == "a":
+                    self.in_a -= 1
+            if t == tag:
+                break
+
+    def data(self, text: str):
+        if self.in_title:
+            self.title.append(text)
+        if self.skip or self.full:
+            return
+        self.buf.append(text)
+        if self.in_a:
+            self.link_chars += len(text.strip())
+        self.chars += len(text)
+        if self.chars >= self.scan_chars:
+            self._flush()
+            self.full = True
+
+    def close(self):
+        self._flush()
+
+    def _flush(self):
+        if self.buf:
+            text = " ".join("".join(self.buf).split())
+            if text:
+                self.blocks.append((text, self.link_chars, self.containers[-1]))
+            self.buf.clear()
+        self.link_chars = 0
+
+    def text(self, max_chars: int) -> str:
+        """The main content, readability-style: score containers by the text
+        blocks directly inside them (commas, length, link density, class/id
+        hints), keep the best one and its strong siblings, in page order."""
+        self._flush()
+        n = len(self.parent)
+        score, chars, links = [0.0] * n, [0] * n, [0] * n
+        for text, lc, node in self.blocks:
+            chars[node] += len(text); links[node] += lc
+            if len(text) < _MIN_BLOCK:
+                continue
+            s = (1 + text.count(",") + min(len(text) // 100, 3)) * (1 - min(lc / len(text), 1.0))
+            score[node] += s
+            if (p := self.parent[node]) >= 0:
+                score[p] += s / 2
+        final = [0.0] * n
+        for i in range(n):
+            if score[i]:
+                density = links[i] / chars[i] if chars[i] else 0.0
+                final[i] = score[i] * (1 - min(density, 1.0)) + self.weight[i]
+        best = max(range(n), key=final.__getitem__) if n else 0
+        roots = {best}
+        if final[best] > 0:
+            floor = max(10.0, final[best] * 0.2)
+            roots.update(i for i in range(n) if self.parent[i] == self.parent[best] and final[i] >= floor)
+
+        member: Dict[int, bool] = {}
+        def inside(node: int) -> bool:
+            path = []
+            while node >= 0 and node not in member and node not in roots:
+                path.append(node); node = self.parent[node]
+            hit = node in roots or member.get(node, False)
+            for p in path:
+                member[p] = hit
+            return hit
+
+        # Boilerplate hints (share bars, comment threads) drop a whole subtree.
+        boiler = [False] * n
+        for i in range(1, n):  # parents are created before their children
+            boiler[i] = self.weight[i] < 0 or boiler[self.parent[i]]
+        kept = [t for t, _, node in self.blocks if not boiler[node] and inside(node)]
+        if sum(map(len, kept)) < 250:
+            # No clear article (listings, short pages): everything but boilerplate.
+            kept = [t for t, _, node in self.blocks if not boiler[node]]
+        title = " ".join("".join(self.title).split())
+        if title and (not kept or not kept[0].startswith(title)):
+            kept.insert(0, title)
+        return " ".join(kept)[:max_chars]
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, target: _Collector):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        if tag not in _VOID:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+def _feed_stdlib(html: str, col: _Collector):
+    p = _StdlibParser(col)
+    for i in range(0, len(html), _FEED_CHARS):
+        p.feed(html[i:i + _FEED_CHARS])
+        if col.full:
+            return
+    p.close()
+
+def _feed_lxml(html: str, col: _Collector):
+    p = etree.HTMLParser(target=col, recover=True, no_network=True)
+    for i in range(0, len(html), _FEED_CHARS):
+        p.feed(html[i:i + _FEED_CHARS])
+        if col.full:
+            return
+    try:
+        p.close()
+    except etree.XMLSyntaxError:
+        pass  # nothing parseable (only comments, a doctype...): no text
+
+PARSERS: Dict[str, Callable[[str, _Collector], None]] = {"html.parser": _feed_stdlib}
+if etree is not None:
+    PARSERS["lxml"] = _feed_lxml
+# AEGIS_HTML_PARSER picks a backend explicitly (e.g. to compare them).
+DEFAULT_PARSER = os.getenv("AEGIS_HTML_PARSER") or ("lxml" if etree is not None else "html.parser")
+
+def extract_text(html: str, max_chars: int = 9000, parser: Optional[str] = None, scan_chars: Optional[int] = None) -> str:
+    """Readable main text of an HTML page, at most `max_chars` long.
+
+    Parsing stops after `scan_chars` characters of text (default four times
+    `max_chars`), so huge pages cost no more than that.
+    """
+    if not html or html.isspace():
+        return ""
+    col = _Collector(scan_chars or max(4 * max_chars, 20_000))
+    PARSERS.get(parser or DEFAULT_PARSER, _feed_stdlib)(html, col)
+    return col.text(max_chars)
@@ -1,14 +1,112 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+from contextlib import asynccontextmanager
 from urllib.parse import urlparse
+from typing import Dict, List, Optional
+from .cache import CacheEntry, WebCache
+from .extract import extract_text
+from .http import HttpClient
 
-def fetch_text(url: str, user_agent: str, allow_domains: list[str], max_chars: int = 9000) -> str:
+def blocked(url: str, allow_domains: list[str]) -> str | None:
     dom = urlparse(url).netloc
     if allow_domains and not any(dom.endswith(ad) or dom == ad for ad in allow_domains):
         return f"[Blocked: domain '{dom}' not in allowlist]"
-    resp = requests.get(url, headers={"User-Agent": user_agent}, timeout=12)
-    resp.raise_for_status()
-    soup = BeautifulSoup(resp.text, "html.parser")
-    for t in soup(["script","style","noscript","nav","footer","aside"]): t.decompose()
-    text = " ".join(soup.get_text(" ").split())
-    return text[:max_chars]
\ No newline at end of file
+    return None
+
+class FetchLimiter:
+    """Caps concurrent downloads overall and per domain, so a batch of
+    fetches (search_and_read, prefetch, parallel fetch_url calls) neither
+    floods the connection pool nor hammers one site."""
+
+    def __init__(self, total: int = 6, per_domain: int = 2):
+        self.total, self.per_domain = asyncio.Semaphore(total), per_domain
+        self._domains: Dict[str, list] = {}  # domain -> [semaphore, users]
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        dom = urlparse(url).netloc.lower()
+        entry = self._domains.setdefault(dom, [asyncio.Semaphore(self.per_domain), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self.total:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:  # idle domains are forgotten
+                del self._domains[dom]
+
+# Background revalidations in flight, one per URL.
+_refreshing: Dict[str, asyncio.Task] = {}
+# Downloads of uncached pages in flight, one per URL; a second caller (e.g.
+# fetch_url right after a prefetch of the same page) waits for the first.
+_fetching: Dict[str, asyncio.Task] = {}
+
+async def fetch_text(url: str, client: HttpClient, cache: WebCache, allow_domains: list[str], max_chars: int = 9000,
+                     limiter: Optional[FetchLimiter] = None) -> str:
+    """Page text for `url`: from the cache while fresh, revalidated with a
+    conditional GET once stale, downloaded and extracted otherwise.
+
+    With `cache.stale_while_revalidate` a stale entry is returned at once and
+    revalidated in the background for the next caller. Network access waits
+    for a `limiter` slot when one is given.
+    """
+    if msg := blocked(url, allow_domains):
+        return msg
+    cached = await cache.aentry(url)
+    if cached and cached.fresh:
+        return cached.text
+    if cached and cache.stale_while_revalidate:
+        if url not in _refreshing:
+            task = asyncio.ensure_future(_revalidate(url, client, cache, cached, max_chars, limiter))
+            _refreshing[url] = task
+            task.add_done_callback(lambda _t: _refreshing.pop(url, None))
+        return cached.text
+    task = _fetching.get(url)
+    if task is None:
+        task = _fetching[url] = asyncio.ensure_future(_refresh(url, client, cache, cached, max_chars, limiter))
+        task.add_done_callback(lambda t: _fetched(url, t))
+    # Shielded: a caller that times out leaves the download to finish and
+    # fill the cache for the next one.
+    return await asyncio.shield(task)
+
+def _fetched(url: str, task: asyncio.Task):
+    if _fetching.get(url) is task:
+        del _fetching[url]
+    if not task.cancelled():
+        task.exception()  # retrieved even if every caller gave up
+
+# Start of the line fetch_many puts in place of a page that failed.
+FETCH_ERROR = "[Error fetching "
+
+async def fetch_many(urls: List[str], client: HttpClient, cache: WebCache, allow_domains: list[str], limiter: FetchLimiter,
+                     max_chars: int = 9000) -> List[str]:
+    """fetch_text for several pages at once, in the order given; a page that
+    fails yields an error line instead of failing the batch."""
+    async def one(url: str) -> str:
+        try:
+            return await fetch_text(url, client, cache, allow_domains, max_chars, limiter)
+        except Exception as e:
+            return f"{FETCH_ERROR}{url}: {e}]"
+    return list(await asyncio.gather(*(one(u) for u in urls)))
+
+async def _revalidate(url: str, client: HttpClient, cache: WebCache, cached: CacheEntry, max_chars: int,
+                      limiter: Optional[FetchLimiter] = None):
+    try:
+        await _refresh(url, client, cache, cached, max_chars, limiter)
+    except Exception as e:
+        print(f"[Fetch] background refresh of {url} failed: {e}")
+
+async def _refresh(url: str, client: HttpClient, cache: WebCache, cached: Optional[CacheEntry], max_chars: int,
+                   limiter: Optional[FetchLimiter] = None) -> str:
+    validators = (cached.etag, cached.last_modified) if cached else (None, None)
+    if limiter is None:
+        res = await client.get(url, *validators)
+    else:
+        async with limiter.slot(url):
+            res = await client.get(url, *validators)
+    if res.not_modified and cached:
+        cache.touch(url, res.etag, res.last_modified)
+        return cached.text
+    text = await asyncio.get_running_loop().run_in_executor(None, extract_text, res.text, max_chars)
+    # A cut body still revalidates correctly; the validators name the resource.
+    cache.put(url, text, res.etag, res.last_modified)
+    return text
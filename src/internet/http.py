@@ -0,0 +1,152 @@
+# src/internet/http.py
+import asyncio, time
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    import httpx
+except ImportError:  # requests in worker threads, still pooled per host
+    httpx = None
+
+# Bodies that are not text are never downloaded (PDFs, images, archives).
+_TEXT_TYPES = ("text/", "application/xhtml", "application/xml", "application/json", "application/ld+json")
+_CHUNK = 64 * 1024
+
+@dataclass
+class HttpResult:
+    url: str                      # after redirects
+    status: int
+    text: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    truncated: bool = False       # body cut at max_bytes or read_timeout
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+def _is_text(content_type: str) -> bool:
+    ct = (content_type or "text/html").split(";")[0].strip().lower()
+    return ct.startswith(_TEXT_TYPES) or ct.endswith("+xml")
+
+def _charset(content_type: str) -> str:
+    for part in (content_type or "").split(";")[1:]:
+        k, _, v = part.strip().partition("=")
+        if k.lower() == "charset" and v:
+            return v.strip("\"' ")
+    return "utf-8"
+
+def _decode(body: bytes, content_type: str) -> str:
+    try:
+        return body.decode(_charset(content_type), errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+class HttpClient:
+    """Shared HTTP client for the internet tools.
+
+    With httpx installed, one AsyncClient per event loop keeps connections
+    alive across calls (HTTP/2 when `h2` is available, so requests to the same
+    host multiplex over one connection). Without it, a pooled requests.Session
+    runs in worker threads. Bodies are streamed and cut at `max_bytes` or
+    after `read_timeout` seconds of reading, whichever comes first; `get`
+    sends If-None-Match / If-Modified-Since when validators are given.
+    """
+
+    def __init__(self, user_agent: str = "Aegis/1.0", max_bytes: int = 2_000_000, read_timeout: float = 10.0,
+                 connect_timeout: float = 5.0, max_connections: int = 16):
+        self.user_agent, self.max_bytes, self.read_timeout = user_agent, max_bytes, read_timeout
+        self.connect_timeout, self.max_connections = connect_timeout, max_connections
+        self._client = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session = None
+
+    def _headers(self, etag: Optional[str], last_modified: Optional[str]) -> dict:
+        h = {"User-Agent": self.user_agent, "Accept": "text/html,application/xhtml+xml,text/plain;q=0.9,*/*;q=0.5"}
+        if etag:
+            h["If-None-Match"] = etag
+        if last_modified:
+            h["If-Modified-Since"] = last_modified
+        return h
+
+    def _async_client(self):
+        # An AsyncClient's pool is bound to the loop that opened its connections.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                http2 = False
+            self._client = httpx.AsyncClient(
+                http2=http2, follow_redirects=True, max_redirects=5,
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=60.0))
+            self._loop = loop
+        return self._client
+
+    async def get(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> HttpResult:
+        """GET `url` as text. Raises on HTTP errors; a 304 comes back with no text."""
+        if httpx is None:
+            return await asyncio.get_running_loop().run_in_executor(None, self._get_sync, url, etag, last_modified)
+        client = self._async_client()
+        async with client.stream("GET", url, headers=self._headers(etag, last_modified)) as resp:
+            res = HttpResult(str(resp.url), resp.status_code, etag=resp.headers.get("etag"),
+                             last_modified=resp.headers.get("last-modified"))
+            if resp.status_code == 304:
+                await resp.aread()  # empty, but an unread response is not returned to the pool
+                return res
+            resp.raise_for_status()
+            ctype = resp.headers.get("content-type", "")
+            if not _is_text(ctype):
+                raise ValueError(f"unsupported content type '{ctype.split(';')[0]}'")
+            body = bytearray()
+            try:
+                async with asyncio.timeout(self.read_timeout):
+                    async for chunk in resp.aiter_bytes():
+                        body += chunk
+                        if len(body) >= self.max_bytes:
+                            res.truncated = True
+                            break
+            except TimeoutError:
+                if not body:
+                    raise
+                res.truncated = True
+            res.text = _decode(bytes(body[:self.max_bytes]), ctype)
+            return res
+
+    def _get_sync(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> HttpResult:
+        import requests
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_connections, pool_maxsize=self.max_connections)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+        with self._session.get(url, headers=self._headers(etag, last_modified), stream=True,
+                               timeout=(self.connect_timeout, self.read_timeout)) as resp:
+            res = HttpResult(resp.url, resp.status_code, etag=resp.headers.get("etag"),
+                             last_modified=resp.headers.get("last-modified"))
+            if resp.status_code == 304:
+                resp.content  # read the empty body so the connection goes back to the pool
+                return res
+            resp.raise_for_status()
+            ctype = resp.headers.get("content-type", "")
+            if not _is_text(ctype):
+                raise ValueError(f"unsupported content type '{ctype.split(';')[0]}'")
+            body, deadline = bytearray(), time.monotonic() + self.read_timeout
+            for chunk in resp.iter_content(_CHUNK):
+                body += chunk
+                if len(body) >= self.max_bytes or time.monotonic() > deadline:
+                    res.truncated = True
+                    break
+            res.text = _decode(bytes(body[:self.max_bytes]), ctype)
+            return res
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
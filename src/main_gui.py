@@ -21,13 +21,15 @@ from .memory.vector_store import LiteVectorStore
 from .memory.conversation_store import ConversationMemory
 from .memory.graph_crdt import LWWGraph
 from .memory.inbox import MemoryInbox
-from .memory.context_manager import ContextWindow # For Agent
+from .memory.context_manager import RollingSummarizer
+from .memory.turn_recall import TurnRecall
 
 from .learning.lora_trainer import LoRATrainer
 from .learning.style_adapter import StyleAdapter
 
 from .tools.registry_async import AsyncToolRegistry
 from .agent.react_async import ReActAgent
+from .agent.observation import ObservationCompressor
 from .services.session_exec import SessionExec
 from .services.sync import SyncService
 
@@ -38,6 +40,7 @@ from .ui.gui import launch_gui
 from .ui.consent import ConsentBroker
 
 from .utils.download import download_file
+from .utils.db_writer import close_all_writers
 
 MODEL_THREADS = max(2, os.cpu_count() or 2)
 NEXUS_URL = os.getenv("AEGIS_NEXUS_URL", "ws://127.0.0.1:7861")
@@ -83,6 +86,9 @@ def install_shutdown(p2p, sentinel, curator):
         
         # Give background tasks time to cleanup
         await asyncio.sleep(1)
+
+        # Commit anything still queued in the SQLite write-behind queues.
+        await loop.run_in_executor(None, close_all_writers)
         print("✅ Shutdown complete")
 
     def _handler(*_):
@@ -234,8 +240,7 @@ def main():
 
     mem = ConversationMemory(cfg.paths.conversation_db)
     graph = LWWGraph(cfg.paths.memory_graph_db)
-    inbox = MemoryInbox(cfg.paths.inbox_db)
-    # context_window = ContextWindow(model_manager.get_active().n_ctx) # Not used directly in main_gui, but available
+    inbox = MemoryInbox(cfg.paths.inbox_db, graph=graph)
 
     peer_id = f"agent-{uuid.uuid4().hex[:6]}"
     ed_sk, ed_vk = load_or_create_keys(peer_id, cfg.paths.keys_dir)
@@ -257,7 +262,11 @@ def main():
     kairos_protocol = Kairos(session_manager, contacts)
     sync_service = SyncService(graph, p2p)
 
-    tools = AsyncToolRegistry(kb, cfg, peer_client=p2p)
+    compressor = ObservationCompressor(kb, cfg.assistant.observation_budget_tokens) if cfg.assistant.observation_budget_tokens > 0 else None
+    tools = AsyncToolRegistry(kb, cfg, peer_client=p2p, mem=mem, compressor=compressor)
+    # Shared across agent instances so a session never has two refreshes running.
+    summarizer = RollingSummarizer(mem, cfg.assistant.summary_threshold_tokens, cfg.assistant.summary_keep_turns)
+    recall = TurnRecall(mem, kb) if cfg.assistant.recall_turns > 0 else None
     
     # Agent factory must fetch the current LLM model on demand
     def agent_factory():
@@ -266,7 +275,10 @@ def main():
             llm_current, tools, mem, kb, graph, cfg.assistant.system_prompt, 
             cfg.assistant.max_reasoning_steps, inbox=inbox,
             user_profile=user_profile, style_adapter=style_adapter,
-            distill_facts=cfg.assistant.distill_facts
+            distill_facts=cfg.assistant.distill_facts, summarizer=summarizer,
+            compressor=compressor, recall=recall, recall_k=cfg.assistant.recall_turns,
+            recall_budget_tokens=cfg.assistant.recall_budget_tokens,
+            max_parallel_tools=cfg.assistant.max_parallel_tools
         )
 
     consent_broker = ConsentBroker()
@@ -284,13 +296,15 @@ def main():
 
     session_manager.on_consent_request = consent_cb
 
-    session_exec = SessionExec(session_manager)
-    session_exec.register_kb(kb)
-    session_exec.register_config(cfg)
+    a = cfg.assistant
+    session_exec = SessionExec(session_manager, a.peer_task_concurrency, a.peer_tasks_total, a.peer_tasks_during_turn,
+                               a.peer_task_queue, a.peer_task_rate_per_min, a.peer_task_burst)
+    session_exec.register_tools(tools)
 
     async def start_background_tasks():
         # await p2p.connect()  # Disabled for single-user mode
         # asyncio.create_task(session_manager.start_maintenance())
+        # asyncio.create_task(sync_service.run())  # graph anti-entropy; needs p2p.connect()
         pass
         if proactive_enabled:
             asyncio.create_task(sentinel.run())
@@ -12,8 +12,11 @@ from .memory.vector_store import LiteVectorStore
 from .memory.conversation_store import ConversationMemory
 from .memory.graph_crdt import LWWGraph
 from .memory.inbox import MemoryInbox
+from .memory.context_manager import RollingSummarizer
+from .memory.turn_recall import TurnRecall
 from .tools.registry_async import AsyncToolRegistry
 from .agent.react_async import ReActAgent
+from .agent.observation import ObservationCompressor
 from .services.session_exec import SessionExec
 from .services.sync import SyncService
 from .utils.download import download_file
@@ -51,7 +54,7 @@ async def main_async():
     kb = LiteVectorStore(cfg.paths.knowledge_base_db, cfg.embeddings.model_name)
     mem = ConversationMemory(cfg.paths.conversation_db)
     graph = LWWGraph(cfg.paths.memory_graph_db)
-    inbox = MemoryInbox(cfg.paths.inbox_db)
+    inbox = MemoryInbox(cfg.paths.inbox_db, graph=graph)
 
     user_profile = UserProfile(cfg.user_profile.path) # For prompt generation
     style_adapter = StyleAdapter() # For prompt generation
@@ -69,12 +72,18 @@ async def main_async():
     sessions = SessionManager(p2p, ed_sk, get_trusted_vk)
     kairos = Kairos(sessions, contacts)
     sync = SyncService(graph, p2p)
-    tools = AsyncToolRegistry(kb, cfg, peer_client=p2p)
+    compressor = ObservationCompressor(kb, cfg.assistant.observation_budget_tokens) if cfg.assistant.observation_budget_tokens > 0 else None
+    tools = AsyncToolRegistry(kb, cfg, peer_client=p2p, mem=mem, compressor=compressor)
     
     agent = ReActAgent(
         llm, tools, mem, kb, graph, cfg.assistant.system_prompt, 
         cfg.assistant.max_reasoning_steps, inbox=inbox,
-        user_profile=user_profile, style_adapter=style_adapter
+        user_profile=user_profile, style_adapter=style_adapter,
+        summarizer=RollingSummarizer(mem, cfg.assistant.summary_threshold_tokens, cfg.assistant.summary_keep_turns),
+        compressor=compressor,
+        recall=TurnRecall(mem, kb) if cfg.assistant.recall_turns > 0 else None,
+        recall_k=cfg.assistant.recall_turns, recall_budget_tokens=cfg.assistant.recall_budget_tokens,
+        max_parallel_tools=cfg.assistant.max_parallel_tools
     )
 
     async def consent_cb(sender_id: str, session_id: str, consent_obj: dict) -> bool:
@@ -82,10 +91,13 @@ async def main_async():
         return False
     sessions.on_consent_request = consent_cb
 
-    SessionExec(sessions).register_kb(kb)
+    a = cfg.assistant
+    SessionExec(sessions, a.peer_task_concurrency, a.peer_tasks_total, a.peer_tasks_during_turn,
+                a.peer_task_queue, a.peer_task_rate_per_min, a.peer_task_burst).register_tools(tools)
 
     await p2p.connect()
     asyncio.create_task(sessions.start_maintenance())
+    asyncio.create_task(sync.run())
 
     print(f"[Headless] {peer_id} online. Nexus={NEXUS_URL}. Press Ctrl+C to stop.")
     while True:
@@ -1,68 +1,113 @@
 # src/memory/context_manager.py
-from typing import List, Tuple
-from dataclasses import dataclass
-import time
+import asyncio
+from typing import Callable, Dict, List, Tuple
+from .conversation_store import ConversationMemory
+from ..core.prompt_budget import estimate_tokens
 
-@dataclass
-class Message:
-    role: str  # user or assistant
-    content: str
-    tokens: int
-    timestamp: float
+def format_turns(turns: List[Tuple[int, str, str]]) -> str:
+    return "\n\n".join(f"User: {u}\nAssistant: {a}" for _, u, a in turns)
 
-class ContextWindow:
-    """Smart context window management with summarization"""
-    
-    def __init__(self, max_tokens: int = 3000):
-        self.max_tokens = max_tokens
-        self.messages: List[Message] = []
-    
-    def add_message(self, role: str, content: str):
-        # Rough token estimate (will vary by tokenizer)
-        # Assuming rough 1.3 word-to-token ratio, then split on spaces.
-        tokens = len(content.split()) * 1.3 
-        self.messages.append(Message(role, content, int(tokens), time.time()))
-        self._maybe_compress()
-    
-    def _maybe_compress(self):
-        """Compress old messages when approaching token limit"""
-        if not self.messages:
+# Each folded turn is clipped so one huge paste cannot blow up the summary prompt.
+_TURN_CLIP_CHARS = 2000
+
+def summary_prompt(previous: str, turns: str) -> str:
+    return (
+        "System:\nYou maintain a running summary of a conversation between a user and an assistant. "
+        "Merge the new turns into the existing summary. Keep facts about the user, decisions, open "
+        "questions, names, numbers and URLs; drop greetings and filler. Write at most 150 words of "
+        "plain prose, no lists, no preamble.\n\n"
+        f"Existing summary:\n{previous or '(none yet)'}\n\n"
+        f"New turns:\n{turns}\n\n"
+        "Updated summary:"
+    )
+
+class RollingSummarizer:
+    """Per-session rolling summary of the conversation, generated by the LLM.
+
+    Turns stay verbatim until the unsummarized tail of a session grows past
+    `threshold_tokens`; then everything but the last `keep_turns` turns is
+    folded into the stored summary in the background. Prompts get the summary
+    plus only the turns after it, so their size stays bounded however long a
+    session runs. Summaries live in the conversation DB (`conversation_summaries`).
+
+    Folds share the one LLM with the user's turns, so they yield to them:
+    while `busy()` is true no fold starts and a running one stops before its
+    next LLM call; call `run_due` when the last turn ends to resume.
+    """
+
+    def __init__(self, mem: ConversationMemory, threshold_tokens: int = 1200, keep_turns: int = 3,
+                 max_summary_tokens: int = 256, count_tokens: Callable[[str], int] = estimate_tokens):
+        self.mem = mem
+        self.threshold_tokens, self.keep_turns = threshold_tokens, max(1, keep_turns)
+        self.max_summary_tokens = max_summary_tokens
+        self.count_tokens = count_tokens
+        self.busy: Callable[[], bool] = lambda: False
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._due: Dict[str, object] = {}  # session -> llm, refreshes not started yet
+
+    async def context(self, session_id: str, n: int = 6) -> Tuple[str, str]:
+        """(summary, recent turns) to show in the prompt for this session."""
+        row = await self.mem.aget_summary(session_id)
+        if not row:
+            return "", await self.mem.aget_recent_context(session_id, n)
+        summary, upto = row
+        return summary, format_turns(await self.mem.aturns_after(session_id, upto, n, newest=True))
+
+    def schedule(self, session_id: str, llm):
+        """Refresh the session summary in the background if it is due.
+
+        At most one refresh per session runs at a time; a turn that lands while
+        one is running is picked up when it finishes.
+        """
+        if self.threshold_tokens <= 0:
             return
-            
-        total_tokens = sum(m.tokens for m in self.messages)
-        
-        if total_tokens > self.max_tokens * 0.8:
-            # Ensure we have enough messages to summarize
-            if len(self.messages) < 7:
-                return
+        self._due[session_id] = llm
+        self.run_due()
+
+    def run_due(self):
+        """Start the refreshes scheduled so far, unless a turn is in flight."""
+        if self.busy():
+            return
+        for session_id, llm in list(self._due.items()):
+            if (t := self._tasks.get(session_id)) is not None and not t.done():
+                continue
+            del self._due[session_id]
+            task = asyncio.ensure_future(self._update(session_id, llm))
+            self._tasks[session_id] = task
+            task.add_done_callback(lambda t, s=session_id: self._done(s, t))
 
-            recent = self.messages[-6:]
-            to_summarize = self.messages[:-6]
-            
-            if to_summarize:
-                summary_text = self._create_summary(to_summarize)
-                summary_msg = Message(
-                    "system",
-                    f"[Previous conversation summary: {summary_text}]",
-                    int(len(summary_text.split()) * 1.3),  # Make consistent with token calc
-                    to_summarize[0].timestamp
-                )
-                self.messages = [summary_msg] + recent
-    
-    def _create_summary(self, messages: List[Message]) -> str:
-        """Create summary of old messages (could use LLM for better results)"""
-        topics = []
-        for m in messages:
-            if m.role == "user":
-                # Extract key phrases (simple heuristic)
-                words = m.content.split()
-                if len(words) > 3:
-                    topics.append(" ".join(words[:5]) + "...")
-        return f"Discussed: {'; '.join(topics[:3])}"
-    
-    def get_context(self) -> str:
-        """Get formatted context for prompt"""
-        return "\n\n".join([
-            f"{m.role.title()}: {m.content}"
-            for m in self.messages
-        ])
\ No newline at end of file
+    def _done(self, session_id: str, task: asyncio.Task):
+        if self._tasks.get(session_id) is task:
+            del self._tasks[session_id]
+        if not task.cancelled() and (e := task.exception()) is not None:
+            print(f"[Summary] refresh failed for {session_id[:8]}: {e}")
+        if session_id in self._due:
+            self.run_due()
+
+    async def _update(self, session_id: str, llm):
+        count = getattr(llm, "count_tokens", None) or self.count_tokens
+        row = await self.mem.aget_summary(session_id)
+        summary, upto = row or ("", 0)
+        turns = await self.mem.aturns_after(session_id, upto)
+        turns = [(i, u[:_TURN_CLIP_CHARS], a[:_TURN_CLIP_CHARS]) for i, u, a in turns]
+        # Fold oldest-first in chunks of about threshold_tokens, so a session
+        # with a long unsummarized backlog (e.g. from before this feature)
+        # never produces a summary prompt larger than one chunk.
+        while len(turns) > self.keep_turns and count(format_turns(turns)) > self.threshold_tokens:
+            foldable = turns[:-self.keep_turns]
+            chunk, size = [], 0
+            for t in foldable:
+                size += count(format_turns([t]))
+                if chunk and size > self.threshold_tokens:
+                    break
+                chunk.append(t)
+            if self.busy():
+                # A turn started: it gets the LLM, the rest waits for idle.
+                self._due.setdefault(session_id, llm)
+                return
+            new = (await llm.generate_async(summary_prompt(summary, format_turns(chunk)), self.max_summary_tokens, 0.2)).strip()
+            if not new:
+                return
+            summary, upto = new, chunk[-1][0]
+            await self.mem.asave_summary(session_id, summary, upto)
+            turns = turns[len(chunk):]
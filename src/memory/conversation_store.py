@@ -1,25 +1,159 @@
-import sqlite3
+import re, sqlite3, threading
+from collections import OrderedDict, deque
 from datetime import datetime
-from pathlib import Path
-from ..utils.db import configure_sqlite
+from typing import Deque, Dict, List, Optional, Tuple
+from ..utils.storage import SQLiteStore
+
+def _v1_base(c: sqlite3.Cursor):
+    c.execute("CREATE TABLE IF NOT EXISTS conversations(id INTEGER PRIMARY KEY, session_id TEXT, ts TEXT, user TEXT, assistant TEXT, context TEXT)")
+
+def _v2_indexes_fts(c: sqlite3.Cursor):
+    # get_recent_context filters on session_id and orders by id; without this
+    # index every turn scanned the whole history.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id, id)")
+    _ensure_fts(c)
+
+def _ensure_fts(c: sqlite3.Cursor):
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name='conversations_fts'").fetchone() is not None:
+        return
+    try:
+        # External-content FTS5 mirror of the user/assistant text, kept in sync
+        # by triggers. Only the inverted index is stored, not a second copy.
+        c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(user, assistant, content='conversations', content_rowid='id', tokenize='porter unicode61')")
+    except sqlite3.OperationalError:
+        return  # SQLite built without FTS5: search_history falls back to LIKE.
+    c.execute("""CREATE TRIGGER IF NOT EXISTS conversations_ai AFTER INSERT ON conversations BEGIN
+        INSERT INTO conversations_fts(rowid, user, assistant) VALUES (new.id, new.user, new.assistant); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS conversations_ad AFTER DELETE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, user, assistant) VALUES ('delete', old.id, old.user, old.assistant); END""")
+    c.execute("""CREATE TRIGGER IF NOT EXISTS conversations_au AFTER UPDATE ON conversations BEGIN
+        INSERT INTO conversations_fts(conversations_fts, rowid, user, assistant) VALUES ('delete', old.id, old.user, old.assistant);
+        INSERT INTO conversations_fts(rowid, user, assistant) VALUES (new.id, new.user, new.assistant); END""")
+    # Index the history written before the table existed.
+    c.execute("INSERT INTO conversations_fts(conversations_fts) VALUES ('rebuild')")
+
+def _v3_summaries(c: sqlite3.Cursor):
+    # Rolling per-session summary: `summary` covers every turn with id <= upto_id.
+    c.execute("CREATE TABLE IF NOT EXISTS conversation_summaries(session_id TEXT PRIMARY KEY, summary TEXT, upto_id INTEGER, updated_at TEXT)")
+
+def _v4_turn_embeddings(c: sqlite3.Cursor):
+    # Semantic-recall index over completed turns, filled in the background by
+    # TurnRecall. turn_id is conversations.id; the highest indexed id is the
+    # indexer's high-water mark.
+    c.execute("CREATE TABLE IF NOT EXISTS turn_embeddings(turn_id INTEGER PRIMARY KEY, embedding BLOB)")
+
+# Schema migrations, applied in order. PRAGMA user_version records the last
+# one applied; append new steps, never edit shipped ones.
+MIGRATIONS = [_v1_base, _v2_indexes_fts, _v3_summaries, _v4_turn_embeddings]
+
+def _migrate(conn: sqlite3.Connection):
+    # Runs on the writer thread inside its transaction, so a failed step
+    # leaves user_version untouched.
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    for i, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        step(c)
+        c.execute(f"PRAGMA user_version={i}")
+    # Migration 2 is recorded even when SQLite lacked FTS5, so check for the
+    # table on every open: a database first opened without FTS5 gets its
+    # index (back-filled) once it runs on a build that has it.
+    _ensure_fts(c)
 
 class ConversationMemory:
-    def __init__(self, db_path: str):
-        Path(Path(db_path).parent).mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        configure_sqlite(self.conn)
-        c = self.conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS conversations(id INTEGER PRIMARY KEY, session_id TEXT, ts TEXT, user TEXT, assistant TEXT, context TEXT)")
-        self.conn.commit()
+    def __init__(self, db_path: str, cache_turns: int = 6, cache_sessions: int = 64):
+        self.db = SQLiteStore(db_path, _migrate)
+        self.has_fts = self.db.query_one("SELECT 1 FROM sqlite_master WHERE name='conversations_fts'") is not None
+        # Per-session LRU of the last `cache_turns` (user, assistant) pairs, so
+        # the per-turn history lookup normally never touches SQLite. Accessed
+        # from executor threads, hence the lock.
+        self.cache_turns, self.cache_sessions = cache_turns, cache_sessions
+        self._recent: "OrderedDict[str, Deque[Tuple[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
 
     def add_message(self, session_id: str, user: str, assistant: str, context: str):
-        c = self.conn.cursor()
-        c.execute("INSERT INTO conversations(session_id,ts,user,assistant,context) VALUES(?,?,?,?,?)",
-                  (session_id, datetime.utcnow().isoformat(), user, assistant, context))
-        self.conn.commit()
+        # Write-behind: queued for the next group commit, the caller (the
+        # event loop, at the end of a turn) does not wait for the fsync.
+        # Queued under the cache lock so a concurrent cache load either sees
+        # this turn in SQLite or gets it appended here, never both.
+        with self._lock:
+            self.db.write("INSERT INTO conversations(session_id,ts,user,assistant,context) VALUES(?,?,?,?,?)",
+                          (session_id, datetime.utcnow().isoformat(), user, assistant, context))
+            # Only extend sessions already cached; an uncached session is
+            # loaded from the index on its next read.
+            if (turns := self._recent.get(session_id)) is not None:
+                turns.append((user, assistant))
+                self._recent.move_to_end(session_id)
+
+    def _recent_turns(self, session_id: str, n: int) -> List[Tuple[str, str]]:
+        if n > self.cache_turns:
+            self.db.flush()
+            return list(reversed(self.db.query("SELECT user, assistant FROM conversations WHERE session_id=? ORDER BY id DESC LIMIT ?", (session_id, n))))
+        with self._lock:
+            turns = self._recent.get(session_id)
+            if turns is None:
+                self.db.flush()  # a queued turn of this session must be visible
+                rows = self.db.query("SELECT user, assistant FROM conversations WHERE session_id=? ORDER BY id DESC LIMIT ?", (session_id, self.cache_turns))
+                turns = deque(reversed(rows), maxlen=self.cache_turns)
+                self._recent[session_id] = turns
+                while len(self._recent) > self.cache_sessions:
+                    self._recent.popitem(last=False)
+            self._recent.move_to_end(session_id)
+            return list(turns)[-n:] if n > 0 else []
 
     def get_recent_context(self, session_id: str, n: int = 6) -> str:
-        c = self.conn.cursor()
-        c.execute("SELECT user, assistant FROM conversations WHERE session_id=? ORDER BY id DESC LIMIT ?", (session_id, n))
-        pairs = reversed(c.fetchall())
-        return "\n\n".join([f"User: {u}\nAssistant: {a}" for u, a in pairs])
\ No newline at end of file
+        return "\n\n".join([f"User: {u}\nAssistant: {a}" for u, a in self._recent_turns(session_id, n)])
+
+    async def aget_recent_context(self, session_id: str, n: int = 6) -> str:
+        return await self.db.run_read(self.get_recent_context, session_id, n)
+
+    def turns_after(self, session_id: str, after_id: int, limit: Optional[int] = None, newest: bool = False) -> List[Tuple[int, str, str]]:
+        """(id, user, assistant) turns with id > after_id, oldest first.
+
+        With `newest`, the limit keeps the most recent turns instead of the oldest.
+        """
+        self.db.flush()
+        order = "DESC" if newest else "ASC"
+        rows = self.db.query(f"SELECT id, user, assistant FROM conversations WHERE session_id=? AND id>? ORDER BY id {order} LIMIT ?",
+                             (session_id, after_id, -1 if limit is None else limit))
+        return list(reversed(rows)) if newest else rows
+
+    async def aturns_after(self, session_id: str, after_id: int, limit: Optional[int] = None, newest: bool = False) -> List[Tuple[int, str, str]]:
+        return await self.db.run_read(self.turns_after, session_id, after_id, limit, newest)
+
+    def get_summary(self, session_id: str) -> Optional[Tuple[str, int]]:
+        """The session's rolling summary and the last turn id it covers, if any."""
+        return self.db.query_one("SELECT summary, upto_id FROM conversation_summaries WHERE session_id=?", (session_id,))
+
+    async def aget_summary(self, session_id: str) -> Optional[Tuple[str, int]]:
+        return await self.db.aquery_one("SELECT summary, upto_id FROM conversation_summaries WHERE session_id=?", (session_id,))
+
+    async def asave_summary(self, session_id: str, summary: str, upto_id: int):
+        await self.db.awrite("INSERT OR REPLACE INTO conversation_summaries(session_id, summary, upto_id, updated_at) VALUES (?,?,?,?)",
+                             (session_id, summary, upto_id, datetime.utcnow().isoformat()))
+
+    def search_history(self, query: str, k: int = 5, session_id: Optional[str] = None) -> List[Dict]:
+        """Best-matching past turns for `query`, newest first among equal ranks.
+
+        Uses the FTS5 index (bm25 ranking, any-term match) when available and a
+        LIKE scan otherwise. Optionally restricted to one session.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return []
+        self.db.flush()
+        where, params = "", []
+        if session_id:
+            where, params = " AND c.session_id = ?", [session_id]
+        if self.has_fts:
+            match = " OR ".join(f'"{t}"' for t in terms)
+            rows = self.db.query("SELECT c.id, c.session_id, c.ts, c.user, c.assistant FROM conversations_fts f "
+                                 "JOIN conversations c ON c.id = f.rowid WHERE conversations_fts MATCH ?" + where +
+                                 " ORDER BY bm25(conversations_fts), c.id DESC LIMIT ?", [match, *params, k])
+        else:
+            like = " OR ".join(["c.user LIKE ? OR c.assistant LIKE ?"] * len(terms))
+            rows = self.db.query("SELECT c.id, c.session_id, c.ts, c.user, c.assistant FROM conversations c WHERE (" + like + ")" + where +
+                                 " ORDER BY c.id DESC LIMIT ?", [p for t in terms for p in (f"%{t}%",) * 2] + params + [k])
+        return [{"id": i, "session_id": s, "ts": ts, "user": u, "assistant": a} for i, s, ts, u, a in rows]
+
+    async def asearch_history(self, query: str, k: int = 5, session_id: Optional[str] = None) -> List[Dict]:
+        return await self.db.run_read(self.search_history, query, k, session_id)
@@ -1,48 +1,783 @@
-import time, sqlite3
-from pathlib import Path
+import bisect, hashlib, json, math, threading, time, sqlite3, uuid, zlib
+from array import array
 from dataclasses import dataclass
-from typing import Dict, Tuple, List, Optional
-from ..utils.db import configure_sqlite
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from ..utils.storage import SQLiteStore
+from .inbox import norm_key
 
-@dataclass
+@dataclass(slots=True)
 class Rel:
     src: str; rel: str; dst: str; ts: float
+    # Dot of the write that set ts: the replica it was made on and that
+    # replica's sequence number for it.
+    origin: str = ""; seq: int = 0
+    # Tombstone: the relation was retracted at ts.
+    removed: bool = False
+
+# Relation keys pack the three interned ids into one int64 while every id
+# fits in 21 bits (2M distinct strings); past that, keys fall back to tuples.
+_ID_LIMIT = 1 << 21
+
+def _pack(s: int, r: int, d: int):
+    if s < _ID_LIMIT and r < _ID_LIMIT and d < _ID_LIMIT:
+        return (s << 42) | (r << 21) | d
+    return (s, r, d)
+
+# Hash tree for anti-entropy: keys hash into _LEAVES buckets, _FANOUT buckets
+# per top node; a bucket's hash is the XOR of its rows' hashes, so it is
+# updated in O(1) per write.
+_LEAVES, _FANOUT = 4096, 64
+
+def _leaf_of(key: str) -> int:
+    return zlib.crc32(key.encode()) & (_LEAVES - 1)
+
+def _row_hash(key: str, ts: float, removed: int) -> int:
+    # Over the value only, not the dot: replicas holding the same relations
+    # hash equal even if they learned a write through different peers.
+    # Tombstones count as absent, so a replica that compacted them still
+    # hashes equal to peers that hold them (no repair brings them back).
+    if removed:
+        return 0
+    return int.from_bytes(hashlib.blake2b(f"{key}\x00{ts!r}\x00{removed}".encode(), digest_size=8).digest(), "little")
+
+_OPS = {"upsert_relation": 0, "remove_relation": 1}
+
+def _parse_op(op) -> Optional[tuple]:
+    """(src, rel, dst, ts, origin, seq, removed) from a wire op, None if malformed."""
+    if not isinstance(op, dict) or (removed := _OPS.get(op.get("op"))) is None:
+        return None
+    src, rel, dst, origin = op.get("src"), op.get("rel"), op.get("dst"), op.get("origin") or ""
+    if not all(isinstance(x, str) and x for x in (src, rel, dst)) or not isinstance(origin, str):
+        return None
+    try:
+        ts, seq = float(op["ts"]), int(op.get("seq") or 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not math.isfinite(ts) or seq < 0 or (origin and not seq):
+        return None
+    return src, rel, dst, ts, origin, seq, removed
+
+def _parse_row(row) -> Optional[tuple]:
+    """(src, rel, dst, ts, origin, seq, removed) from a synced row, None if malformed."""
+    if not isinstance(row, (list, tuple)) or len(row) not in (6, 7):
+        return None
+    src, rel, dst, ts, origin, seq, *removed = row
+    if not origin or isinstance(seq, bool) or not isinstance(seq, int):
+        return None
+    return _parse_op({"op": "remove_relation" if removed and removed[0] else "upsert_relation",
+                      "src": src, "rel": rel, "dst": dst, "ts": ts, "origin": origin, "seq": seq})
+
+def _parse_vv(vv) -> Dict[str, int]:
+    """A version vector from a peer, malformed entries dropped."""
+    if not isinstance(vv, dict):
+        return {}
+    return {r: v for r, v in vv.items()
+            if isinstance(r, str) and r and isinstance(v, int) and not isinstance(v, bool) and v >= 0}
+
+def _covers(a: Dict[str, int], b: Dict[str, int]) -> bool:
+    """True if version vector a has seen everything b has."""
+    return all(a.get(r, 0) >= v for r, v in b.items())
 
 class LWWGraph:
+    """Last-writer-wins element set of (src, rel, dst) relations, persisted in SQLite.
+
+    A relation is added by `upsert` and retracted by `remove`, which writes a
+    timestamped tombstone; the write with the higher ts wins, and on equal ts
+    the removal wins. Tombstones are kept (and replicated) until every known
+    replica has acknowledged them, then dropped by `compact`.
+
+    In memory the graph is columnar: every string is interned once to an int,
+    and each relation is a slot in parallel src/rel/dst (int32) and ts
+    (float64) arrays, found by a packed-int key: a sorted int64 array for the
+    bulk of the keys plus a small dict for recent inserts, merged in batches
+    (12 bytes per relation instead of a dict entry). A ts-ordered index gives the
+    k most recent relations by walking back from its end, and per-node
+    adjacency arrays answer neighbourhood queries without a scan. `Rel`
+    objects are only built for what a caller asks for. Nothing is read from
+    SQLite until the graph is first used.
+
+    For replication every row carries the dot (origin replica, seq) of the
+    write that set it, and the graph keeps a version vector: per replica, the
+    sequence number up to which all of its writes are known here. The rows a
+    peer is missing are then exactly those with seq above the peer's vector
+    entry for their origin (`delta_since`); a write superseded by a newer one
+    is not kept, but the newer write is either in the same delta or already
+    known to the peer. A two-level hash tree over key buckets locates
+    divergence the vectors cannot explain.
+    """
+
     def __init__(self, db_path: str):
-        Path(Path(db_path).parent).mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        configure_sqlite(self.conn)
-        self._setup()
-        self._rels: Dict[Tuple[str, str, str], Rel] = self._load()
-
-    def _setup(self):
-        c = self.conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS relations(key TEXT PRIMARY KEY, src TEXT, rel TEXT, dst TEXT, ts REAL)")
-        self.conn.commit()
-
-    def _load(self) -> Dict[Tuple[str, str, str], Rel]:
-        c = self.conn.cursor()
-        c.execute("SELECT src, rel, dst, ts FROM relations")
-        return {(r[0], r[1], r[2]): Rel(*r) for r in c.fetchall()}
+        self.db = SQLiteStore(db_path, self._setup)
+        # Reads come from executor threads (agent, curator) while approvals
+        # and sync upsert on the event loop.
+        self._lock = threading.RLock()
+        self._emb_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._loaded = False
+        self._strs: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._src, self._rel, self._dst, self._ts = array("i"), array("i"), array("i"), array("d")
+        self._origin, self._seq, self._removed = array("i"), array("q"), array("b")
+        self._n_removed = 0
+        self.replica_id = ""
+        self._vv: Dict[str, int] = {}
+        # Last version vector each peer replica reported (None once forgotten).
+        self._acks: Dict[str, Optional[Dict[str, int]]] = {}
+        # Per-slot bucket and per-bucket hash; built on first sync, then kept
+        # current by _put.
+        self._leaf: Optional[array] = None
+        self._leaf_hash: Optional[np.ndarray] = None
+        self._key_arr, self._key_slot = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        self._new_keys: Dict[object, int] = {}
+        # (ts, slot) sorted by ts. An update appends a new entry and leaves the
+        # old one behind as stale (its ts no longer matches the slot's);
+        # stale entries are skipped on read and purged by _reindex().
+        self._order_ts, self._order_slot = array("d"), array("i")
+        self._stale = 0
+        # While a batch is merged, new (ts, slot) entries collect here and are
+        # inserted into the ordered index in one pass (_index_deferred).
+        self._deferred: Optional[List[Tuple[float, int]]] = None
+        self._out: Dict[int, array] = {}
+        self._in: Dict[int, array] = {}
+        # norm_key -> live relations with that key; built on first contains_norm.
+        self._norm_keys: Optional[Dict[str, int]] = None
+        # Embeddings of "src rel dst" for relevance ranking: row i is slot i,
+        # rows [0, _emb_n) are filled. A slot's text never changes, so each
+        # relation is embedded once (and persisted in relation_embeddings).
+        self._emb: Optional[np.ndarray] = None
+        self._emb_n = 0
+        # Slots below _emb_n left unembedded (zero rows) because they were
+        # tombstones; embedded if a later write brings them back.
+        self._emb_skipped: set = set()
+
+    @staticmethod
+    def _setup(conn: sqlite3.Connection):
+        conn.execute("CREATE TABLE IF NOT EXISTS relations(key TEXT PRIMARY KEY, src TEXT, rel TEXT, dst TEXT, ts REAL, origin TEXT, seq INTEGER, removed INTEGER DEFAULT 0)")
+        cols = {row[1] for row in conn.execute("PRAGMA table_info(relations)")}
+        for col, typ in (("origin", "TEXT"), ("seq", "INTEGER"), ("removed", "INTEGER DEFAULT 0")):
+            if col not in cols:
+                conn.execute(f"ALTER TABLE relations ADD COLUMN {col} {typ}")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_relations_src ON relations(src)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_relations_dst ON relations(dst)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_relations_ts ON relations(ts)")
+        conn.execute("CREATE TABLE IF NOT EXISTS relation_embeddings(key TEXT PRIMARY KEY, embedding BLOB)")
+        conn.execute("CREATE TABLE IF NOT EXISTS graph_meta(key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS version_vector(replica TEXT PRIMARY KEY, seq INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS replica_acks(replica TEXT PRIMARY KEY, vv TEXT, seen_at REAL)")
+        conn.execute("INSERT OR IGNORE INTO graph_meta(key, value) VALUES ('replica_id', ?)", (uuid.uuid4().hex[:16],))
+        rid = conn.execute("SELECT value FROM graph_meta WHERE key='replica_id'").fetchone()[0]
+        # Rows from before replication (or written by other tools) become
+        # local writes, numbered after this replica's last sequence number.
+        if conn.execute("SELECT 1 FROM relations WHERE origin IS NULL LIMIT 1").fetchone():
+            base = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM version_vector WHERE replica=?", (rid,)).fetchone()[0]
+            conn.execute("UPDATE relations SET origin=?, seq=?+rowid WHERE origin IS NULL", (rid, base))
+            conn.execute("INSERT OR REPLACE INTO version_vector(replica, seq) SELECT ?, MAX(seq) FROM relations WHERE origin=?", (rid, rid))
+
+    def _intern(self, s: str) -> int:
+        i = self._ids.get(s)
+        if i is None:
+            i = self._ids[s] = len(self._strs)
+            self._strs.append(s)
+        return i
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _load(self):
+        # Caller holds the lock.
+        # Rows are unique by key and come in ts order (idx_relations_ts), so
+        # they are appended straight to the columns and the ordered index
+        # without the per-op LWW merge.
+        intern, new_keys, out_adj, in_adj = self._intern, self._new_keys, self._out, self._in
+        src, rel, dst, tss, origins, seqs = self._src, self._rel, self._dst, self._ts, self._origin, self._seq
+        removed = self._removed
+        keys, key_slots = array("q"), array("i")
+        cur = self.db.reader().execute("SELECT src, rel, dst, ts, origin, seq, removed FROM relations ORDER BY ts")
+        while rows := cur.fetchmany(10_000):
+            for s, r, d, ts, o, q, x in rows:
+                s, r, d = intern(s), intern(r), intern(d)
+                origins.append(intern(o or "")); seqs.append(q or 0); removed.append(1 if x else 0)
+                slot, key = len(tss), _pack(s, r, d)
+                if type(key) is int:
+                    keys.append(key); key_slots.append(slot)
+                else:
+                    new_keys[key] = slot
+                src.append(s); rel.append(r); dst.append(d); tss.append(ts)
+                if (a := out_adj.get(s)) is None: a = out_adj[s] = array("i")
+                a.append(slot)
+                if (a := in_adj.get(d)) is None: a = in_adj[d] = array("i")
+                a.append(slot)
+        k = np.frombuffer(keys, dtype=np.int64)
+        order = np.argsort(k, kind="stable")
+        self._key_arr, self._key_slot = k[order], np.frombuffer(key_slots, dtype=np.int32)[order]
+        self._order_ts, self._order_slot = array("d", tss), array("i", range(len(tss)))
+        self.replica_id = self.db.query_one("SELECT value FROM graph_meta WHERE key='replica_id'")[0]
+        self._vv = dict(self.db.query("SELECT replica, seq FROM version_vector"))
+        self._acks = {r: json.loads(vv) if vv else None for r, vv in self.db.query("SELECT replica, vv FROM replica_acks")}
+        self._n_removed = removed.count(1)
+        self._loaded = True
+
+    def _find(self, key) -> Optional[int]:
+        slot = self._new_keys.get(key)
+        if slot is None and type(key) is int and len(self._key_arr):
+            j = int(np.searchsorted(self._key_arr, key))
+            if j < len(self._key_arr) and self._key_arr[j] == key:
+                slot = int(self._key_slot[j])
+        return slot
+
+    def _merge_keys(self):
+        ints = [(k, v) for k, v in self._new_keys.items() if type(k) is int]
+        if not ints:
+            return
+        k = np.concatenate([self._key_arr, np.fromiter((k for k, _ in ints), dtype=np.int64, count=len(ints))])
+        v = np.concatenate([self._key_slot, np.fromiter((v for _, v in ints), dtype=np.int32, count=len(ints))])
+        order = np.argsort(k, kind="stable")
+        self._key_arr, self._key_slot = k[order], v[order]
+        self._new_keys = {k: v for k, v in self._new_keys.items() if type(k) is not int}
+
+    def _holds(self, src: str, rel: str, dst: str) -> bool:
+        ids = self._ids
+        if src not in ids or rel not in ids or dst not in ids:
+            return False
+        return self._find(_pack(ids[src], ids[rel], ids[dst])) is not None
+
+    def _count_norm(self, slot: int, delta: int):
+        if self._norm_keys is None:
+            return
+        st = self._strs
+        k = norm_key(st[self._src[slot]], st[self._rel[slot]], st[self._dst[slot]])
+        if n := self._norm_keys.get(k, 0) + delta:
+            self._norm_keys[k] = n
+        else:
+            self._norm_keys.pop(k, None)
+
+    def _wins(self, slot: Optional[int], ts: float, removed: int) -> bool:
+        # Higher ts wins; on a tie the removal wins (so all replicas agree).
+        return slot is None or (ts, removed) > (self._ts[slot], self._removed[slot])
+
+    def _put(self, s: int, r: int, d: int, ts: float, o: int, seq: int, removed: int = 0) -> Optional[int]:
+        """LWW merge of one relation; returns its slot if it changed, else None."""
+        key = _pack(s, r, d)
+        slot = self._find(key)
+        if slot is None:
+            slot = self._new_keys[key] = len(self._ts)
+            if len(self._new_keys) > max(4096, len(self._key_arr) >> 4):
+                self._merge_keys()
+            self._src.append(s); self._rel.append(r); self._dst.append(d); self._ts.append(ts)
+            self._origin.append(o); self._seq.append(seq); self._removed.append(removed)
+            self._n_removed += removed
+            self._out.setdefault(s, array("i")).append(slot)
+            self._in.setdefault(d, array("i")).append(slot)
+            if not removed:
+                self._count_norm(slot, 1)
+            if self._leaf is not None:
+                k = self._key_str(slot)
+                self._leaf.append(b := _leaf_of(k))
+                self._leaf_hash[b] ^= np.uint64(_row_hash(k, ts, removed))
+        elif self._wins(slot, ts, removed):
+            if self._leaf is not None:
+                k = self._key_str(slot)
+                old = _row_hash(k, self._ts[slot], self._removed[slot])
+                self._leaf_hash[self._leaf[slot]] ^= np.uint64(old ^ _row_hash(k, ts, removed))
+            self._n_removed += removed - self._removed[slot]
+            if removed != self._removed[slot]:
+                self._count_norm(slot, -1 if removed else 1)
+            self._ts[slot], self._removed[slot] = ts, removed
+            self._origin[slot], self._seq[slot] = o, seq
+            self._stale += 1
+        else:
+            return None
+        if self._deferred is not None:
+            self._deferred.append((ts, slot))
+        elif not self._order_ts or ts >= self._order_ts[-1]:
+            self._order_ts.append(ts); self._order_slot.append(slot)
+        else:
+            i = bisect.bisect_right(self._order_ts, ts)
+            self._order_ts.insert(i, ts); self._order_slot.insert(i, slot)
+        # During a batch the deferred entries are not in the index yet; a
+        # reindex now would let _index_deferred add them a second time.
+        if self._deferred is None and self._stale > 1024 and self._stale > len(self._ts):
+            self._reindex()
+        return slot
+
+    def _index_deferred(self):
+        # Caller holds the lock. One vectorized merge instead of an O(n)
+        # array.insert per out-of-order entry.
+        entries, self._deferred = self._deferred, None
+        if not entries:
+            return
+        entries.sort()
+        ts = np.fromiter((e[0] for e in entries), dtype=np.float64, count=len(entries))
+        slots = np.fromiter((e[1] for e in entries), dtype=np.int32, count=len(entries))
+        if len(entries) <= 16:
+            for t, slot in entries:
+                i = bisect.bisect_right(self._order_ts, t)
+                self._order_ts.insert(i, t); self._order_slot.insert(i, slot)
+        elif not self._order_ts or ts[0] >= self._order_ts[-1]:
+            self._order_ts.frombytes(ts.tobytes()); self._order_slot.frombytes(slots.tobytes())
+        else:
+            old_ts = np.frombuffer(self._order_ts, dtype=np.float64)
+            pos = np.searchsorted(old_ts, ts, side="right")
+            merged_ts = np.insert(old_ts, pos, ts)
+            merged_slot = np.insert(np.frombuffer(self._order_slot, dtype=np.int32), pos, slots)
+            del old_ts
+            self._order_ts, self._order_slot = array("d"), array("i")
+            self._order_ts.frombytes(merged_ts.tobytes()); self._order_slot.frombytes(merged_slot.tobytes())
+        if self._stale > 1024 and self._stale > len(self._ts):
+            self._reindex()
+
+    def _reindex(self):
+        order = sorted(range(len(self._ts)), key=self._ts.__getitem__)
+        self._order_slot = array("i", order)
+        self._order_ts = array("d", (self._ts[i] for i in order))
+        self._stale = 0
+
+    def _key_str(self, slot: int) -> str:
+        st = self._strs
+        return f"{st[self._src[slot]]}|{st[self._rel[slot]]}|{st[self._dst[slot]]}"
+
+    def _rel_at(self, slot: int) -> Rel:
+        st = self._strs
+        return Rel(st[self._src[slot]], st[self._rel[slot]], st[self._dst[slot]], self._ts[slot],
+                   st[self._origin[slot]], self._seq[slot], bool(self._removed[slot]))
+
+    def _row_at(self, slot: int) -> list:
+        # Wire/storage order: src, rel, dst, ts, origin, seq, removed.
+        st = self._strs
+        return [st[self._src[slot]], st[self._rel[slot]], st[self._dst[slot]], self._ts[slot],
+                st[self._origin[slot]], self._seq[slot], self._removed[slot]]
+
+    def _iter_recent(self) -> Iterator[int]:
+        # Caller holds the lock. Live relations only.
+        ts, removed, order_ts, order_slot = self._ts, self._removed, self._order_ts, self._order_slot
+        for j in range(len(order_slot) - 1, -1, -1):
+            slot = order_slot[j]
+            if order_ts[j] == ts[slot] and not removed[slot]:
+                yield slot
+
+    def __len__(self) -> int:
+        """Number of live relations (tombstones not counted)."""
+        self._ensure_loaded()
+        return len(self._ts) - self._n_removed
+
+    @property
+    def tombstones(self) -> int:
+        self._ensure_loaded()
+        return self._n_removed
+
+    _INSERT = ("INSERT OR REPLACE INTO relations (key, src, rel, dst, ts, origin, seq, removed) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+    _SET_VV = "INSERT OR REPLACE INTO version_vector(replica, seq) VALUES (?, ?)"
+
+    def _write_local(self, src: str, rel: str, dst: str, ts: Optional[float], removed: int) -> Rel:
+        """Local write: wins if newer, and gets this replica's next sequence number."""
+        self._ensure_loaded()
+        ts = float(ts or time.time())
+        with self._lock:
+            s, r, d = self._intern(src), self._intern(rel), self._intern(dst)
+            slot = self._find(_pack(s, r, d))
+            if self._wins(slot, ts, removed):
+                rid = self.replica_id
+                seq = self._vv[rid] = self._vv.get(rid, 0) + 1
+                slot = self._put(s, r, d, ts, self._intern(rid), seq, removed)
+                self._persist([(f"{src}|{rel}|{dst}", src, rel, dst, ts, rid, seq, removed)], [(rid, seq)])
+            return self._rel_at(slot)
+
+    def _persist(self, rows: List[tuple], vv: List[Tuple[str, int]]):
+        # The in-memory graph is authoritative; persistence is write-behind, one
+        # transaction per call, issued under the lock so the writer queue keeps
+        # the merge order.
+        if not rows and not vv:
+            return
+        def write(conn: sqlite3.Connection):
+            if rows: conn.executemany(self._INSERT, rows)
+            if vv: conn.executemany(self._SET_VV, vv)
+        self.db.transact(write, urgent=False)
 
     def upsert(self, src: str, rel: str, dst: str, ts: Optional[float] = None) -> Rel:
-        key, ts = (src, rel, dst), ts or time.time()
-        if not self._rels.get(key) or ts >= self._rels[key].ts:
-            self._rels[key] = Rel(src, rel, dst, ts)
-            c = self.conn.cursor()
-            # FIX: Corrected typo in SQLite placeholder substitution from 'dst' to '{dst}'
-            c.execute("INSERT OR REPLACE INTO relations (key, src, rel, dst, ts) VALUES (?, ?, ?, ?, ?)",
-                      (f"{src}|{rel}|{dst}", src, rel, dst, ts))
-            self.conn.commit()
-        return self._rels[key]
+        return self._write_local(src, rel, dst, ts, 0)
+
+    def remove(self, src: str, rel: str, dst: str, ts: Optional[float] = None) -> Rel:
+        """Retract a relation with a tombstone at ts (now by default).
+
+        The tombstone is recorded even for a relation not known here, so an
+        older add arriving later from a peer cannot bring it back. Returns the
+        winning state (not a tombstone if a newer add already exists).
+        """
+        return self._write_local(src, rel, dst, ts, 1)
+
+    def get(self, src: str, rel: str, dst: str) -> Optional[Rel]:
+        self._ensure_loaded()
+        with self._lock:
+            ids = [self._ids.get(x) for x in (src, rel, dst)]
+            if None in ids or (slot := self._find(_pack(*ids))) is None or self._removed[slot]:
+                return None
+            return self._rel_at(slot)
+
+    def contains_norm(self, src: str, rel: str, dst: str) -> bool:
+        """True if a live relation equals this one up to case and whitespace."""
+        self._ensure_loaded()
+        with self._lock:
+            if self._norm_keys is None:
+                st, keys = self._strs, {}
+                for slot in range(len(self._ts)):
+                    if not self._removed[slot]:
+                        k = norm_key(st[self._src[slot]], st[self._rel[slot]], st[self._dst[slot]])
+                        keys[k] = keys.get(k, 0) + 1
+                self._norm_keys = keys
+            return norm_key(src, rel, dst) in self._norm_keys
+
+    def _merge(self, src: str, rel: str, dst: str, ts: float, origin: str, seq: int, removed: int = 0) -> Optional[tuple]:
+        """LWW merge of a remote row, keeping its dot; returns the DB row if it won."""
+        # Caller holds the lock.
+        removed = 1 if removed else 0
+        if self._put(self._intern(src), self._intern(rel), self._intern(dst), ts, self._intern(origin), seq, removed) is None:
+            return None
+        return (f"{src}|{rel}|{dst}", src, rel, dst, ts, origin, seq, removed)
 
     def apply_op(self, op: dict) -> bool:
-        if op.get("op") == "upsert_relation":
-            self.upsert(op["src"], op["rel"], op["dst"], float(op["ts"]))
-            return True
-        return False
+        return self.apply_ops([op])["invalid"] == 0
+
+    def apply_ops(self, ops: Iterable[dict]) -> Dict[str, int]:
+        """Merge a batch of wire ops; returns counts of applied, stale and invalid ops.
+
+        Conflicts are resolved in memory under one hold of the lock; the
+        winning rows and version-vector advances are then persisted with one
+        executemany each, in a single write-behind transaction.
+        """
+        self._ensure_loaded()
+        applied = stale = invalid = 0
+        rows, raised = [], {}
+        with self._lock:
+            rid = self.replica_id
+            self._deferred = []
+            try:
+                for op in ops:
+                    if (parsed := _parse_op(op)) is None:
+                        invalid += 1
+                        continue
+                    src, rel, dst, ts, origin, seq, removed = parsed
+                    if not origin:
+                        # Peer without replication support: adopt as a local write.
+                        if not self._wins(self._find(_pack(self._intern(src), self._intern(rel), self._intern(dst))), ts, removed):
+                            stale += 1
+                            continue
+                        origin, seq = rid, self._vv.get(rid, 0) + 1
+                        self._vv[rid] = raised[rid] = seq
+                    if (row := self._merge(src, rel, dst, ts, origin, seq, removed)) is None:
+                        stale += 1
+                    else:
+                        rows.append(row)
+                        applied += 1
+                    # A pushed op only extends the version vector when it is the next
+                    # one from its replica; gaps are filled by anti-entropy.
+                    if seq == self._vv.get(origin, 0) + 1:
+                        self._vv[origin] = raised[origin] = seq
+            finally:
+                self._index_deferred()
+                self._persist(rows, list(raised.items()))
+        return {"applied": applied, "stale": stale, "invalid": invalid}
+
+    # --- anti-entropy -----------------------------------------------------
+
+    def version_vector(self) -> Dict[str, int]:
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._vv)
+
+    def delta_since(self, since: Dict[str, int]) -> Tuple[List[list], Dict[str, int]]:
+        """Rows a peer with version vector `since` is missing, by origin and seq.
+
+        Returns the rows and this replica's version vector taken at the same
+        moment; once the peer has merged every row it may raise its vector to
+        that one. Cost is a vectorized scan per origin the peer is behind on.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            behind = [(self._ids[r], since.get(r, 0)) for r, v in self._vv.items()
+                      if v > since.get(r, 0) and r in self._ids]
+            if not behind:
+                return [], dict(self._vv)
+            origin = np.frombuffer(self._origin, dtype=np.int32)
+            seq = np.frombuffer(self._seq, dtype=np.int64)
+            slots = np.concatenate([np.flatnonzero((origin == o) & (seq > lo)) for o, lo in behind])
+            slots = slots[np.lexsort((seq[slots], origin[slots]))].tolist()
+            del origin, seq
+            return [self._row_at(s) for s in slots], dict(self._vv)
+
+    def merge_rows(self, rows: List[list], upto: Optional[Dict[str, int]] = None) -> int:
+        """Merge rows from a peer (delta or repair); returns how many won.
+
+        `upto` is the sender's version vector, given with the last batch of a
+        delta: everything it covers is now known here. Malformed rows are
+        skipped, as `apply_ops` skips malformed ops.
+        """
+        self._ensure_loaded()
+        parsed = [r for r in map(_parse_row, rows if isinstance(rows, list) else []) if r is not None]
+        upto = _parse_vv(upto)
+        with self._lock:
+            self._deferred = []
+            won, raised = [], []
+            try:
+                for src, rel, dst, ts, origin, seq, removed in parsed:
+                    # A tombstone whose dot this replica has seen but whose
+                    # key it no longer holds was compacted here already.
+                    if removed and seq <= self._vv.get(origin, 0) and not self._holds(src, rel, dst):
+                        continue
+                    if (row := self._merge(src, rel, dst, ts, origin, seq, removed)) is not None:
+                        won.append(row)
+                raised = [(r, v) for r, v in upto.items() if v > self._vv.get(r, 0)]
+                self._vv.update(raised)
+            finally:
+                # Whatever was merged is persisted, even if the batch failed
+                # part way, so memory and disk do not diverge.
+                self._index_deferred()
+                self._persist(won, raised)
+        return len(won)
+
+    def _ensure_hashes(self):
+        # Caller holds the lock.
+        if self._leaf is not None:
+            return
+        keys = [self._key_str(i) for i in range(len(self._ts))]
+        leaf = array("H", map(_leaf_of, keys))
+        hashes = np.fromiter(map(_row_hash, keys, self._ts, self._removed), dtype=np.uint64, count=len(keys))
+        acc = np.zeros(_LEAVES, dtype=np.uint64)
+        np.bitwise_xor.at(acc, np.frombuffer(leaf, dtype=np.uint16), hashes)
+        self._leaf, self._leaf_hash = leaf, acc
+
+    def digest(self) -> dict:
+        """What a sync round opens with: replica id, version vector, root hash."""
+        self._ensure_loaded()
+        with self._lock:
+            self._ensure_hashes()
+            root = np.bitwise_xor.reduce(self._leaf_hash)
+            # The vectors other replicas reported here travel along, so
+            # replicas that never talk directly still learn each other's
+            # acknowledgements (a partial mesh can compact too).
+            acks = {r: dict(vv) for r, vv in self._acks.items() if vv is not None}
+            return {"replica": self.replica_id, "vv": dict(self._vv), "root": format(int(root), "016x"), "acks": acks}
+
+    def tree_hashes(self) -> List[str]:
+        """Hashes of the top level of the tree (one per _FANOUT buckets)."""
+        self._ensure_loaded()
+        with self._lock:
+            self._ensure_hashes()
+            top = np.bitwise_xor.reduce(self._leaf_hash.reshape(-1, _FANOUT), axis=1)
+        return [format(int(h), "016x") for h in top]
+
+    def leaf_hashes(self, nodes: List[int]) -> Dict[int, List[str]]:
+        self._ensure_loaded()
+        with self._lock:
+            self._ensure_hashes()
+            return {n: [format(int(h), "016x") for h in self._leaf_hash[n * _FANOUT:(n + 1) * _FANOUT]] for n in nodes}
+
+    def differing_leaves(self, theirs: Dict[int, List[str]]) -> List[int]:
+        mine = self.leaf_hashes(list(theirs))
+        return [n * _FANOUT + j for n, hs in theirs.items() for j, (a, b) in enumerate(zip(mine[n], hs)) if a != b]
+
+    def rows_in_leaves(self, leaves: List[int]) -> List[list]:
+        self._ensure_loaded()
+        with self._lock:
+            self._ensure_hashes()
+            slots = np.flatnonzero(np.isin(np.frombuffer(self._leaf, dtype=np.uint16), leaves)).tolist()
+            return [self._row_at(s) for s in slots]
+
+    # --- tombstone compaction ----------------------------------------------
+
+    def note_peer(self, replica: str, vv: Dict[str, int]):
+        """Record the version vector a peer replica reported (its acknowledgements).
+
+        Reports may arrive relayed and out of date; a replica's vector only
+        grows, so entries are merged by maximum.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            if replica == self.replica_id or (replica in self._acks and self._acks[replica] is None):
+                return
+            merged = dict(self._acks.get(replica) or {})
+            for r, v in _parse_vv(vv).items():
+                merged[r] = max(merged.get(r, 0), v)
+            if merged == self._acks.get(replica):
+                return
+            self._acks[replica] = vv = merged
+            self.db.write("INSERT OR REPLACE INTO replica_acks(replica, vv, seen_at) VALUES (?, ?, ?)",
+                          (replica, json.dumps(vv), time.time()))
+
+    def note_acks(self, acks: Dict[str, Dict[str, int]]):
+        """Record the vectors a peer relayed from the replicas it talks to."""
+        for replica, vv in acks.items():
+            if isinstance(replica, str) and replica and isinstance(vv, dict):
+                self.note_peer(replica, vv)
+
+    def forget_replica(self, replica: str):
+        """Stop waiting for a replica that is gone for good (it would block compaction).
+
+        Required for a replica that left the mesh: no peer will ever relay a
+        newer vector for it, so its tombstones would never be compacted.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            self._acks[replica] = None
+            self.db.write("INSERT OR REPLACE INTO replica_acks(replica, vv, seen_at) VALUES (?, NULL, ?)", (replica, time.time()))
+
+    def compact(self) -> int:
+        """Drop the tombstones every known replica has acknowledged; returns how many.
+
+        Known replicas are those that wrote to the graph or reported a version
+        vector. A tombstone is acknowledged by a replica once that replica's
+        last reported vector (sent directly or relayed in another peer's
+        digest) covers the tombstone's dot; from then on no replica holds an
+        older add for it, so it can go. A replica no peer hears from any more
+        holds compaction up until `forget_replica`. The rows are
+        deleted in one transaction and the in-memory graph is rebuilt, so run
+        this occasionally (the sync loop does, when there are tombstones).
+        """
+        self._ensure_loaded()
+        with self._emb_lock, self._lock:
+            if not self._n_removed:
+                return 0
+            others = [r for r in set(self._vv) | set(self._acks) if r != self.replica_id and self._acks.get(r, {}) is not None]
+            floor = {o: min((self._acks.get(r) or {}).get(o, 0) for r in others) if others else self._vv.get(o, 0)
+                     for o in self._vv}
+            st, origin, seq = self._strs, self._origin, self._seq
+            dead = [(self._key_str(s),) for s in np.flatnonzero(np.frombuffer(self._removed, dtype=np.int8)).tolist()
+                    if seq[s] <= floor.get(st[origin[s]], 0)]
+            if not dead:
+                return 0
+            def purge(conn: sqlite3.Connection):
+                conn.executemany("DELETE FROM relations WHERE key=? AND removed=1", dead)
+                conn.executemany("DELETE FROM relation_embeddings WHERE key=?", dead)
+            self.db.flush()
+            self.db.transact(purge).result()
+            # Slots are positional (columns, indexes, embedding rows), so
+            # rebuild rather than punch holes; embeddings reload from the DB.
+            self._reset()
+            self._load()
+        return len(dead)
+
+    def recent(self, n: int = 10) -> List[Rel]:
+        """The n most recently written relations, newest first (O(n))."""
+        self._ensure_loaded()
+        out: List[Rel] = []
+        with self._lock:
+            for slot in self._iter_recent():
+                if len(out) >= n:
+                    break
+                out.append(self._rel_at(slot))
+        return out
+
+    def neighbors(self, node: str, direction: str = "both", limit: Optional[int] = None) -> List[Rel]:
+        """Relations with `node` as src ("out"), dst ("in") or either, newest first."""
+        self._ensure_loaded()
+        with self._lock:
+            i = self._ids.get(node)
+            if i is None:
+                return []
+            parts = []
+            if direction in ("out", "both") and i in self._out: parts.append(np.frombuffer(self._out[i], dtype=np.int32))
+            if direction in ("in", "both") and i in self._in: parts.append(np.frombuffer(self._in[i], dtype=np.int32))
+            if not parts:
+                return []
+            # Zero-copy views of the arrays; they must not outlive the lock
+            # (a live buffer export makes array.append raise).
+            slots = np.unique(np.concatenate(parts)) if len(parts) > 1 else parts[0]
+            if self._n_removed:
+                slots = slots[np.frombuffer(self._removed, dtype=np.int8)[slots] == 0]
+            ts = np.frombuffer(self._ts, dtype=np.float64)[slots]
+            if limit is not None and limit < len(slots):
+                top = np.argpartition(-ts, limit - 1)[:limit]
+                slots, ts = slots[top], ts[top]
+            ranked = slots[np.argsort(-ts, kind="stable")].tolist()
+            del parts, slots, ts
+            return [self._rel_at(s) for s in ranked]
+
+    def _ensure_embeddings(self, encode: Callable[[List[str]], np.ndarray], dim: int):
+        # Caller holds _emb_lock (slots cannot be renumbered by compact).
+        with self._lock:
+            if self._emb is not None and self._emb.shape[1] != dim:
+                self._emb, self._emb_n = None, 0  # embedding model changed
+                self._emb_skipped.clear()
+            start, end = self._emb_n, len(self._ts)
+            revived = [s for s in self._emb_skipped if not self._removed[s]]
+            if start >= end and not revived:
+                return
+            skipped = [i for i in range(start, end) if self._removed[i]]
+            todo = [i for i in range(start, end) if not self._removed[i]] + revived
+            rels = [self._rel_at(i) for i in todo]
+        keys = [f"{r.src}|{r.rel}|{r.dst}" for r in rels]
+        stored = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            stored.update(self.db.query(f"SELECT key, embedding FROM relation_embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+        vecs = np.zeros((len(rels), dim), dtype=np.float32)
+        missing = []
+        for i, k in enumerate(keys):
+            blob = stored.get(k)
+            if blob is not None and len(blob) == dim * 4:
+                vecs[i] = np.frombuffer(blob, dtype=np.float32)
+            else:
+                missing.append(i)
+        if missing:
+            enc = np.asarray(encode([f"{rels[i].src} {rels[i].rel} {rels[i].dst}" for i in missing]), dtype=np.float32)
+            vecs[missing] = enc
+            self.db.write_many("INSERT OR REPLACE INTO relation_embeddings(key, embedding) VALUES (?,?)",
+                               [(keys[i], enc[j].tobytes()) for j, i in enumerate(missing)])
+        with self._lock:
+            if self._emb is None or len(self._emb) < end:
+                grown = np.zeros((max(end, 2 * (0 if self._emb is None else len(self._emb)), 64), dim), dtype=np.float32)
+                if self._emb is not None:
+                    grown[:start] = self._emb[:start]
+                self._emb = grown
+            self._emb[skipped] = 0.0
+            self._emb[todo] = vecs
+            self._emb_skipped.difference_update(revived)
+            self._emb_skipped.update(skipped)
+            self._emb_n = end
+
+    def relevant(self, q: np.ndarray, n: int, encode: Callable[[List[str]], np.ndarray],
+                 recency_weight: float = 0.2, half_life_days: float = 30.0) -> List[Rel]:
+        """Top n relations for a normalized query vector, best first.
+
+        Score = (1 - w) * cosine(query, "src rel dst") + w * 2^(-age / half_life),
+        one matrix-vector product over all relations. `encode` embeds the
+        relations not embedded yet (normally just the ones added since the
+        last call); pass the same encoder that produced `q`.
+        """
+        self._ensure_loaded()
+        # _emb_lock is held until the top slots are mapped to relations: a
+        # compact() in between would renumber every slot.
+        with self._emb_lock:
+            self._ensure_embeddings(encode, len(q))
+            with self._lock:
+                m = self._emb_n
+                if m == 0 or n <= 0:
+                    return []
+                emb = self._emb[:m]
+                ts = np.frombuffer(self._ts, dtype=np.float64)[:m].copy()  # copy: no live export of the array
+                dead = np.flatnonzero(np.frombuffer(self._removed, dtype=np.int8)[:m]) if self._n_removed else None
+            age = np.maximum(time.time() - ts, 0.0)
+            score = (1.0 - recency_weight) * (emb @ q) + recency_weight * np.exp2(-age / (half_life_days * 86400.0))
+            if dead is not None and len(dead):
+                score[dead] = -np.inf
+                m -= len(dead)
+                if m <= 0:
+                    return []
+            n = min(n, m)
+            top = np.argpartition(-score, n - 1)[:n]
+            top = top[np.argsort(-score[top])]
+            with self._lock:
+                return [self._rel_at(int(i)) for i in top]
+
+    def facts_for_query(self, q: np.ndarray, n: int, encode: Callable[[List[str]], np.ndarray]) -> str:
+        return "\n".join(f"{r.src} {r.rel} {r.dst}" for r in self.relevant(q, n, encode))
 
     def facts_for_prompt(self, n: int = 10) -> str:
-        top = sorted(self._rels.values(), key=lambda r: r.ts, reverse=True)[:n]
-        return "\n".join([f"{r.src} {r.rel} {r.dst}" for r in top])
\ No newline at end of file
+        return "\n".join(f"{r.src} {r.rel} {r.dst}" for r in self.recent(n))
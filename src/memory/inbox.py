@@ -1,36 +1,108 @@
-import sqlite3
-from pathlib import Path
+import asyncio, sqlite3
 from datetime import datetime
-from typing import List, Tuple
-from ..utils.db import configure_sqlite
+from typing import Iterable, List, Optional, Tuple
+from ..utils.storage import SQLiteStore
+
+def _norm(s: str) -> str:
+    return " ".join(s.split()).casefold()
+
+def norm_key(src: str, rel: str, dst: str) -> str:
+    """Dedup key of a triple: case- and whitespace-insensitive."""
+    return f"{_norm(src)}|{_norm(rel)}|{_norm(dst)}"
+
+# DELETE ... RETURNING needs SQLite 3.35; older builds select, then delete.
+_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def _schema(conn: sqlite3.Connection):
+    conn.execute("CREATE TABLE IF NOT EXISTS pending(id INTEGER PRIMARY KEY, src TEXT, rel TEXT, dst TEXT, confidence REAL, created_at TEXT, norm_key TEXT)")
+    if "norm_key" not in {row[1] for row in conn.execute("PRAGMA table_info(pending)")}:
+        conn.execute("ALTER TABLE pending ADD COLUMN norm_key TEXT")
+    # Key rows from before deduplication; of each group of duplicates the
+    # oldest row survives with the group's highest confidence.
+    rows = conn.execute("SELECT id, src, rel, dst, confidence, norm_key FROM pending ORDER BY id").fetchall() \
+        if conn.execute("SELECT 1 FROM pending WHERE norm_key IS NULL LIMIT 1").fetchone() else []
+    keep, drop = {}, []
+    for i, s, r, d, conf, key in rows:
+        key = key or norm_key(s, r, d)
+        if key in keep:
+            keep[key][1] = max(keep[key][1], conf or 0.0)
+            drop.append((i,))
+        else:
+            keep[key] = [i, conf or 0.0]
+    conn.executemany("DELETE FROM pending WHERE id=?", drop)
+    conn.executemany("UPDATE pending SET norm_key=?, confidence=? WHERE id=?", [(k, c, i) for k, (i, c) in keep.items()])
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_pending_key ON pending(norm_key)")
+
+# A triple seen again only raises the pending item's confidence.
+_UPSERT = ("INSERT INTO pending(src,rel,dst,confidence,created_at,norm_key) VALUES (?,?,?,?,?,?) "
+           "ON CONFLICT(norm_key) DO UPDATE SET confidence=max(confidence, excluded.confidence)")
+# SQLite's default limit on bound parameters is 999 on older builds.
+_CHUNK = 500
 
 class MemoryInbox:
-    def __init__(self, db_path: str):
-        Path(Path(db_path).parent).mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        configure_sqlite(self.conn)
-        c = self.conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS pending(id INTEGER PRIMARY KEY, src TEXT, rel TEXT, dst TEXT, confidence REAL, created_at TEXT)")
-        self.conn.commit()
+    """Distilled facts waiting for the user's approval.
+
+    Items are deduplicated by `norm_key` (unique index + upsert keeping the
+    highest confidence), and triples already in the fact graph, when one is
+    given, are not queued at all.
+    """
+
+    def __init__(self, db_path: str, graph=None):
+        self.db = SQLiteStore(db_path, _schema)
+        self.graph = graph
+
+    def _known(self, src: str, rel: str, dst: str) -> bool:
+        return self.graph is not None and self.graph.contains_norm(src, rel, dst)
 
     def add(self, src: str, rel: str, dst: str, conf: float = 0.8):
-        c = self.conn.cursor()
-        c.execute("INSERT INTO pending(src,rel,dst,confidence,created_at) VALUES (?,?,?,?,?)",
-                  (src, rel, dst, conf, datetime.utcnow().isoformat()))
-        self.conn.commit()
+        self.add_many([(src, rel, dst, conf)])
+
+    def add_many(self, items: Iterable[Tuple[str, str, str, float]]) -> int:
+        """Queue several triples in one write; returns how many were not already in the graph."""
+        now = datetime.utcnow().isoformat()
+        rows = [(s, r, d, conf, now, norm_key(s, r, d)) for s, r, d, conf in items if not self._known(s, r, d)]
+        if rows:
+            self.db.write_many(_UPSERT, rows)
+        return len(rows)
+
+    async def aadd_many(self, items: Iterable[Tuple[str, str, str, float]]) -> int:
+        # The graph lookups take its lock (and build its key index once).
+        return await asyncio.get_event_loop().run_in_executor(None, self.add_many, list(items))
+
+    def count_pending(self) -> int:
+        self.db.flush()
+        return self.db.query_one("SELECT COUNT(*) FROM pending")[0]
 
-    def list_pending(self) -> List[Tuple[int, str, str, str]]:
-        c = self.conn.cursor()
-        c.execute("SELECT id,src,rel,dst FROM pending ORDER BY id")
-        return c.fetchall()
+    def list_pending(self, limit: Optional[int] = None, after_id: int = 0) -> List[Tuple[int, str, str, str]]:
+        """Pending items in id order; page with limit and the last id of the previous page."""
+        self.db.flush()
+        return self.db.query("SELECT id,src,rel,dst FROM pending WHERE id>? ORDER BY id LIMIT ?",
+                             (after_id, -1 if limit is None else limit))
+
+    async def alist_pending(self, limit: Optional[int] = None, after_id: int = 0) -> List[Tuple[int, str, str, str]]:
+        return await self.db.run_read(self.list_pending, limit, after_id)
+
+    @staticmethod
+    def _pop_fn(fact_ids: List[int]):
+        def _pop(conn):
+            out = []
+            for i in range(0, len(fact_ids), _CHUNK):
+                chunk = fact_ids[i:i + _CHUNK]
+                marks = ",".join("?" * len(chunk))
+                if _RETURNING:
+                    out += conn.execute(f"DELETE FROM pending WHERE id IN ({marks}) RETURNING id,src,rel,dst,confidence", chunk).fetchall()
+                else:
+                    out += conn.execute(f"SELECT id,src,rel,dst,confidence FROM pending WHERE id IN ({marks})", chunk).fetchall()
+                    conn.execute(f"DELETE FROM pending WHERE id IN ({marks})", chunk)
+            # RETURNING order is unspecified; hand rows back in the order asked.
+            order = {fid: n for n, fid in enumerate(fact_ids)}
+            return [row[1:] for row in sorted(out, key=lambda row: order[row[0]])]
+        return _pop
 
     def pop(self, fact_ids: List[int]) -> List[Tuple[str, str, str, float]]:
-        out, c = [], self.conn.cursor()
-        for i in fact_ids:
-            c.execute("SELECT src,rel,dst,confidence FROM pending WHERE id=?", (i,))
-            row = c.fetchone()
-            if row:
-                out.append(row)
-                c.execute("DELETE FROM pending WHERE id=?", (i,))
-        self.conn.commit()
-        return out
\ No newline at end of file
+        # Select+delete must be atomic with respect to other queued writes, so
+        # it runs on the writer thread; the caller needs the rows, so wait.
+        return self.db.transact(self._pop_fn(fact_ids)).result()
+
+    async def apop(self, fact_ids: List[int]) -> List[Tuple[str, str, str, float]]:
+        return await self.db.atransact(self._pop_fn(fact_ids))
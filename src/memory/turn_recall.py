@@ -0,0 +1,123 @@
+# src/memory/turn_recall.py
+import asyncio, threading
+from typing import Callable, List, Optional, Tuple
+import numpy as np
+from .conversation_store import ConversationMemory
+from .vector_store import LiteVectorStore, _to_blob, _from_blob
+from ..core.prompt_budget import estimate_tokens
+
+# Text embedded per turn; long answers are clipped, the opening carries the topic.
+_EMBED_CHARS = 1000
+# Text shown in the prompt per recalled turn.
+_SHOW_USER_CHARS, _SHOW_ASSISTANT_CHARS = 300, 600
+
+class TurnRecall:
+    """Semantic recall over every past conversation turn, in any session.
+
+    Completed turns are embedded in the background with the knowledge-base
+    encoder into `turn_embeddings` (conversation DB), incrementally from the
+    highest indexed turn id. Queries score an in-memory matrix of all turn
+    vectors, loaded once and extended as new turns are indexed. Vectors of
+    another dimension than the encoder's (the embedding model changed) are
+    dropped and every turn is indexed again.
+    """
+
+    def __init__(self, mem: ConversationMemory, kb: LiteVectorStore, min_score: float = 0.35, batch: int = 64):
+        self.mem, self.kb, self.min_score, self.batch = mem, kb, min_score, batch
+        self._lock = threading.Lock()
+        self._ids: Optional[np.ndarray] = None
+        self._embs: Optional[np.ndarray] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _load(self):
+        # Called with the lock held.
+        if self._ids is None:
+            rows = self.mem.db.query("SELECT turn_id, embedding FROM turn_embeddings ORDER BY turn_id")
+            if len({len(r[1]) for r in rows}) > 1:
+                return self._reset(0)  # a re-index under a new model was cut short
+            dim = len(_from_blob(rows[0][1])) if rows else 0
+            self._ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+            self._embs = np.vstack([_from_blob(r[1]) for r in rows]) if rows else np.zeros((0, dim), dtype=np.float32)
+
+    def _reset(self, dim: int):
+        # Called with the lock held: forget every vector, so indexing starts
+        # over from the first turn.
+        if self._ids is not None and len(self._ids):
+            print(f"[Recall] embedding size changed to {dim}, re-indexing all turns")
+        self.mem.db.write("DELETE FROM turn_embeddings")
+        self._ids, self._embs = np.zeros(0, dtype=np.int64), np.zeros((0, dim), dtype=np.float32)
+
+    def index_pending(self) -> int:
+        """Embed every turn not indexed yet; returns how many were added."""
+        self.mem.db.flush()
+        added = 0
+        while True:
+            with self._lock:
+                self._load()
+                high = int(self._ids[-1]) if len(self._ids) else 0
+            rows = self.mem.db.query("SELECT id, user, assistant FROM conversations WHERE id>? ORDER BY id LIMIT ?", (high, self.batch))
+            if not rows:
+                return added
+            embs = self.kb.encode([f"User: {u}\nAssistant: {a}"[:_EMBED_CHARS] for _, u, a in rows])
+            with self._lock:
+                if len(self._embs) and self._embs.shape[1] != embs.shape[1]:
+                    self._reset(embs.shape[1])
+                    continue
+            self.mem.db.write_many("INSERT OR REPLACE INTO turn_embeddings(turn_id, embedding) VALUES (?,?)",
+                                   [(i, _to_blob(e)) for (i, _, _), e in zip(rows, embs)]).result()
+            with self._lock:
+                self._ids = np.concatenate([self._ids, np.array([r[0] for r in rows], dtype=np.int64)])
+                self._embs = embs if not len(self._embs) else np.vstack([self._embs, embs])
+            added += len(rows)
+
+    def schedule(self):
+        """Index new turns in the background (after the answer has streamed)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.ensure_future(asyncio.get_event_loop().run_in_executor(None, self.index_pending))
+        self._task.add_done_callback(self._done)
+
+    @staticmethod
+    def _done(task: asyncio.Task):
+        if not task.cancelled() and (e := task.exception()) is not None:
+            print(f"[Recall] indexing failed: {e}")
+
+    def search_vector(self, q: np.ndarray, k: int = 3, exclude: Tuple[int, ...] = ()) -> List[Tuple[int, float]]:
+        with self._lock:
+            self._load()
+            if len(self._embs) and self._embs.shape[1] != len(q):
+                self._reset(len(q))  # stale model: schedule() re-indexes
+            ids, embs = self._ids, self._embs
+        if not len(ids):
+            return []
+        sims = embs @ q
+        if exclude:
+            sims[np.isin(ids, exclude)] = -1.0
+        k = min(k, len(ids))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(int(ids[i]), float(sims[i])) for i in top if sims[i] >= self.min_score]
+
+    def recall_vector(self, q: np.ndarray, session_id: str, k: int = 3, budget_tokens: int = 400,
+                      count_tokens: Callable[[str], int] = estimate_tokens) -> str:
+        """Best-matching past exchanges for a query vector, formatted for the prompt.
+
+        Turns already shown verbatim (the session's recent window) are skipped.
+        """
+        recent = tuple(i for i, _, _ in self.mem.turns_after(session_id, 0, self.mem.cache_turns, newest=True))
+        hits = self.search_vector(q, k, recent)
+        if not hits:
+            return ""
+        marks = ",".join("?" * len(hits))
+        rows = {r[0]: r for r in self.mem.db.query(f"SELECT id, ts, user, assistant FROM conversations WHERE id IN ({marks})", [i for i, _ in hits])}
+        out, used = [], 0
+        for i, _ in hits:
+            if i not in rows:
+                continue
+            _, ts, u, a = rows[i]
+            block = f"[{(ts or '')[:10]}] User: {u[:_SHOW_USER_CHARS]}\nAssistant: {a[:_SHOW_ASSISTANT_CHARS]}"
+            cost = count_tokens(block)
+            if used + cost > budget_tokens:
+                break
+            out.append(block); used += cost
+        return "\n\n".join(out)
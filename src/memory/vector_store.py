@@ -1,47 +1,63 @@
 import sqlite3
 from datetime import datetime
-from pathlib import Path
+from typing import List, Optional, Tuple
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from ..utils.db import configure_sqlite
+from ..utils.storage import SQLiteStore
 
 def _to_blob(vec: np.ndarray) -> bytes: return vec.astype(np.float32).tobytes()
 def _from_blob(blob: bytes) -> np.ndarray: return np.frombuffer(blob, dtype=np.float32)
 
+def _schema(conn: sqlite3.Connection):
+    conn.execute("CREATE TABLE IF NOT EXISTS docs(id INTEGER PRIMARY KEY, source TEXT, chunk_idx INTEGER, text TEXT, embedding BLOB, ts TEXT)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_source ON docs(source)")
+
 class LiteVectorStore:
-    def __init__(self, db_path: str, embedding_model: str):
-        Path(Path(db_path).parent).mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        configure_sqlite(self.conn)
-        self.model = SentenceTransformer(embedding_model)
-        c = self.conn.cursor()
-        c.execute("CREATE TABLE IF NOT EXISTS docs(id INTEGER PRIMARY KEY, source TEXT, chunk_idx INTEGER, text TEXT, embedding BLOB, ts TEXT)")
-        c.execute("CREATE INDEX IF NOT EXISTS idx_source ON docs(source)")
-        self.conn.commit()
+    def __init__(self, db_path: str, embedding_model: str, encoder: Optional[object] = None):
+        self.db = SQLiteStore(db_path, _schema)
+        # Any object with a SentenceTransformer-compatible encode() can be
+        # injected (benchmarks use a deterministic stub); otherwise load the
+        # configured model. Imported lazily so stub runs need no torch.
+        if encoder is None:
+            from sentence_transformers import SentenceTransformer
+            encoder = SentenceTransformer(embedding_model)
+        self.model = encoder
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.encode([query])[0]
 
     def add_document(self, text: str, source: str = "user", chunk_size: int = 500, overlap: int = 50) -> int:
         step = max(1, chunk_size - max(0, overlap))
         chunks = [text[i:i+chunk_size] for i in range(0, max(len(text), 1), step)]
         if not chunks:
             return 0
-        embs = self.model.encode(chunks, normalize_embeddings=True)
-        c = self.conn.cursor()
-        for idx, (t, e) in enumerate(zip(chunks, embs)):
-            c.execute(
-                "INSERT INTO docs(source,chunk_idx,text,embedding,ts) VALUES (?,?,?,?,?)",
-                (source, idx, t, _to_blob(e), datetime.utcnow().isoformat())
-            )
-        self.conn.commit()
+        embs = self.encode(chunks)
+        ts = datetime.utcnow().isoformat()
+        # One executemany, group-committed with any other queued writes. Wait
+        # for it so a kb_query right after kb_add sees the new chunks.
+        self.db.write_many(
+            "INSERT INTO docs(source,chunk_idx,text,embedding,ts) VALUES (?,?,?,?,?)",
+            [(source, idx, t, _to_blob(e), ts) for idx, (t, e) in enumerate(zip(chunks, embs))],
+            urgent=True,
+        ).result()
         return len(chunks)
 
-    def retrieve_context(self, query: str, k: int = 3) -> str:
-        q = self.model.encode([query], normalize_embeddings=True)[0]
-        c = self.conn.cursor()
-        c.execute("SELECT text, embedding FROM docs")
-        rows = c.fetchall()
+    def search_vector(self, q: np.ndarray, k: int = 3) -> List[Tuple[int, float, str]]:
+        """Top-k (doc id, cosine score, text) for an already-normalized query
+        vector: exact, scoring every stored chunk."""
+        rows = self.db.query("SELECT id, text, embedding FROM docs")
         if not rows:
-            return ""
-        texts, sims = zip(*[(t, float(np.dot(q, _from_blob(blob)))) for t, blob in rows])
-        import numpy as _np
-        idxs = _np.argsort(sims)[::-1][:k]
-        return "\n\n".join([texts[i] for i in idxs])
\ No newline at end of file
+            return []
+        sims = np.fromiter((float(np.dot(q, _from_blob(blob))) for _, _, blob in rows), dtype=np.float32, count=len(rows))
+        k = min(k, len(rows))
+        idxs = np.argpartition(-sims, k - 1)[:k]
+        idxs = idxs[np.argsort(-sims[idxs])]
+        return [(rows[i][0], float(sims[i]), rows[i][1]) for i in idxs]
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[int, float, str]]:
+        return self.search_vector(self.embed_query(query), k)
+
+    def retrieve_context(self, query: str, k: int = 3) -> str:
+        return "\n\n".join(t for _, _, t in self.search(query, k))
@@ -1,5 +1,5 @@
 import asyncio, json, base64, uuid, time
-from typing import Dict, Optional, Callable, Awaitable
+from typing import Dict, Optional, Callable, Awaitable, Tuple
 from nacl.public import PrivateKey as CurvePriv, PublicKey as CurvePub, Box
 from nacl.utils import random as nacl_random
 from .p2p import P2P
@@ -20,6 +20,7 @@ class SessionManager:
         self._pending_inv: Dict[str, tuple] = {}
         self.on_consent_request: Optional[Callable[[str, str, dict], Awaitable[bool]]] = None
         self.on_session_message: Optional[Callable[[str, dict], Awaitable[None]]] = None
+        self._calls: Dict[str, Tuple[str, asyncio.Future]] = {}  # request id -> (session id, reply future)
 
     async def start_maintenance(self, max_age_sec: int = 1800):
         while True:
@@ -28,6 +29,7 @@ class SessionManager:
             stale = [sid for sid, s in self.sessions.items() if now - s.created_at > max_age_sec]
             for sid in stale:
                 self.sessions.pop(sid, None)
+                self._fail_calls(sid)
 
     async def initiate(self, peer_id: str, ctx: str, scope: dict, ttl_sec: int = 600) -> str:
         sid = f"ses-{uuid.uuid4().hex[:8]}"
@@ -65,14 +67,59 @@ class SessionManager:
         if (pending := self._pending_inv.get(payload["session_id"])):
             pending[0].set_result(False); self._pending_inv.pop(payload["session_id"], None)
     
-    async def send_session(self, sid: str, payload: dict):
+    async def send_session(self, sid: str, payload: dict) -> Optional[str]:
+        """Send over the session; returns P2P.send_encrypted's error string if it was not sent."""
         if not (sess := self.sessions.get(sid)): raise ValueError("Unknown session")
         nonce = nacl_random(Box.NONCE_SIZE)
         ct = sess.box.encrypt(json.dumps(payload).encode(), nonce)
-        await self.p2p.send_encrypted(sess.peer_id, "kairos_session_msg", {"session_id": sid, "nonce_s": b64(nonce), "ciphertext_s": b64(ct.ciphertext)})
+        return await self.p2p.send_encrypted(sess.peer_id, "kairos_session_msg", {"session_id": sid, "nonce_s": b64(nonce), "ciphertext_s": b64(ct.ciphertext)})
+
+    async def request(self, sid: str, payload: dict, timeout: float = 30.0) -> dict:
+        """Send `payload` with a fresh request id and return the peer's reply
+        (the "result" message carrying that id).
+
+        Any number of requests may be in flight per session; replies are
+        matched by id in whatever order they arrive. On timeout
+        (asyncio.TimeoutError) or cancellation the peer is told to drop the
+        request. Raises ConnectionError if the request could not be sent or
+        the session expires meanwhile.
+        """
+        rid = uuid.uuid4().hex[:12]
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[rid] = (sid, fut)
+        try:
+            if (err := await self.send_session(sid, {**payload, "id": rid})) is not None:
+                raise ConnectionError(err.removeprefix("Error: "))
+            return await asyncio.wait_for(fut, timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if sid in self.sessions:
+                try: await self.send_session(sid, {"type": "cancel", "id": rid})
+                except Exception: pass
+            raise
+        finally:
+            self._calls.pop(rid, None)
+
+    def _fail_calls(self, sid: str):
+        for rid, (s, fut) in list(self._calls.items()):
+            if s == sid and not fut.done():
+                fut.set_exception(ConnectionError(f"session {sid} closed"))
 
     async def _on_session_msg(self, env: dict):
         payload = self.p2p.decrypt_from(env["sender_pub"], env["nonce"], env["ciphertext"])
-        if not (sess := self.sessions.get(payload["session_id"])): return
-        inner = sess.box.decrypt(b64d(payload["ciphertext_s"]), b64d(payload["nonce_s"]))
-        if self.on_session_message: await self.on_session_message(payload["session_id"], json.loads(inner))
\ No newline at end of file
+        if not isinstance(payload, dict) or not isinstance(sid := payload.get("session_id"), str): return
+        if not (sess := self.sessions.get(sid)): return
+        try:
+            msg = json.loads(sess.box.decrypt(b64d(payload["ciphertext_s"]), b64d(payload["nonce_s"])))
+        except Exception:
+            return
+        # Anything but an object with a string id (if any) is ignored: an
+        # exception here would stop the P2P listener.
+        if not isinstance(msg, dict) or ("id" in msg and not isinstance(msg["id"], str)): return
+        # A reply to one of our requests resolves its future; replies for
+        # requests that already timed out are dropped.
+        if msg.get("type") == "result" and "id" in msg:
+            call = self._calls.get(msg["id"])
+            if call and call[0] == sid and not call[1].done():
+                call[1].set_result(msg)
+            return
+        if self.on_session_message: await self.on_session_message(sid, msg)
\ No newline at end of file
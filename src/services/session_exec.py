@@ -1,27 +1,244 @@
-from typing import Callable, Awaitable, Optional
+import asyncio, time
+from collections import deque
+from typing import Callable, Awaitable, Deque, Dict, Optional, Set, Tuple
 from ..mesh.session import SessionManager
-from ..tools.registry_async import AsyncToolRegistry
+from ..tools.registry_async import AsyncToolRegistry, ToolView
 from ..memory.vector_store import LiteVectorStore
 from ..core.config import AppConfig
 
+# Tools a peer may run through a session.
+PEER_TOOLS = ("kb_query", "fetch_url", "search_web")
+_LATENCY_SAMPLES = 200  # per peer
+_LOG_EVERY = 60.0       # at most one rejection log line per peer per minute
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.at = float(burst), time.monotonic()
+
+    def take(self) -> float:
+        """0.0 when a token was taken, else the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.at) * self.rate)
+        self.at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+def _pct(values, p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(p / 100 * len(s)))]
+
 class SessionExec:
-    def __init__(self, sessions: SessionManager):
+    """Runs tasks delegated by peers over Kairos sessions.
+
+    All sessions share one restricted view of the app's tool registry (its
+    caches and clients), registered with `register_tools`. Admission control
+    keeps peers from starving the local user:
+
+    - each peer has a token bucket (`rate_per_min`, `burst`); a task over it
+      is answered with {"error": "busy", "retry_after": seconds};
+    - at most `max_queued` tasks wait; beyond that the answer is busy too;
+    - at most `total` tasks run at once (`during_turn` while the local user
+      has a turn in flight), and at most `per_peer` of one peer; waiting
+      tasks start in arrival order as slots free up.
+
+    `stats()` reports queue depth, rejections and per-peer latency.
+
+    A task carrying an "id" (SessionManager.request) gets that id echoed in
+    its reply, and a later {"type": "cancel", "id": ...} from the same
+    session drops it, queued or running.
+    """
+    def __init__(self, sessions: SessionManager, per_peer: int = 2, total: int = 4, during_turn: int = 1,
+                 max_queued: int = 32, rate_per_min: float = 30.0, burst: int = 5):
         self.sessions = sessions
         self.kb: Optional[LiteVectorStore] = None
         self.cfg: Optional[AppConfig] = None
+        self.tools: Optional[ToolView] = None
+        self.per_peer, self.total, self.during_turn, self.max_queued = per_peer, total, during_turn, max_queued
+        self.rate, self.burst = rate_per_min / 60.0, burst
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queue: Deque[Tuple[str, asyncio.Future]] = deque()
+        self._running = 0
+        self._running_by_peer: Dict[str, int] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._by_id: Dict[Tuple[str, str], asyncio.Task] = {}  # (session, request id) -> task
+        self._stats = {"accepted": 0, "completed": 0, "failed": 0, "rejected_rate": 0, "rejected_queue": 0, "max_queue_depth": 0}
+        self._latency: Dict[str, Deque[Tuple[float, float]]] = {}  # peer -> (queue wait, total) seconds
+        self._logged: Dict[str, float] = {}
         self.sessions.on_session_message = self._handle
     
     def register_kb(self, kb: LiteVectorStore): self.kb = kb
     def register_config(self, cfg: AppConfig): self.cfg = cfg
 
+    def register_tools(self, tools: AsyncToolRegistry):
+        self.tools = tools.restricted(PEER_TOOLS)
+        # A local turn ending frees the slots it held back.
+        tools.on_idle(self._dispatch)
+
+    def _view(self) -> Optional[ToolView]:
+        # Without a registered registry, build one (once) from kb + config.
+        if self.tools is None and self.kb and self.cfg:
+            self.register_tools(AsyncToolRegistry(self.kb, self.cfg, peer_client=None))
+        return self.tools
+
+    async def _reply(self, session_id: str, rid: Optional[str], **fields):
+        msg = {"type": "result", **fields}
+        if rid is not None:
+            msg["id"] = rid
+        await self.sessions.send_session(session_id, msg)
+
     async def _handle(self, session_id: str, msg: dict):
+        rid = msg.get("id")
+        if rid is not None and not isinstance(rid, str):
+            return  # ids are strings (SessionManager.request); anything else is not a key
+        if msg.get("type") == "cancel":
+            if (task := self._by_id.get((session_id, rid))) is not None:
+                task.cancel()
+            return
         if msg.get("type") != "task": return
         tool, args = msg.get("tool",""), msg.get("args",{})
         # Defensively restrict allowed tools from peers
-        if tool not in ("kb_query","fetch_url","search_web"):
-            return await self.sessions.send_session(session_id, {"type":"result","error":"tool not allowed"})
-        # Create a temporary, restricted tool registry for this execution
-        if self.kb and self.cfg:
-            reg = AsyncToolRegistry(self.kb, self.cfg, peer_client=None)
-            res = await reg.call(tool, args)
-            await self.sessions.send_session(session_id, {"type":"result","result": res})
\ No newline at end of file
+        if tool not in PEER_TOOLS:
+            return await self._reply(session_id, rid, error="tool not allowed")
+        if (view := self._view()) is None: return
+        sess = self.sessions.sessions.get(session_id)
+        peer = sess.peer_id if sess else session_id
+        if len(self._queue) >= self.max_queued:
+            return await self._busy(session_id, rid, peer, "queue", self._queue_wait())
+        if (wait := self._bucket(peer).take()) > 0:
+            return await self._busy(session_id, rid, peer, "rate", wait)
+        self._stats["accepted"] += 1
+        # Admission is decided here, not in the task, so the queue bound holds
+        # for a burst of messages handled before any task runs.
+        task = asyncio.ensure_future(self._run(view, peer, self._admit(peer), session_id, rid, tool, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if rid is not None:
+            key = (session_id, rid)
+            self._by_id[key] = task
+            task.add_done_callback(lambda _, k=key: self._by_id.pop(k, None))
+
+    def _bucket(self, peer: str) -> TokenBucket:
+        b = self._buckets.get(peer)
+        if b is None:
+            if len(self._buckets) > 256:  # forget peers whose bucket has refilled
+                now = time.monotonic()
+                for p in [p for p, x in self._buckets.items() if now - x.at > self.burst / max(self.rate, 1e-9)]:
+                    del self._buckets[p]
+            b = self._buckets[peer] = TokenBucket(self.rate, self.burst)
+        return b
+
+    def _queue_wait(self) -> float:
+        # Rough time until a queue slot frees: recent task duration per slot.
+        recent = [t for d in self._latency.values() for _, t in d]
+        per_task = sum(recent) / len(recent) if recent else 1.0
+        return max(1.0, per_task * len(self._queue) / max(1, self._capacity()))
+
+    async def _busy(self, session_id: str, rid: Optional[str], peer: str, reason: str, retry_after: float):
+        self._stats["rejected_rate" if reason == "rate" else "rejected_queue"] += 1
+        now = time.monotonic()
+        if now - self._logged.get(peer, 0.0) > _LOG_EVERY:
+            self._logged[peer] = now
+            print(f"[SessionExec] busy ({reason}) for {peer}, retry after {retry_after:.1f}s; {self.format_stats()}")
+        await self._reply(session_id, rid, error="busy", reason=reason, retry_after=round(retry_after, 1))
+
+    def _capacity(self) -> int:
+        registry = self.tools.registry if self.tools else None
+        return self.during_turn if registry is not None and registry.interactive_turns else self.total
+
+    def _can_start(self, peer: str) -> bool:
+        return self._running < self._capacity() and self._running_by_peer.get(peer, 0) < self.per_peer
+
+    def _start(self, peer: str):
+        self._running += 1
+        self._running_by_peer[peer] = self._running_by_peer.get(peer, 0) + 1
+
+    def _dispatch(self):
+        # Start waiting tasks in arrival order; a peer at its own cap does
+        # not hold up the peers behind it.
+        for item in list(self._queue):
+            if self._running >= self._capacity():
+                break
+            peer, fut = item
+            if fut.done():
+                self._queue.remove(item)
+            elif self._can_start(peer):
+                self._queue.remove(item)
+                self._start(peer)
+                fut.set_result(None)
+
+    def _admit(self, peer: str) -> Optional[asyncio.Future]:
+        """Take a slot for `peer` now (None), or queue and return the future
+        resolved once the task may start."""
+        if not self._queue and self._can_start(peer):
+            self._start(peer)
+            return None
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.append((peer, fut))
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._queue))
+        # The tasks ahead may all be from peers at their cap; this one can
+        # still take a free slot.
+        self._dispatch()
+        return fut
+
+    def _release(self, peer: str):
+        self._running -= 1
+        n = self._running_by_peer.get(peer, 1) - 1
+        if n:
+            self._running_by_peer[peer] = n
+        else:
+            self._running_by_peer.pop(peer, None)
+        self._dispatch()
+
+    async def _run(self, view: ToolView, peer: str, admitted: Optional[asyncio.Future], session_id: str,
+                   rid: Optional[str], tool: str, args: dict):
+        t0 = time.perf_counter()
+        if admitted is not None:
+            try:
+                await admitted
+            except asyncio.CancelledError:
+                if admitted.done() and not admitted.cancelled():
+                    self._release(peer)  # admitted just as it was cancelled
+                elif (peer, admitted) in self._queue:
+                    self._queue.remove((peer, admitted))
+                raise
+        started = time.perf_counter()
+        try:
+            res = await view.call(tool, args if isinstance(args, dict) else {})
+        except Exception as e:
+            self._stats["failed"] += 1
+            print(f"[SessionExec] {tool} task for {peer} failed: {e}")
+            res = None
+        finally:
+            self._release(peer)
+            self._latency.setdefault(peer, deque(maxlen=_LATENCY_SAMPLES)).append((started - t0, time.perf_counter() - t0))
+        try:
+            if res is None:
+                # Answer anyway so a waiting requester does not sit out its timeout.
+                await self._reply(session_id, rid, error=f"{tool} failed")
+            else:
+                self._stats["completed"] += 1
+                await self._reply(session_id, rid, result=res)
+        except Exception as e:
+            print(f"[SessionExec] could not reply to {peer}: {e}")
+
+    def stats(self) -> dict:
+        """Queue depth, running tasks, counters since start and per-peer
+        latency (queue wait and total, over each peer's last 200 tasks)."""
+        out = {**self._stats, "queue_depth": len(self._queue), "running": self._running, "capacity": self._capacity(), "peers": {}}
+        for peer, d in self._latency.items():
+            waits, totals = [w for w, _ in d], [t for _, t in d]
+            out["peers"][peer] = {"tasks": len(d), "wait_p50_ms": _pct(waits, 50) * 1000,
+                                  "p50_ms": _pct(totals, 50) * 1000, "p95_ms": _pct(totals, 95) * 1000}
+        return out
+
+    def format_stats(self) -> str:
+        m = self.stats()
+        return (f"{m['running']}/{m['capacity']} running, {m['queue_depth']} queued (max {m['max_queue_depth']}); "
+                f"{m['completed']} done, {m['rejected_rate']} rate-limited, {m['rejected_queue']} queue-full")
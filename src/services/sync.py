@@ -1,19 +1,133 @@
-import time, asyncio
-from typing import List, Tuple
-from ..memory.graph_crdt import LWWGraph
+import asyncio
+from typing import Dict, List
+from ..memory.graph_crdt import LWWGraph, Rel, _covers, _parse_vv, _FANOUT, _LEAVES
 from ..mesh.p2p import P2P
 
 class SyncService:
-    def __init__(self, graph: LWWGraph, p2p: P2P):
-        self.graph, self.p2p = graph, p2p
+    """Replicates the fact graph between peers.
+
+    New relations and removals are pushed as they happen ("crdt_ops"). Peers that
+    were offline catch up through periodic anti-entropy ("crdt_sync"): every
+    round sends each online peer a digest (version vector + root hash); the
+    receiver answers with the rows the sender is missing, in batches, and
+    pulls the rows it is missing itself, so traffic follows the divergence,
+    not the graph size. When the vectors agree but the root hashes do not (a
+    restored backup, a replica rebuilt from scratch), both sides walk the
+    two-level hash tree and exchange only the rows of differing buckets.
+    Digests double as acknowledgements, and relay the ones their sender
+    received, so peers that never meet still learn each other's: after each
+    round, tombstones every known replica has seen are compacted away.
+    """
+
+    def __init__(self, graph: LWWGraph, p2p: P2P, interval_sec: float = 60.0, batch: int = 500):
+        self.graph, self.p2p, self.interval_sec, self.batch = graph, p2p, interval_sec, batch
         self.p2p.on("crdt_ops", self._on_ops)
+        self.p2p.on("crdt_sync", self._on_sync)
+        self._handlers = {"digest": self._on_digest, "pull": self._on_pull, "delta": self._on_delta,
+                          "tree": self._on_tree, "leaves": self._on_leaves, "repair": self._on_repair}
+
+    async def _run(self, fn, *args):
+        # Graph calls take its lock and may scan every row; keep them off the loop.
+        return await asyncio.get_event_loop().run_in_executor(None, fn, *args)
+
+    async def _send(self, peer: str, kind: str, **body):
+        await self.p2p.send_encrypted(peer, "crdt_sync", {"kind": kind, **body})
 
-    async def broadcast_relations(self, rels: List[Tuple[str,str,str,float]]):
-        ops = [{"op":"upsert_relation","src":s,"rel":r,"dst":d,"ts":ts} for s,r,d,ts in rels]
-        for peer in self.p2p.peers:
+    async def _send_rows(self, peer: str, kind: str, rows: List[list], **last):
+        # `last` rides on the final batch only (or alone when there are no rows).
+        for i in range(0, max(len(rows), 1), self.batch):
+            final = i + self.batch >= len(rows)
+            await self._send(peer, kind, rows=rows[i:i + self.batch], **(last if final else {}))
+
+    async def broadcast_relations(self, rels: List[Rel]):
+        ops = [{"op": "remove_relation" if r.removed else "upsert_relation", "src": r.src, "rel": r.rel, "dst": r.dst, "ts": r.ts,
+                "origin": r.origin, "seq": r.seq} for r in rels]
+        for peer in list(self.p2p.peers):
             await self.p2p.send_encrypted(peer, "crdt_ops", {"ops": ops})
 
     async def _on_ops(self, env: dict):
         payload = self.p2p.decrypt_from(env["sender_pub"], env["nonce"], env["ciphertext"])
-        if payload:
-            for op in payload.get("ops", []): self.graph.apply_op(op)
\ No newline at end of file
+        if isinstance(payload, dict) and isinstance(ops := payload.get("ops"), list):
+            counts = await self._run(self.graph.apply_ops, ops)
+            if counts["invalid"]:
+                print(f"[Sync] ops from {env.get('from')}: {counts}")
+
+    async def run(self):
+        """Anti-entropy loop; start once the P2P connection is up."""
+        while True:
+            await asyncio.sleep(self.interval_sec)
+            try:
+                await self.sync_round()
+                if self.graph.tombstones and (dropped := await self._run(self.graph.compact)):
+                    print(f"[Sync] compacted {dropped} acknowledged tombstones")
+            except Exception as e:
+                print(f"[Sync] round failed: {e}")
+
+    async def sync_round(self):
+        if not self.p2p.peers:
+            return
+        digest = await self._run(self.graph.digest)
+        for peer in list(self.p2p.peers):
+            await self._send(peer, "digest", **digest)
+
+    async def _on_sync(self, env: dict):
+        payload = self.p2p.decrypt_from(env["sender_pub"], env["nonce"], env["ciphertext"])
+        peer = env.get("from")
+        if not isinstance(payload, dict) or not peer or not (handler := self._handlers.get(payload.get("kind"))):
+            return
+        try:
+            await handler(peer, payload)
+        except Exception as e:
+            # A bad message from one peer must not take down the P2P listener.
+            print(f"[Sync] {payload.get('kind')} from {peer} failed: {e}")
+
+    async def _on_digest(self, peer: str, p: dict):
+        mine = await self._run(self.graph.digest)
+        theirs = _parse_vv(p.get("vv"))
+        if isinstance(p.get("replica"), str) and p["replica"]:
+            await self._run(self.graph.note_peer, p["replica"], theirs)
+        if isinstance(p.get("acks"), dict):
+            await self._run(self.graph.note_acks, p["acks"])
+        if not _covers(theirs, mine["vv"]):
+            await self._send_delta(peer, theirs)
+        if not _covers(mine["vv"], theirs):
+            await self._send(peer, "pull", vv=mine["vv"])
+        elif _covers(theirs, mine["vv"]) and p.get("root") != mine["root"]:
+            # Same history by the vectors, different contents: find the buckets.
+            await self._send(peer, "tree", top=await self._run(self.graph.tree_hashes))
+
+    async def _send_delta(self, peer: str, since: Dict[str, int]):
+        rows, upto = await self._run(self.graph.delta_since, since)
+        await self._send_rows(peer, "delta", rows, upto=upto)
+
+    async def _on_pull(self, peer: str, p: dict):
+        await self._send_delta(peer, _parse_vv(p.get("vv")))
+
+    async def _on_delta(self, peer: str, p: dict):
+        won = await self._run(self.graph.merge_rows, p.get("rows", []), p.get("upto"))
+        if won:
+            print(f"[Sync] {won} relations from {peer}")
+
+    async def _on_tree(self, peer: str, p: dict):
+        mine = await self._run(self.graph.tree_hashes)
+        nodes = [i for i, (a, b) in enumerate(zip(mine, p.get("top", []))) if a != b]
+        if nodes:
+            await self._send(peer, "leaves", nodes=await self._run(self.graph.leaf_hashes, nodes))
+
+    async def _on_leaves(self, peer: str, p: dict):
+        nodes = p.get("nodes")
+        theirs = {int(n): hs for n, hs in (nodes.items() if isinstance(nodes, dict) else ())
+                  if isinstance(n, str) and n.isdigit() and int(n) < _LEAVES // _FANOUT and isinstance(hs, list)}
+        leaves = await self._run(self.graph.differing_leaves, theirs)
+        if leaves:
+            # Send ours for those buckets and ask for theirs back.
+            await self._send_rows(peer, "repair", await self._run(self.graph.rows_in_leaves, leaves), leaves=leaves)
+
+    async def _on_repair(self, peer: str, p: dict):
+        won = await self._run(self.graph.merge_rows, p.get("rows", []))
+        if won:
+            print(f"[Sync] repaired {won} relations from {peer}")
+        leaves = p.get("leaves")
+        if leaves := [n for n in (leaves if isinstance(leaves, list) else [])
+                      if isinstance(n, int) and not isinstance(n, bool) and 0 <= n < _LEAVES]:
+            await self._send_rows(peer, "repair", await self._run(self.graph.rows_in_leaves, leaves))
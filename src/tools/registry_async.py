@@ -1,10 +1,15 @@
-import json, asyncio
+import json, asyncio, time
+from contextvars import ContextVar
+from dataclasses import replace
 import os
 from typing import Dict, Any, List, Callable, Optional
 from ..internet.search import WebSearch
-from ..internet.fetch import fetch_text
+from ..internet.fetch import FETCH_ERROR, FetchLimiter, blocked, fetch_many, fetch_text
 from ..internet.cache import WebCache
+from ..internet.http import HttpClient
+from .result_cache import CachePolicy, ToolResultCache, norm_int, norm_text
 from ..memory.vector_store import LiteVectorStore
+from ..memory.conversation_store import ConversationMemory
 from ..core.config import AppConfig
 import ast, operator as op
 # Note: CodeSandbox import is moved inside __init__ to support conditional registration
@@ -24,26 +29,68 @@ def _safe_eval(expr: str) -> float | int:
         raise ValueError("disallowed expression")
     return _eval(ast.parse(expr, mode="eval").body)
 
+# Tools whose results are cached. Anything without a policy always runs:
+# volatile tools (now), tools with side effects (kb_add, ingest_url,
+# code_exec) and search_history, which changes every turn. fetch_url has its
+# own page cache (WebCache).
+TOOL_CACHE_POLICIES: Dict[str, CachePolicy] = {
+    "search_web": CachePolicy(ttl_sec=900, key=(("query", norm_text), ("k", norm_int(5))), persist=True),
+    "kb_query": CachePolicy(ttl_sec=600, key=(("query", norm_text), ("k", norm_int(3))),
+                            invalidated_by=("kb_add", "ingest_url")),
+    # A page that failed to fetch is not cached along with the others: the
+    # next identical call tries it again.
+    "search_and_read": CachePolicy(ttl_sec=900, key=(("query", norm_text), ("k", norm_int(3))),
+                                   cacheable=lambda r: FETCH_ERROR not in r),
+}
+
+# Result cache hit rates are logged after a turn at most this often (seconds).
+_STATS_EVERY = 600.0
+
+# Chat session of the tool call being run, for tools that keep per-session
+# state (code_exec with assistant.code_exec_sessions).
+_session: ContextVar[Optional[str]] = ContextVar("tool_session", default=None)
+
 class AsyncToolRegistry:
-    def __init__(self, kb: LiteVectorStore, cfg: AppConfig, peer_client: Optional[object] = None):
-        self.kb, self.cfg, self.peer_client = kb, cfg, peer_client
-        self.cache = WebCache(cfg.paths.web_cache_db)
+    def __init__(self, kb: LiteVectorStore, cfg: AppConfig, peer_client: Optional[object] = None, mem: Optional[ConversationMemory] = None,
+                 compressor: Optional[object] = None):
+        self.kb, self.cfg, self.peer_client, self.mem = kb, cfg, peer_client, mem
+        self.compressor = compressor  # ObservationCompressor for search_and_read pages
+        a = cfg.assistant
+        self.cache = WebCache(cfg.paths.web_cache_db, a.web_cache_ttl_minutes, a.web_cache_max_mb * 1024 * 1024,
+                              a.web_cache_max_stale_minutes, a.web_cache_stale_while_revalidate)
+        self.http = HttpClient("Aegis/1.0", max_bytes=a.fetch_max_bytes, read_timeout=a.fetch_read_timeout_sec)
+        self.limiter = FetchLimiter(a.fetch_concurrency, a.fetch_per_domain)
+        self._prefetching: set = set()
+        # Local (interactive) turns in flight; peer work yields to them.
+        self.interactive_turns = 0
+        self._idle_callbacks: List[Callable[[], None]] = []
+        self._stats_logged = time.monotonic()
         self.searcher = WebSearch()
+        policies = {t: replace(p, ttl_sec=a.tool_cache_ttl_sec.get(t, p.ttl_sec)) for t, p in TOOL_CACHE_POLICIES.items()} \
+            if a.tool_cache else {}
+        if "search_and_read" in policies:
+            # A call without k reads search_read_pages pages; key it the same way.
+            policies["search_and_read"] = replace(policies["search_and_read"],
+                                                  key=(("query", norm_text), ("k", norm_int(a.search_read_pages))))
+        self.result_cache = ToolResultCache(policies, cfg.paths.tool_cache_db, a.tool_cache_entries)
         self.tools: Dict[str, Callable[[Dict[str, Any]], asyncio.Future]] = {
             "now": self._now,
             "calc": self._calc,
             "none": self._none,
             "search_web": self._search_web if cfg.assistant.allow_web_search else self._blocked,
             "fetch_url": self._fetch_url if cfg.assistant.allow_web_search else self._blocked,
+            "search_and_read": self._search_and_read if cfg.assistant.allow_web_search else self._blocked,
             "kb_add": self._kb_add,
             "kb_query": self._kb_query,
             "ingest_url": self._ingest_url if cfg.assistant.allow_web_search else self._blocked,
         }
+        if mem is not None:
+            self.tools["search_history"] = self._search_history
 
         # Conditionally add code_exec
         if cfg.assistant.allow_code_exec and os.getenv("AEGIS_ENABLE_CODE_EXEC", "") == "1":
             from .sandbox import CodeSandbox
-            self.sandbox = CodeSandbox()
+            self.sandbox = CodeSandbox(pool_size=a.code_exec_pool, sessions=a.code_exec_sessions)
             self.tools["code_exec"] = self._code_exec
         else:
             self.tools["code_exec"] = self._blocked_code_exec
@@ -51,21 +98,54 @@ class AsyncToolRegistry:
     def list_tools(self) -> List[str]:
         return list(self.tools.keys())
 
-    async def call(self, name: str, args: Dict[str, Any]) -> str:
+    def begin_turn(self):
+        """Mark a local user turn as in flight (pair with end_turn)."""
+        self.interactive_turns += 1
+
+    def end_turn(self):
+        self.interactive_turns -= 1
+        if not self.interactive_turns:
+            for cb in self._idle_callbacks:
+                cb()
+            if time.monotonic() - self._stats_logged > _STATS_EVERY and (stats := self.result_cache.format_stats()):
+                self._stats_logged = time.monotonic()
+                print(f"[Tools] result cache hit rates: {stats}")
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-tool result cache counts and hit rates (ToolResultCache.stats)."""
+        return self.result_cache.stats()
+
+    def on_idle(self, cb: Callable[[], None]):
+        """Call `cb` whenever the last local turn in flight ends."""
+        self._idle_callbacks.append(cb)
+
+    def restricted(self, names) -> "ToolView":
+        """A view exposing only `names`, sharing this registry's clients and caches."""
+        return ToolView(self, names)
+
+    async def call(self, name: str, args: Dict[str, Any], session_id: Optional[str] = None) -> str:
         if name not in self.tools:
             return f"Error: unknown tool '{name}'"
+        token = _session.set(session_id)
         try:
-            return await asyncio.wait_for(self.tools[name](args or {}), timeout=self.cfg.assistant.tool_timeout_sec)
+            args = args or {}
+            timeout = self.cfg.assistant.tool_timeouts_sec.get(name, self.cfg.assistant.tool_timeout_sec)
+            out = await asyncio.wait_for(self.result_cache.run(name, args, lambda: self.tools[name](args)), timeout=timeout)
+            if name == "search_web" and self.cfg.assistant.allow_web_search:
+                self._prefetch(out)
+            return out
         except asyncio.TimeoutError:
             return f"Error: tool '{name}' timed out"
         except Exception as e:
             return f"Error executing {name}: {e}"
+        finally:
+            _session.reset(token)
     
     async def _code_exec(self, a):
         code = str(a.get("code", ""))
         if not code:
             return "Error: 'code' argument required."
-        stdout, stderr, retcode = await self.sandbox.execute_python(code)
+        stdout, stderr, retcode = await self.sandbox.execute_python(code, _session.get())
         out = [f"Return Code: {retcode}"]
         if stdout: out.append(f"STDOUT:\n{stdout}")
         if stderr: out.append(f"STDERR:\n{stderr}")
@@ -92,11 +172,54 @@ class AsyncToolRegistry:
 
     async def _fetch_url(self, a):
         url = str(a.get("url",""))
-        if cached := self.cache.get(url):
-            return cached
-        text = await asyncio.get_event_loop().run_in_executor(None, fetch_text, url, "Aegis/1.0", self.cfg.assistant.allow_domains)
-        self.cache.put(url, text)
-        return text
+        return await fetch_text(url, self.http, self.cache, self.cfg.assistant.allow_domains, limiter=self.limiter)
+
+    def _result_urls(self, hits, n: int) -> List[str]:
+        allow = self.cfg.assistant.allow_domains
+        return [h["url"] for h in hits if isinstance(h, dict) and h.get("url") and not blocked(h["url"], allow)][:n]
+
+    def _prefetch(self, out: str):
+        # Speculative: while the model decides its next step, the top allowed
+        # result pages are fetched into the WebCache, so a following fetch_url
+        # is a cache hit (or joins the download already running).
+        n = self.cfg.assistant.prefetch_results
+        if n <= 0:
+            return
+        try:
+            urls = self._result_urls(json.loads(out), n)
+        except ValueError:
+            return
+        for url in urls:
+            task = asyncio.ensure_future(fetch_text(url, self.http, self.cache, self.cfg.assistant.allow_domains, limiter=self.limiter))
+            self._prefetching.add(task)
+            task.add_done_callback(self._prefetched)
+
+    def _prefetched(self, task: asyncio.Task):
+        self._prefetching.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[Tools] prefetch failed: {task.exception()}")
+
+    async def _search_and_read(self, a):
+        # One step instead of search_web plus a fetch_url per result: the top
+        # k allowed result pages are read concurrently (global and per-domain
+        # caps) and cut to the passages relevant to the query.
+        q = str(a.get("query",""))
+        k = max(1, min(int(a.get("k", self.cfg.assistant.search_read_pages)), 8))
+        # Ask for more results than pages, since some may not be allowed.
+        s_args = {"query": q, "k": max(5, 2 * k)}
+        hits = json.loads(await self.result_cache.run("search_web", s_args, lambda: self._search_web(s_args)))
+        urls = self._result_urls(hits, k)
+        if not urls:
+            return "No result page is in the allowed domains. Search results:\n" + json.dumps(hits, ensure_ascii=False)
+        texts = await fetch_many(urls, self.http, self.cache, self.cfg.assistant.allow_domains, self.limiter)
+        titles = {h["url"]: h.get("title") or "" for h in hits if isinstance(h, dict) and h.get("url")}
+        if self.compressor:
+            # Pages share the observation budget, leaving room for the headers.
+            share = max(100, (self.compressor.budget_tokens - 30 * len(urls)) // len(urls))
+            texts = await asyncio.gather(*(self.compressor.acompress(q, t, u, budget_tokens=share) for u, t in zip(urls, texts)))
+        else:
+            texts = [t[:max(800, 6000 // len(urls))] for t in texts]
+        return "\n\n".join(f"[{i}] {titles.get(u, '')} ({u})\n{t}" for i, (u, t) in enumerate(zip(urls, texts), 1))
 
     async def _kb_add(self, a):
         text = str(a.get("text","")); source = str(a.get("source","tool"))
@@ -107,12 +230,14 @@ class AsyncToolRegistry:
         q, k = str(a.get("query","")), int(a.get("k",3))
         return await asyncio.get_event_loop().run_in_executor(None, self.kb.retrieve_context, q, k)
 
+    async def _search_history(self, a):
+        q, k = str(a.get("query","")), int(a.get("k",5))
+        hits = await self.mem.asearch_history(q, k)
+        return json.dumps([{"ts": h["ts"], "user": h["user"][:300], "assistant": h["assistant"][:500]} for h in hits], ensure_ascii=False)
+
     async def _ingest_url(self, a):
         url = str(a.get("url",""))
-        text = self.cache.get(url)
-        if not text:
-            text = await self._fetch_url({"url": url})
-            self.cache.put(url, text)
+        text = await self._fetch_url({"url": url})  # served from the cache when fresh or unchanged
         n = await asyncio.get_event_loop().run_in_executor(None, self.kb.add_document, text, url)
         return f"Ingested {n} chunks from {url}"
 
@@ -120,4 +245,20 @@ class AsyncToolRegistry:
         return "Access disabled by configuration."
 
     async def _none(self, _a):
-        return ""
\ No newline at end of file
+        return ""
+
+class ToolView:
+    """Subset of an AsyncToolRegistry (e.g. the tools peers may call). Calls go
+    through the registry, so the web cache, HTTP pool, search client and
+    result cache are shared instead of built per caller."""
+
+    def __init__(self, registry: AsyncToolRegistry, names):
+        self.registry, self.names = registry, frozenset(names)
+
+    def list_tools(self) -> List[str]:
+        return [t for t in self.registry.list_tools() if t in self.names]
+
+    async def call(self, name: str, args: Dict[str, Any], session_id: Optional[str] = None) -> str:
+        if name not in self.names:
+            return f"Error: tool '{name}' not allowed"
+        return await self.registry.call(name, args, session_id)
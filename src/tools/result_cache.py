@@ -0,0 +1,182 @@
+# src/tools/result_cache.py
+import asyncio, hashlib, json, sqlite3, threading, time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from ..utils.storage import SQLiteStore
+
+def norm_text(v: Any) -> str:
+    return " ".join(str(v or "").split()).casefold()
+
+def norm_int(default: int) -> Callable[[Any], int]:
+    def f(v: Any) -> int:
+        try:
+            return int(v)
+        except (TypeError, ValueError):
+            return default
+    return f
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """How one tool's results are cached.
+
+    `key` maps each argument that affects the result to its normalizer;
+    other arguments are ignored. A successful call of any tool named in
+    `invalidated_by` drops every cached result of this one. A result for
+    which `cacheable` returns False (a partial failure) is returned but not
+    stored.
+    """
+    ttl_sec: float
+    key: Tuple[Tuple[str, Callable[[Any], Any]], ...]
+    invalidated_by: Tuple[str, ...] = ()
+    persist: bool = False  # also keep results in SQLite across restarts
+    cacheable: Optional[Callable[[str], bool]] = None
+
+def _schema(conn: sqlite3.Connection):
+    conn.execute("CREATE TABLE IF NOT EXISTS tool_cache(key TEXT PRIMARY KEY, tool TEXT, result TEXT, expires_at REAL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_cache_tool ON tool_cache(tool)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_cache_expires ON tool_cache(expires_at)")
+
+class ToolResultCache:
+    """Two-tier cache of tool results keyed by (tool, normalized arguments).
+
+    The memory tier is an LRU of at most `max_entries` results; policies with
+    `persist` also write through to SQLite, which serves misses of the memory
+    tier (after a restart). Identical calls running at the same time share
+    one execution. Counts per tool: memory hits, disk hits, misses and
+    invalidations.
+    """
+
+    def __init__(self, policies: Dict[str, CachePolicy], db_path: Optional[str] = None, max_entries: int = 512):
+        self.policies, self.max_entries = policies, max_entries
+        self.db = SQLiteStore(db_path, _schema) if db_path and any(p.persist for p in policies.values()) else None
+        self._mem: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()  # key -> (tool, result, expires_at)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # Bumped by invalidate(): a call that started before an invalidation
+        # must not store its (possibly outdated) result afterwards.
+        self._gen: Dict[str, int] = {}
+        # tool -> tools whose results it invalidates
+        self._invalidates: Dict[str, set] = {}
+        for tool, p in policies.items():
+            for by in p.invalidated_by:
+                self._invalidates.setdefault(by, set()).add(tool)
+        if self.db is not None:
+            self.db.write("DELETE FROM tool_cache WHERE expires_at < ?", (time.time(),))
+
+    def _bump(self, tool: str, what: str):
+        # Called with the lock held.
+        s = self._stats.setdefault(tool, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "invalidations": 0})
+        s[what] += 1
+
+    def _count(self, tool: str, what: str):
+        with self._lock:
+            self._bump(tool, what)
+
+    def key(self, tool: str, args: Dict[str, Any]) -> Optional[str]:
+        p = self.policies.get(tool)
+        if p is None or p.ttl_sec <= 0:
+            return None
+        raw = json.dumps([tool, [norm(args.get(name)) for name, norm in p.key]], ensure_ascii=False)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _lookup_memory(self, tool: str, key: str) -> Optional[str]:
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                if hit[2] > time.time():
+                    self._mem.move_to_end(key)
+                    self._bump(tool, "memory_hits")
+                    return hit[1]
+                del self._mem[key]
+        return None
+
+    def _lookup_disk(self, tool: str, key: str) -> Optional[str]:
+        row = self.db.query_one("SELECT result, expires_at FROM tool_cache WHERE key = ? AND expires_at > ?", (key, time.time()))
+        if row is None:
+            return None
+        self._remember(tool, key, row[0], row[1])
+        self._count(tool, "disk_hits")
+        return row[0]
+
+    def _remember(self, tool: str, key: str, result: str, expires_at: float):
+        with self._lock:
+            self._mem[key] = (tool, result, expires_at)
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+
+    def _store(self, tool: str, key: str, result: str):
+        expires_at = time.time() + self.policies[tool].ttl_sec
+        self._remember(tool, key, result, expires_at)
+        if self.db is not None and self.policies[tool].persist:
+            self.db.write("INSERT OR REPLACE INTO tool_cache(key, tool, result, expires_at) VALUES (?,?,?,?)",
+                          (key, tool, result, expires_at))
+
+    def invalidate(self, tool: str):
+        """Drop every cached result of `tool`."""
+        with self._lock:
+            self._gen[tool] = self._gen.get(tool, 0) + 1
+            for k in [k for k, v in self._mem.items() if v[0] == tool]:
+                del self._mem[k]
+        if self.db is not None and self.policies[tool].persist:
+            self.db.write("DELETE FROM tool_cache WHERE tool = ?", (tool,))
+        self._count(tool, "invalidations")
+
+    async def run(self, tool: str, args: Dict[str, Any], fn: Callable[[], Awaitable[str]]) -> str:
+        """Result of `fn()` for this tool call, from the cache when possible.
+
+        Exceptions are not cached; successful calls fire invalidation hooks.
+        """
+        key = self.key(tool, args)
+        if key is None:
+            result = await fn()
+        else:
+            if (cached := self._lookup_memory(tool, key)) is not None:
+                return cached
+            if self.db is not None and self.policies[tool].persist and \
+                    (cached := await self.db.run_read(self._lookup_disk, tool, key)) is not None:
+                return cached
+            if (pending := self._inflight.get(key)) is not None:
+                # Same call already running: share its outcome, unless it was
+                # cancelled (its caller timed out), then run it here.
+                await asyncio.wait([pending])
+                if not pending.cancelled():
+                    self._count(tool, "memory_hits")
+                    return pending.result()
+            self._count(tool, "misses")
+            gen = self._gen.get(tool, 0)
+            fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                fut.cancel()
+                raise
+            except Exception as e:
+                fut.set_exception(e)
+                fut.exception()  # mark retrieved; followers still get it from result()
+                raise
+            finally:
+                if self._inflight.get(key) is fut:
+                    del self._inflight[key]
+            fut.set_result(result)
+            cacheable = self.policies[tool].cacheable
+            if self._gen.get(tool, 0) == gen and (cacheable is None or cacheable(result)):
+                self._store(tool, key, result)
+        for other in self._invalidates.get(tool, ()):
+            self.invalidate(other)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-tool counts with the hit rate over all lookups."""
+        with self._lock:
+            out = {t: dict(s) for t, s in self._stats.items()}
+        for s in out.values():
+            lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+            s["hit_rate"] = (s["memory_hits"] + s["disk_hits"]) / lookups if lookups else 0.0
+        return out
+
+    def format_stats(self) -> str:
+        return ", ".join(f"{t} {s['hit_rate']:.0%} of {s['memory_hits'] + s['disk_hits'] + s['misses']}"
+                         for t, s in sorted(self.stats().items()))
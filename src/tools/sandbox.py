@@ -2,50 +2,347 @@
 import subprocess
 import tempfile
 import asyncio
-from pathlib import Path
-from typing import Tuple
+import atexit
+import shutil
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import List, Optional, Tuple
 import os
 import sys
 
-def _posix_limits():
+_CPU_SEC = 2
+# A session worker runs many snippets: each run gets _CPU_SEC more CPU time
+# (the soft limit is moved before every run), up to this total.
+_SESSION_CPU_SEC = 120
+# A pool worker runs its warm-up and then one snippet. The snippet's _CPU_SEC
+# is counted exactly from the start of its run (a CPU timer); the rlimit is a
+# whole-second backstop, and this hard cap leaves it room for the warm-up.
+_POOL_CPU_SEC = _CPU_SEC + 1
+_MAX_OUTPUT = 1024 * 1024  # per stream, per run
+
+def _posix_limits(cpu_hard: int = _CPU_SEC):
     try:
         import resource
         # CPU time: 2s, Address space: 256MB, File size: 10MB, NOFILE: 64
-        resource.setrlimit(resource.RLIMIT_CPU, (2, 2))
+        resource.setrlimit(resource.RLIMIT_CPU, (_CPU_SEC, cpu_hard))
         resource.setrlimit(resource.RLIMIT_AS, (256 * 1024 * 1024, 256 * 1024 * 1024))
         resource.setrlimit(resource.RLIMIT_FSIZE, (10 * 1024 * 1024, 10 * 1024 * 1024))
         resource.setrlimit(resource.RLIMIT_NOFILE, (64, 64))
     except Exception:
         pass
 
+# Runs in the worker (python -I -S -c <code> <output limit> <warm>). A request
+# is a <Id header (code length, CPU seconds) and the UTF-8 code; a reply is a
+# <IIi header (stdout length, stderr length, exit code) and the two streams.
+# Both travel on private copies of stdin/stdout; fds 0 and 1 then point to the
+# null device so a snippet cannot write into the protocol stream. A fixed
+# binary frame keeps json (and re) out of the worker's startup.
+_WORKER = r"""
+import io, math, os, select, struct, sys
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import _signal as signal  # the C module: `signal` would import enum at startup
+except ImportError:
+    import signal
+# The modules snippets import most, warmed while the worker waits for work
+# (not by a worker started on demand, which is used at once).
+WARM = ["math", "cmath", "re", "random", "statistics", "datetime", "decimal", "fractions", "itertools", "functools",
+        "collections", "json", "traceback"] if sys.argv[2] == "1" else []
+
+def warm_up(rin):
+    # One module at a time, only while no request is waiting: a worker is
+    # ready as soon as it has started, and a request never waits for more
+    # than the import in progress.
+    while WARM:
+        try:
+            if select.select([rin], [], [], 0)[0]:
+                return
+        except (OSError, ValueError):
+            pass  # no select() on this pipe (Windows): import everything now
+        try: __import__(WARM.pop(0))
+        except ImportError: pass
+
+def serve(limit):
+    # The pipe objects live only in this frame, not in __main__'s globals
+    # where a snippet doing `import __main__` would find them.
+    # rin is unbuffered so select() sees every byte still to be read.
+    rin, wout = os.fdopen(os.dup(0), "rb", buffering=0), os.fdopen(os.dup(1), "wb")
+    null = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null, 0); os.dup2(null, 1)
+    sys.stdin = sys.__stdin__ = open(os.devnull)
+    sys.stdout = sys.__stdout__ = open(os.devnull, "w")
+
+    def read(n):
+        b = b""
+        while len(b) < n:
+            if not (chunk := rin.read(n - len(b))):
+                sys.exit(0)  # the parent went away
+            b += chunk
+        return b
+
+    g = {"__name__": "__main__", "__builtins__": __builtins__}
+    while True:
+        warm_up(rin)
+        n, cpu = struct.unpack("<Id", read(12))
+        code = read(n).decode("utf-8", "replace")
+        if resource is not None and cpu:
+            # Backstop in whole seconds; the timer below is the exact limit.
+            used = resource.getrusage(resource.RUSAGE_SELF)
+            hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+            soft = math.ceil(used.ru_utime + used.ru_stime + cpu)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+        out, err, rc = io.StringIO(), io.StringIO(), 0
+        sys.stdout, sys.stderr = out, err
+        try:
+            if cpu and hasattr(signal, "setitimer"):
+                # Process CPU time from now on; SIGPROF's default action ends the worker.
+                signal.setitimer(signal.ITIMER_PROF, cpu)
+            exec(compile(code, "<snippet>", "exec"), g)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                rc = e.code or 0
+            else:
+                print(e.code, file=err); rc = 1
+        except BaseException as e:
+            import traceback
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next, file=err); rc = 1
+        finally:
+            if cpu and hasattr(signal, "setitimer"):
+                signal.setitimer(signal.ITIMER_PROF, 0)
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        o = out.getvalue()[:limit].encode("utf-8", "replace")
+        e = err.getvalue()[:limit].encode("utf-8", "replace")
+        wout.write(struct.pack("<IIi", len(o), len(e), rc) + o + e)
+        wout.flush()
+
+serve(int(sys.argv[1]))
+"""
+
+class _Worker:
+    """One interpreter under the resource limits.
+
+    A pool worker is started ahead of use and pre-imports common modules; one
+    started on demand (`warm=False`) skips that, so the call waiting for it
+    pays no more than a plain interpreter start.
+    """
+
+    def __init__(self, session: bool = False, warm: bool = True):
+        self.dir = tempfile.mkdtemp(prefix="aegis-sandbox-")
+        self.session, self.used = session, time.monotonic()
+        self.lock = threading.Lock()  # one snippet at a time
+        self.proc = subprocess.Popen(
+            [sys.executable, "-I", "-S", "-c", _WORKER, str(_MAX_OUTPUT), "1" if warm else "0"],  # isolated mode, no site imports
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=self.dir, env={},
+            preexec_fn=partial(_posix_limits, _SESSION_CPU_SEC if session else _POOL_CPU_SEC) if os.name == "posix" else None,
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, code: str, timeout: float) -> Tuple[str, str, int]:
+        timed_out = threading.Event()
+        def kill():
+            timed_out.set(); self.proc.kill()
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            req = code.encode("utf-8", "replace")
+            self.proc.stdin.write(struct.pack("<Id", len(req), _CPU_SEC) + req)
+            self.proc.stdin.flush()
+            head = self.proc.stdout.read(12)
+            if len(head) == 12:
+                n_out, n_err, rc = struct.unpack("<IIi", head)
+                out, err = self.proc.stdout.read(n_out), self.proc.stdout.read(n_err)
+                if len(out) == n_out and len(err) == n_err:
+                    return out.decode("utf-8", "replace"), err.decode("utf-8", "replace"), rc
+        except (OSError, ValueError, struct.error):
+            pass
+        finally:
+            timer.cancel()
+            self.used = time.monotonic()
+        # No reply: the worker was killed by the timeout or a resource limit.
+        rc = self.proc.wait()
+        if timed_out.is_set():
+            return "", "Execution timeout", -1
+        return "", f"Execution error: worker exited with code {rc}", rc
+
+    def close(self):
+        if self.alive():
+            self.proc.kill()
+        try:
+            self.proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+        for f in (self.proc.stdin, self.proc.stdout):
+            try: f.close()
+            except OSError: pass
+        shutil.rmtree(self.dir, ignore_errors=True)
+
 class CodeSandbox:
-    """Best-effort isolated Python subprocess. Not a perfect sandbox."""
-    def __init__(self, timeout: int = 10):
-        self.timeout = timeout
-
-    async def execute_python(self, code: str) -> Tuple[str, str, int]:
-        def blocking_run():
-            with tempfile.TemporaryDirectory() as tmpdir:
-                script_path = Path(tmpdir) / "script.py"
-                script_path.write_text(code)
-
-                env = {}
-                cmd = [sys.executable, "-I", "-S", str(script_path)]  # isolated mode, no site imports
-                try:
-                    result = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=self.timeout,
-                        cwd=tmpdir,
-                        env=env,
-                        preexec_fn=_posix_limits if os.name == "posix" else None,
-                    )
-                    return result.stdout, result.stderr, result.returncode
-                except subprocess.TimeoutExpired:
-                    return "", "Execution timeout", -1
-                except Exception as e:
-                    return "", f"Execution error: {e}", -1
+    """Best-effort isolated Python subprocess. Not a perfect sandbox.
+
+    Snippets run in pre-started worker interpreters, so a call pays no
+    interpreter startup. A worker runs one snippet and is replaced; a call
+    that finds the pool empty waits for the replacement already starting,
+    and replacements wait while a snippet runs so they do not slow it. With
+    `sessions` on, a call that names a session keeps its worker (and the
+    snippet globals) for the next call of that session, up to `max_sessions`
+    workers, retired after `session_idle_sec` without use.
+    """
+    def __init__(self, timeout: int = 10, pool_size: int = 2, sessions: bool = False,
+                 max_sessions: int = 4, session_idle_sec: float = 600.0):
+        self.timeout, self.pool_size = timeout, pool_size
+        self.sessions, self.max_sessions, self.session_idle_sec = sessions, max_sessions, session_idle_sec
+        self._lock = threading.Lock()
+        # Signalled when a worker joins the pool, filling stops or a run ends.
+        self._ready = threading.Condition(self._lock)
+        self._running = self._waiting = 0  # pool snippets running / calls waiting for a worker
+        self._warm: List[_Worker] = []
+        self._by_session: "OrderedDict[str, _Worker]" = OrderedDict()
+        self._filling = self._closed = False
+        self._threads: set = set()  # filling the pool, retiring used workers
+        # Started in the background: constructing the sandbox does not wait
+        # for the interpreters, and a call made before they are up starts
+        # its own.
+        self._in_background(self._fill)
+        atexit.register(self.close)
+
+    def _in_background(self, fn, *args):
+        def run():
+            try:
+                fn(*args)
+            finally:
+                with self._lock:
+                    self._threads.discard(threading.current_thread())
+        t = threading.Thread(target=run, daemon=True)
+        with self._lock:
+            self._threads.add(t)
+            t.start()
+
+    def _fill(self):
+        with self._lock:
+            if self._filling:
+                return
+            self._filling = True
+        try:
+            while True:
+                with self._lock:
+                    # A starting interpreter competes with a running snippet
+                    # for CPU, so wait until none runs, unless a call is
+                    # waiting for a worker the pool does not have yet.
+                    self._ready.wait_for(lambda: self._closed or not self._running or self._waiting > len(self._warm))
+                    self._warm = [w for w in self._warm if w.alive()]
+                    if self._closed or len(self._warm) >= self.pool_size:
+                        return
+                w = _Worker()
+                # One empty round trip pays the worker's first-use costs
+                # (its first compile, reply encoding) off the call path.
+                w.run("pass", self.timeout)
+                with self._lock:
+                    if not self._closed:
+                        self._warm.append(w)
+                        self._ready.notify()
+                        continue
+                w.close()
+                return
+        except OSError as e:
+            print(f"[Sandbox] could not start a worker: {e}")
+        finally:
+            with self._lock:
+                self._filling = False
+                self._ready.notify_all()
 
+    def _take(self) -> _Worker:
+        with self._lock:
+            # Pool empty but a worker already starting (calls back to back):
+            # waiting for it beats starting a second one beside it.
+            self._waiting += 1
+            self._ready.notify_all()
+            try:
+                self._ready.wait_for(lambda: self._warm or not self._filling or self._closed, timeout=self.timeout)
+            finally:
+                self._waiting -= 1
+            while self._warm:
+                w = self._warm.pop()
+                if w.alive():
+                    break
+                w.close()
+            else:
+                w = None
+        return w or _Worker(warm=False)
+
+    def _recycle(self, w: _Worker):
+        w.close()
+        self._fill()
+
+    def _session_worker(self, session_id: str) -> _Worker:
+        old = []
+        with self._lock:
+            now = time.monotonic()
+            for sid, w in list(self._by_session.items()):
+                if sid != session_id and now - w.used > self.session_idle_sec:
+                    old.append(self._by_session.pop(sid))
+            w = self._by_session.get(session_id)
+            if w is not None and not w.alive():
+                old.append(self._by_session.pop(session_id))
+                w = None
+            if w is None:
+                while len(self._by_session) >= self.max_sessions:
+                    old.append(self._by_session.popitem(last=False)[1])
+                w = self._by_session[session_id] = _Worker(session=True, warm=False)
+            self._by_session.move_to_end(session_id)
+        for o in old:
+            o.close()
+        return w
+
+    def _run(self, code: str, session_id: Optional[str]) -> Tuple[str, str, int]:
+        try:
+            if self.sessions and session_id:
+                w = self._session_worker(session_id)
+                with w.lock:
+                    out, err, rc = w.run(code, self.timeout)
+                if not w.alive():
+                    with self._lock:
+                        if self._by_session.get(session_id) is w:
+                            del self._by_session[session_id]
+                    w.close()
+                    err += "\n[The session's interpreter was stopped; its variables are gone.]"
+                return out, err, rc
+            w = self._take()
+            with self._lock:
+                self._running += 1
+            try:
+                return w.run(code, self.timeout)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._ready.notify_all()
+                # Used once, never reused: the next snippet gets a clean
+                # interpreter. The replacement is started after the run, in
+                # the background, so its startup does not compete with it.
+                self._in_background(self._recycle, w)
+        except Exception as e:
+            return "", f"Execution error: {e}", -1
+
+    async def execute_python(self, code: str, session_id: Optional[str] = None) -> Tuple[str, str, int]:
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, blocking_run)
\ No newline at end of file
+        return await loop.run_in_executor(None, self._run, code, session_id)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._ready.notify_all()
+            workers = self._warm + list(self._by_session.values())
+            self._warm, self._by_session = [], OrderedDict()
+            threads = list(self._threads)
+        for w in workers:
+            w.close()
+        for t in threads:
+            t.join(timeout=5)
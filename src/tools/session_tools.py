@@ -4,17 +4,38 @@ from ..mesh.session import SessionManager
 from ..memory.vector_store import LiteVectorStore
 
 class SessionTools:
-    def __init__(self, sessions: SessionManager, kb: LiteVectorStore):
+    def __init__(self, sessions: SessionManager, kb: LiteVectorStore, timeout: float = 30.0, max_retry_wait: float = 5.0):
         self.sessions, self.kb = sessions, kb
+        self.timeout, self.max_retry_wait = timeout, max_retry_wait
 
     async def delegate_in_session(self, args: Dict[str, Any]) -> str:
+        """Run `tool` on the session peer and return its result, like a local
+        tool call. Several delegations may be awaited at once."""
         sid, tool, t_args = args.get("session_id", ""), args.get("tool", ""), args.get("args", {})
         if not (sid and tool): return "ArgError: session_id and tool required."
-        await self.sessions.send_session(sid, {"type": "task", "tool": tool, "args": t_args})
-        return "Task sent to session peer."
+        task = {"type": "task", "tool": tool, "args": t_args}
+        try:
+            reply = await self.sessions.request(sid, task, self.timeout)
+            # An overloaded peer says when to come back; retry once if soon.
+            if reply.get("error") == "busy" and float(reply.get("retry_after") or 0) <= self.max_retry_wait:
+                await asyncio.sleep(float(reply.get("retry_after") or 0))
+                reply = await self.sessions.request(sid, task, self.timeout)
+        except asyncio.TimeoutError:
+            return f"Error: session peer did not answer within {self.timeout:g}s"
+        except (ValueError, ConnectionError) as e:
+            return f"Error: {e}"
+        if reply.get("error") == "busy":
+            return f"Error: session peer busy, retry after {reply.get('retry_after')}s"
+        if "error" in reply:
+            return f"Error: {reply['error']}"
+        return str(reply.get("result", ""))
 
     async def kb_share_in_session(self, args: Dict[str, Any]) -> str:
         sid, text, src = args.get("session_id", ""), args.get("text", ""), args.get("source", "session")
         if not (sid and text): return "ArgError: session_id and text required."
-        await self.sessions.send_session(sid, {"type": "share_text", "text": text, "source": src})
+        try:
+            if (err := await self.sessions.send_session(sid, {"type": "share_text", "text": text, "source": src})) is not None:
+                return err
+        except ValueError as e:
+            return f"Error: {e}"
         return "Shared with session peer."
\ No newline at end of file
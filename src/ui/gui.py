@@ -14,19 +14,29 @@ from ..learning.lora_trainer import LoRATrainer
 from ..learning.style_adapter import StyleAdapter
 from ..__version__ import get_version_info # Added for versioning
 AUDIT_FILE = Path("data/user_data/inbox_approved.jsonl")
-def _inbox_choices(inbox: MemoryInbox):
-    return [(f"{s} {r} {d}", i) for i, s, r, d in inbox.list_pending()]
-def refresh_inbox(inbox: MemoryInbox):
-    return update(choices=_inbox_choices(inbox), value=[])
+INBOX_PAGE = 50
+def refresh_inbox(inbox: MemoryInbox, after_id: int = 0):
+    # One page at a time (keyset on id): the inbox can hold thousands of items.
+    choices = [(f"{s} {r} {d}", i) for i, s, r, d in inbox.list_pending(INBOX_PAGE, after_id)]
+    return update(choices=choices, value=[], label=f"Approve Pending Facts ({len(choices)} shown, {inbox.count_pending()} pending)")
+def page_inbox(inbox: MemoryInbox, pages: list, step: int):
+    """Move the page cursor stack (first ids of the pages seen) by step and render."""
+    if step > 0:
+        rows = inbox.list_pending(INBOX_PAGE, pages[-1])
+        if len(rows) == INBOX_PAGE:
+            pages = pages + [rows[-1][0]]
+    elif step < 0 and len(pages) > 1:
+        pages = pages[:-1]
+    return refresh_inbox(inbox, pages[-1]), pages
 async def approve_facts_handler(selected_ids, inbox, graph, sync_service):
     ids = [int(i) for i in (selected_ids or [])]
-    approved = inbox.pop(ids)
+    approved = await inbox.apop(ids)
     rels_to_sync = []
     if approved:
         AUDIT_FILE.parent.mkdir(parents=True, exist_ok=True)
     for src, rel, dst, conf in approved:
         rel_obj = graph.upsert(src, rel, dst)
-        rels_to_sync.append((rel_obj.src, rel_obj.rel, rel_obj.dst, rel_obj.ts))
+        rels_to_sync.append(rel_obj)
         with AUDIT_FILE.open("a", encoding="utf-8") as f:
             f.write(json.dumps({
                 "ts": datetime.utcnow().isoformat(),
@@ -35,6 +45,20 @@ async def approve_facts_handler(selected_ids, inbox, graph, sync_service):
     if rels_to_sync:
         await sync_service.broadcast_relations(rels_to_sync)
     return None
+def _fact_choices(graph: LWWGraph, n: int = 50):
+    return [(f"{r.src} {r.rel} {r.dst}", json.dumps([r.src, r.rel, r.dst])) for r in graph.recent(n)]
+def refresh_facts(graph: LWWGraph):
+    return update(choices=_fact_choices(graph), value=[])
+async def forget_facts_handler(selected, graph, sync_service):
+    # Tombstones, not deletes: the removal must win on every peer too.
+    removed = [graph.remove(*json.loads(v)) for v in (selected or [])]
+    if removed:
+        AUDIT_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with AUDIT_FILE.open("a", encoding="utf-8") as f:
+            for r in removed:
+                f.write(json.dumps({"ts": datetime.utcnow().isoformat(), "src": r.src, "rel": r.rel, "dst": r.dst, "removed": True}) + "\n")
+        await sync_service.broadcast_relations(removed)
+    return None
 def approve_req(req_id: str, broker: ConsentBroker):
     if broker and req_id.strip():
         broker.resolve(req_id.strip(), True)
@@ -158,7 +182,17 @@ def launch_gui(agent_factory: Callable, subscribe_suggestions: Callable, contact
                         model_dd.change(_switch, inputs=[model_dd], outputs=[model_status])
                 gr.Markdown("### Memory Inbox")
                 pending_facts = gr.CheckboxGroup(label="Approve Pending Facts", choices=[])
+                inbox_pages = gr.State([0])
+                with gr.Row():
+                    inbox_prev_btn = gr.Button("Previous")
+                    inbox_refresh_btn = gr.Button("Refresh")
+                    inbox_next_btn = gr.Button("Next")
                 approve_btn = gr.Button("Approve Selected")
+                with gr.Accordion("Known Facts", open=False):
+                    known_facts = gr.CheckboxGroup(label="Recent facts", choices=[])
+                    with gr.Row():
+                        facts_refresh_btn = gr.Button("Refresh")
+                        forget_btn = gr.Button("Forget Selected")
                 with gr.Accordion("Collaboration Requests", open=False):
                     req_id_box = gr.Textbox(label="Request ID (from Suggestion Feed)", interactive=True)
                     collab_approve_btn = gr.Button("Approve Collaboration")
@@ -347,8 +381,8 @@ def launch_gui(agent_factory: Callable, subscribe_suggestions: Callable, contact
                 yield "\n".join(buf)
         use_sug_btn.click(lambda t: (t.strip().splitlines()[-1].lstrip("• ").strip() if t.strip() else ""),
                           inputs=suggestions, outputs=msg, queue=False)
-        def do_refresh():
-            return refresh_inbox(inbox)
+        def do_refresh(pages):
+            return page_inbox(inbox, pages, 0)
         # Using closure instead of gr.State for approve handler
         async def approve_handler(selected_ids):
             return await approve_facts_handler(selected_ids, inbox, graph, sync_service)
@@ -357,7 +391,16 @@ def launch_gui(agent_factory: Callable, subscribe_suggestions: Callable, contact
             inputs=[pending_facts],
             outputs=[],
             queue=True
-        ).then(do_refresh, outputs=[pending_facts])
+        ).then(do_refresh, inputs=[inbox_pages], outputs=[pending_facts, inbox_pages])
+        inbox_refresh_btn.click(do_refresh, inputs=[inbox_pages], outputs=[pending_facts, inbox_pages], queue=False)
+        inbox_next_btn.click(lambda pages: page_inbox(inbox, pages, 1), inputs=[inbox_pages], outputs=[pending_facts, inbox_pages], queue=False)
+        inbox_prev_btn.click(lambda pages: page_inbox(inbox, pages, -1), inputs=[inbox_pages], outputs=[pending_facts, inbox_pages], queue=False)
+        def do_refresh_facts():
+            return refresh_facts(graph)
+        async def forget_handler(selected):
+            return await forget_facts_handler(selected, graph, sync_service)
+        facts_refresh_btn.click(do_refresh_facts, outputs=[known_facts], queue=False)
+        forget_btn.click(forget_handler, inputs=[known_facts], outputs=[], queue=True).then(do_refresh_facts, outputs=[known_facts])
         # Using closure for consent handlers
         def approve_req_handler(req_id):
             return approve_req(req_id, broker)
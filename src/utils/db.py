@@ -1,9 +1,13 @@
 # src/utils/db.py
-def configure_sqlite(conn):
+def configure_sqlite(conn, read_only: bool = False):
     cur = conn.cursor()
     cur.execute("PRAGMA journal_mode=WAL;")
     cur.execute("PRAGMA synchronous=NORMAL;")
     cur.execute("PRAGMA temp_store=MEMORY;")
     cur.execute("PRAGMA mmap_size=30000000000;")
     cur.execute("PRAGMA busy_timeout=5000;")
+    if read_only:
+        # Reader connections: any accidental write fails loudly instead of
+        # bypassing the single writer.
+        cur.execute("PRAGMA query_only=ON;")
     conn.commit()
\ No newline at end of file
@@ -0,0 +1,168 @@
+# src/utils/db_writer.py
+import atexit, os, queue, sqlite3, threading, time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+from .db import configure_sqlite
+
+_SQL, _MANY, _CALL, _BARRIER, _STOP = range(5)
+
+class DBWriter:
+    """Group-commit write-behind queue for one SQLite database file.
+
+    Writes are queued from any thread and applied by a single dedicated writer
+    thread, which batches everything that arrives within `batch_ms` (or up to
+    `max_batch` items) into ONE transaction, so a burst of N writes costs one
+    commit/fsync instead of N, and callers never wait on the lock or the disk
+    unless they ask for the result. Each item runs inside its own SAVEPOINT: a
+    failing statement fails only its own future, not the rest of the batch.
+    Futures resolve after the batch has committed.
+
+    Items a caller is about to block on are queued `urgent`: they close the
+    collection window immediately so the caller does not pay the linger time.
+    """
+
+    def __init__(self, db_path: str, batch_ms: float = 5.0, max_batch: int = 256):
+        self.db_path, self.batch_ms, self.max_batch = db_path, batch_ms, max_batch
+        # Owned by the writer thread; autocommit mode so transactions are explicit.
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        configure_sqlite(self.conn)
+        self._q: "queue.Queue[tuple]" = queue.Queue()
+        self._closed = False
+        # Items queued but not yet committed; lets flush() return immediately
+        # when there is nothing outstanding.
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self.batches = self.items = 0
+        self._thread = threading.Thread(target=self._run, name=f"db-writer:{os.path.basename(db_path)}", daemon=True)
+        self._thread.start()
+
+    def _put(self, kind: int, payload: Any, urgent: bool = False) -> Future:
+        fut: Future = Future()
+        # The closed check, the enqueue and close()'s STOP share one lock, so
+        # nothing can be queued behind STOP and left unresolved.
+        with self._pending_lock:
+            if self._closed:
+                fut.set_exception(RuntimeError(f"writer for {self.db_path} is closed"))
+                return fut
+            self._pending += 1
+            self._q.put((kind, payload, fut, urgent))
+            if kind == _STOP:
+                self._closed = True
+        return fut
+
+    def submit(self, sql: str, params: Sequence = (), urgent: bool = False) -> Future:
+        """Queue one statement; the future resolves to its lastrowid."""
+        return self._put(_SQL, (sql, tuple(params)), urgent)
+
+    def submit_many(self, sql: str, seq: Iterable[Sequence], urgent: bool = False) -> Future:
+        """Queue an executemany; the future resolves to the affected row count."""
+        return self._put(_MANY, (sql, list(seq)), urgent)
+
+    def call(self, fn: Callable[[sqlite3.Connection], Any], urgent: bool = True) -> Future:
+        """Run fn(conn) on the writer thread inside the batch transaction.
+
+        fn must not commit or roll back; its return value resolves the future.
+        Urgent by default (callers usually wait on the result); pass
+        urgent=False for an atomic multi-statement write-behind.
+        """
+        return self._put(_CALL, fn, urgent)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Block until everything queued before this call has committed."""
+        if self._closed or self._pending == 0:
+            return
+        self._put(_BARRIER, None, urgent=True).result(timeout)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Flush outstanding writes and stop the writer thread."""
+        if self._closed:
+            return
+        fut = self._put(_STOP, None, urgent=True)
+        try: fut.result(timeout)
+        except Exception: pass
+        self._thread.join(timeout)
+        self.conn.close()
+
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.batch_ms / 1000.0
+            while len(batch) < self.max_batch and not batch[-1][3]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try: batch.append(self._q.get(timeout=remaining))
+                except queue.Empty: break
+            stop = self._apply(batch)
+            if stop:
+                return
+
+    def _apply(self, batch: list) -> bool:
+        results, stop = [], False
+        c = self.conn.cursor()
+        try:
+            c.execute("BEGIN")
+            for kind, payload, fut, _ in batch:
+                if kind >= _BARRIER:
+                    stop = stop or kind == _STOP
+                    results.append((fut, None, None))
+                    continue
+                c.execute("SAVEPOINT w")
+                try:
+                    if kind == _SQL:
+                        res = c.execute(*payload).lastrowid
+                    elif kind == _MANY:
+                        res = c.executemany(*payload).rowcount
+                    else:
+                        res = payload(self.conn)
+                    c.execute("RELEASE w")
+                    results.append((fut, res, None))
+                except Exception as e:
+                    c.execute("ROLLBACK TO w"); c.execute("RELEASE w")
+                    results.append((fut, None, e))
+            c.execute("COMMIT")
+        except Exception as e:
+            # The transaction itself failed (disk full, lock timeout): nothing
+            # in this batch is durable, so fail every future.
+            try: c.execute("ROLLBACK")
+            except Exception: pass
+            results = [(fut, None, e) for _, _, fut, _ in batch]
+            stop = stop or any(item[0] == _STOP for item in batch)
+        self.batches += 1
+        self.items += len(batch)
+        with self._pending_lock:
+            self._pending -= len(batch)
+        for fut, res, err in results:
+            if err is not None: fut.set_exception(err)
+            else: fut.set_result(res)
+        return stop
+
+_writers: Dict[str, DBWriter] = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_path: str) -> DBWriter:
+    """The shared writer for a database file (one thread per file)."""
+    key = os.path.realpath(db_path)
+    with _writers_lock:
+        if (w := _writers.get(key)) is None or w._closed:
+            w = _writers[key] = DBWriter(db_path)
+        return w
+
+def flush_all_writers():
+    for w in list(_writers.values()):
+        w.flush()
+
+def close_all_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for w in writers:
+        w.close()
+
+# Make sure queued writes reach disk on a normal interpreter exit even if the
+# entry point never called close_all_writers().
+atexit.register(close_all_writers)
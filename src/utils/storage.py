@@ -0,0 +1,92 @@
+# src/utils/storage.py
+import asyncio, sqlite3, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+from .db import configure_sqlite
+from .db_writer import get_writer
+
+# Shared pool for awaitable reads. Each of its threads lazily opens one read
+# connection per database, so the number of open read connections is bounded
+# by pool size x databases.
+_READ_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-read")
+
+class SQLiteStore:
+    """Storage handle for one SQLite database file.
+
+    Reads run on a connection private to the calling thread (opened on first
+    use, WAL so they never block the writer or each other). All writes go
+    through the file's single DBWriter thread. Every operation has a blocking
+    form for executor/GUI threads and an awaitable `a*` form that keeps SQLite
+    off the event loop: reads hop to a small reader pool, writes await the
+    writer's future.
+    """
+
+    def __init__(self, db_path: str, schema: Optional[Callable[[sqlite3.Connection], None]] = None):
+        Path(Path(db_path).parent).mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.writer = get_writer(db_path)
+        if schema is not None:
+            # DDL/migrations run on the writer so they serialize with all writes.
+            self.writer.call(schema).result()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    def reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so close() can run from any thread;
+            # each connection is used by the thread that opened it.
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            configure_sqlite(conn, read_only=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    # Blocking API (executor threads, GUI callbacks, startup)
+    def query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return self.reader().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return self.reader().execute(sql, params).fetchone()
+
+    def write(self, sql: str, params: Sequence = (), urgent: bool = False) -> Future:
+        return self.writer.submit(sql, params, urgent)
+
+    def write_many(self, sql: str, seq: Iterable[Sequence], urgent: bool = False) -> Future:
+        return self.writer.submit_many(sql, seq, urgent)
+
+    def transact(self, fn: Callable[[sqlite3.Connection], Any], urgent: bool = True) -> Future:
+        """Run fn(conn) atomically on the writer thread (read-modify-write)."""
+        return self.writer.call(fn, urgent)
+
+    def flush(self):
+        self.writer.flush()
+
+    # Awaitable API (event loop)
+    async def run_read(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(_READ_POOL, fn, *args)
+
+    async def aquery(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return await self.run_read(self.query, sql, params)
+
+    async def aquery_one(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return await self.run_read(self.query_one, sql, params)
+
+    async def awrite(self, sql: str, params: Sequence = ()) -> Any:
+        return await asyncio.wrap_future(self.write(sql, params, urgent=True))
+
+    async def awrite_many(self, sql: str, seq: Iterable[Sequence]) -> Any:
+        return await asyncio.wrap_future(self.write_many(sql, seq, urgent=True))
+
+    async def atransact(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        return await asyncio.wrap_future(self.transact(fn))
+
+    def close(self):
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            try: conn.close()
+            except Exception: pass
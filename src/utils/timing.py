@@ -0,0 +1,55 @@
+# src/utils/timing.py
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class StageTimer:
+    """Wall-clock timings for the stages of one agent turn.
+
+    Every stage is recorded as (start, end) relative to the timer's creation,
+    so stages that ran concurrently show up as overlapping intervals and the
+    summary can report how much the overlap took off the critical path. A
+    stage should cover its own work only: one that awaits another stage's
+    task would count that wait twice and overstate the overlap.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.stages: Dict[str, Tuple[float, float]] = {}
+
+    def _name(self, name: str) -> str:
+        # Repeated stages (route, route, ...) get a numeric suffix.
+        if name not in self.stages:
+            return name
+        i = 2
+        while f"{name}#{i}" in self.stages:
+            i += 1
+        return f"{name}#{i}"
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter() - self.t0
+        try:
+            yield
+        finally:
+            self.stages[self._name(name)] = (start, time.perf_counter() - self.t0)
+
+    async def track(self, name: str, aw: Awaitable[T]) -> T:
+        with self.stage(name):
+            return await aw
+
+    def wall(self) -> float:
+        if not self.stages:
+            return 0.0
+        return max(e for _, e in self.stages.values()) - min(s for s, _ in self.stages.values())
+
+    def summary(self) -> str:
+        lines = []
+        for name, (s, e) in sorted(self.stages.items(), key=lambda kv: kv[1][0]):
+            lines.append(f"  {name:<16} {s*1000:8.1f} -> {e*1000:8.1f} ms  ({(e-s)*1000:7.1f} ms)")
+        serial = sum(e - s for s, e in self.stages.values())
+        wall = self.wall()
+        lines.append(f"  serial {serial*1000:.1f} ms, wall {wall*1000:.1f} ms, overlap saved {max(0.0, serial-wall)*1000:.1f} ms")
+        return "\n".join(lines)
@@ -0,0 +1,59 @@
+# tests/test_context_manager.py
+import asyncio
+from src.memory.context_manager import RollingSummarizer
+from src.memory.conversation_store import ConversationMemory
+
+class _LLM:
+    def __init__(self, on_call=lambda: None):
+        self.calls, self.on_call = 0, on_call
+
+    async def generate_async(self, prompt, max_tokens, temperature):
+        self.calls += 1
+        self.on_call()
+        return f"summary {self.calls}"
+
+def _session(tmp_path, turns: int) -> ConversationMemory:
+    mem = ConversationMemory(str(tmp_path / "conv.db"))
+    for i in range(turns):
+        mem.add_message("s", "question " * 20, "answer " * 20, "")
+    return mem
+
+def test_folds_wait_for_idle(tmp_path):
+    mem = _session(tmp_path, 6)
+    turn = {"in_flight": True}
+    summarizer = RollingSummarizer(mem, threshold_tokens=50, keep_turns=1)
+    summarizer.busy = lambda: turn["in_flight"]
+    llm = _LLM()
+
+    async def main():
+        summarizer.schedule("s", llm)
+        await asyncio.sleep(0.05)
+        assert llm.calls == 0 and mem.get_summary("s") is None
+        turn["in_flight"] = False
+        summarizer.run_due()
+        while summarizer._tasks:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert llm.calls > 0 and mem.get_summary("s")[0] == f"summary {llm.calls}"
+
+def test_running_fold_stops_when_a_turn_starts(tmp_path):
+    mem = _session(tmp_path, 8)
+    turn = {"in_flight": False}
+    summarizer = RollingSummarizer(mem, threshold_tokens=50, keep_turns=1)
+    summarizer.busy = lambda: turn["in_flight"]
+    llm = _LLM(on_call=lambda: turn.update(in_flight=True))
+
+    async def main():
+        summarizer.schedule("s", llm)
+        while summarizer._tasks:
+            await asyncio.sleep(0.01)
+        assert llm.calls == 1 and "s" in summarizer._due
+        turn["in_flight"] = False
+        llm.on_call = lambda: None
+        summarizer.run_due()
+        while summarizer._tasks:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert llm.calls > 1 and not summarizer._due
@@ -0,0 +1,101 @@
+# tests/test_db_writer.py
+import sqlite3, threading, time
+from concurrent.futures import wait
+import pytest
+from src.utils.db_writer import DBWriter
+
+def _writer(tmp_path, batch_ms=5.0):
+    w = DBWriter(str(tmp_path / "w.db"), batch_ms=batch_ms)
+    w.submit("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)", urgent=True).result(5)
+    return w
+
+def _rows(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "w.db"))
+    try: return conn.execute("SELECT id, v FROM t ORDER BY id").fetchall()
+    finally: conn.close()
+
+def _hold(w):
+    """Park the writer thread inside a batch so later items queue up together."""
+    entered, release = threading.Event(), threading.Event()
+    def block(conn):
+        entered.set()
+        release.wait(5)
+    fut = w.call(block)
+    assert entered.wait(5)
+    return fut, release
+
+def test_failing_item_rolls_back_only_itself(tmp_path):
+    w = _writer(tmp_path, batch_ms=10_000)
+    held, release = _hold(w)
+    ok1 = w.submit("INSERT INTO t VALUES (1, 'a')", urgent=False)
+    def half_then_fail(conn):
+        conn.execute("INSERT INTO t VALUES (2, 'partial')")
+        raise ValueError("boom")
+    bad = w.call(half_then_fail, urgent=False)
+    dup = w.submit("INSERT INTO t VALUES (1, 'dup')", urgent=False)
+    ok2 = w.submit_many("INSERT INTO t VALUES (?, ?)", [(3, "c"), (4, "d")], urgent=True)
+    release.set()
+    held.result(5)
+
+    assert ok1.result(5) == 1
+    assert ok2.result(5) == 2
+    with pytest.raises(ValueError): bad.result(5)
+    with pytest.raises(sqlite3.IntegrityError): dup.result(5)
+    assert _rows(tmp_path) == [(1, "a"), (3, "c"), (4, "d")]
+    w.close()
+
+def test_urgent_item_closes_the_batch_window(tmp_path):
+    w = _writer(tmp_path, batch_ms=10_000)
+    lazy = w.submit("INSERT INTO t VALUES (1, 'a')")
+    time.sleep(0.05)
+    assert not lazy.done()
+    t0 = time.monotonic()
+    w.submit("INSERT INTO t VALUES (2, 'b')", urgent=True).result(5)
+    assert time.monotonic() - t0 < 2
+    # The lazy write rode along in the same commit.
+    assert lazy.done() and lazy.result() == 1
+    assert w.pending == 0
+    w.close()
+
+def test_flush_waits_for_earlier_writes(tmp_path):
+    w = _writer(tmp_path, batch_ms=200)
+    futs = [w.submit("INSERT INTO t VALUES (?, ?)", (i, str(i))) for i in range(50)]
+    w.flush(5)
+    assert all(f.done() for f in futs)
+    assert len(_rows(tmp_path)) == 50
+    assert w.pending == 0
+    # Nothing outstanding: returns without queueing a barrier.
+    items = w.items
+    w.flush(5)
+    assert w.items == items
+    w.close()
+
+def test_close_racing_late_calls_resolves_every_future(tmp_path):
+    w = _writer(tmp_path, batch_ms=1)
+    futs, lock, go = [], threading.Lock(), threading.Event()
+
+    def caller(k):
+        go.wait(5)
+        for i in range(200):
+            f = w.call(lambda conn, v=k * 1000 + i: conn.execute("INSERT INTO t VALUES (?, 'x')", (v,)).lastrowid)
+            with lock: futs.append(f)
+
+    threads = [threading.Thread(target=caller, args=(k,)) for k in range(4)]
+    for t in threads: t.start()
+    go.set()
+    time.sleep(0.005)
+    w.close(5)
+    for t in threads: t.join(5)
+
+    done, not_done = wait(futs, timeout=5)
+    assert not not_done
+    committed = sum(1 for f in futs if f.exception() is None)
+    for f in futs:
+        if f.exception() is not None:
+            assert isinstance(f.exception(), RuntimeError)
+    assert committed == len(_rows(tmp_path))
+    with pytest.raises(RuntimeError):
+        w.submit("INSERT INTO t VALUES (99999, 'late')").result(1)
+    # flush() and a second close() after close are no-ops.
+    w.flush(1)
+    w.close(1)
@@ -0,0 +1,13 @@
+# tests/test_extract.py
+import pytest
+from src.internet.extract import PARSERS, extract_text
+
+@pytest.mark.parametrize("parser", sorted(PARSERS))
+@pytest.mark.parametrize("html", ["", "   \n\t", "<!-- nothing here -->", "<!DOCTYPE html>"])
+def test_page_without_text_gives_empty_string(parser, html):
+    assert extract_text(html, parser=parser) == ""
+
+@pytest.mark.parametrize("parser", sorted(PARSERS))
+def test_parsers_agree_on_main_text(parser):
+    html = "<html><head><script>var x = 1;</script></head><body><p>Tea is hot.</p></body></html>"
+    assert extract_text(html, parser=parser) == "Tea is hot."
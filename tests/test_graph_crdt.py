@@ -0,0 +1,86 @@
+# tests/test_graph_crdt.py
+from src.memory.graph_crdt import LWWGraph
+
+def _op(i: int, ts: float, seq: int) -> dict:
+    return {"op": "upsert_relation", "src": f"s{i}", "rel": "likes", "dst": f"d{i}", "ts": ts, "origin": "peer", "seq": seq}
+
+def test_batch_that_triggers_reindex_keeps_recent_unique(tmp_path):
+    g = LWWGraph(str(tmp_path / "graph.db"))
+    for i in range(100):
+        g.upsert(f"s{i}", "likes", f"d{i}", ts=float(i + 1))
+    # Over 1024 updates in one batch: the order index goes stale mid-batch.
+    ops, seq = [], 0
+    for i in range(50, 100):
+        seq += 1
+        ops.append(_op(i, 1000.0 + i, seq))
+    for rnd in range(40):
+        for i in range(50):
+            seq += 1
+            ops.append(_op(i, 2000.0 + rnd * 100 + i, seq))
+    assert g.apply_ops(ops)["applied"] == len(ops)
+
+    recent = g.recent(100)
+    assert len(recent) == 100
+    assert len({(r.src, r.dst) for r in recent}) == 100
+    assert recent[0].src == "s49" and recent[-1].src == "s50"
+    lines = g.facts_for_prompt(8).splitlines()
+    assert len(lines) == len(set(lines)) == 8
+
+def test_compacted_tombstone_is_not_repaired_back(tmp_path):
+    a, b = LWWGraph(str(tmp_path / "a.db")), LWWGraph(str(tmp_path / "b.db"))
+    a.upsert("tea", "is", "hot", ts=1.0)
+    a.remove("tea", "is", "hot", ts=2.0)
+    rows, vv = a.delta_since({})
+    b.merge_rows(rows, vv)
+    a.note_peer(b.replica_id, b.version_vector())
+    assert a.compact() == 1 and a.tombstones == 0
+    # Same vectors, and the tombstone B still holds does not count in the hash.
+    assert a.digest()["root"] == b.digest()["root"]
+    assert a.merge_rows(b.rows_in_leaves(list(range(4096)))) == 0
+    assert a.tombstones == 0
+
+def test_acks_relayed_in_digests(tmp_path):
+    a = LWWGraph(str(tmp_path / "a.db"))
+    a.note_acks({"c": {"c": 3, "b": 1}})
+    a.note_acks({"c": {"c": 2}})  # an older relayed report does not lower it
+    assert a.digest()["acks"] == {"c": {"c": 3, "b": 1}}
+
+def test_contains_norm_follows_writes(tmp_path):
+    g = LWWGraph(str(tmp_path / "graph.db"))
+    g.upsert("User", "likes", "tea", ts=1.0)
+    assert g.contains_norm("user", " Likes ", "TEA")
+    g.upsert("user", "likes", "Tea", ts=2.0)
+    g.remove("User", "likes", "tea", ts=3.0)
+    assert g.contains_norm("USER", "likes", "tea")  # "user likes Tea" is still live
+    g.remove("user", "likes", "Tea", ts=4.0)
+    assert not g.contains_norm("user", "likes", "tea")
+
+def test_malformed_rows_are_skipped_and_the_rest_persisted(tmp_path):
+    path = str(tmp_path / "graph.db")
+    g = LWWGraph(path)
+    rows = [["a", "likes", "b", 100.0, "peerX", 1, 0], ["bad"], ["c", "likes", "d", float("nan"), "peerX", 2, 0],
+            ["e", "likes", "f", 5.0, "peerX", "3", 0], None]
+    assert g.merge_rows(rows, {"peerX": 1, "peerY": "x"}) == 1
+    assert g.get("c", "likes", "d") is None
+    assert g.version_vector() == {"peerX": 1}
+    g.db.flush()
+    reopened = LWWGraph(path)
+    assert reopened.get("a", "likes", "b").ts == 100.0
+    assert len(reopened) == 1
+
+def test_relevant_skips_tombstones_until_revived(tmp_path):
+    import numpy as np
+    encoded = []
+    def encode(texts):
+        encoded.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+    g = LWWGraph(str(tmp_path / "graph.db"))
+    g.upsert("tea", "is", "hot", ts=1.0)
+    g.remove("tea", "is", "hot", ts=2.0)
+    g.upsert("sky", "is", "blue", ts=3.0)
+    q = np.ones(4, dtype=np.float32) / 2
+    assert [r.src for r in g.relevant(q, 5, encode)] == ["sky"]
+    assert encoded == ["sky is blue"]
+    g.upsert("tea", "is", "hot", ts=4.0)
+    assert {r.src for r in g.relevant(q, 5, encode)} == {"sky", "tea"}
+    assert encoded == ["sky is blue", "tea is hot"]
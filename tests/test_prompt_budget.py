@@ -0,0 +1,63 @@
+# tests/test_prompt_budget.py
+from src.core.prompt_budget import PromptBudgeter, Section
+
+def _chars(text, n, keep):
+    return text[:n] if keep == "head" else text[len(text) - n:]
+
+def _budgeter(budget, **kw):
+    # One token per character keeps the arithmetic readable.
+    return PromptBudgeter(budget, count_tokens=len, truncate=_chars, margin=0, **kw)
+
+def _sections(min_tokens=10):
+    return [Section("system", "s" * 100),
+            Section("history", "h" * 100, priority=1, keep="tail", min_tokens=min_tokens),
+            Section("context", "c" * 100, priority=2, min_tokens=min_tokens)]
+
+def test_fits_unchanged_when_under_budget():
+    prompt, report = _budgeter(1000).fit(_sections())
+    assert prompt == "\n\n".join(["s" * 100, "h" * 100, "c" * 100])
+    assert report.cuts == [] and report.used == 304 and not report.over_budget
+
+def test_highest_priority_number_is_cut_first():
+    prompt, report = _budgeter(250).fit(_sections())
+    assert report.cuts == [("context", 100, 46)]
+    assert report.used == 250 and not report.over_budget
+    assert prompt.endswith("\n\n" + "c" * 46)
+
+def test_cuts_cascade_to_the_next_priority():
+    prompt, report = _budgeter(150).fit(_sections())
+    assert report.cuts == [("context", 100, 0), ("history", 100, 46)]
+    assert report.dropped == ["context"]
+    assert report.used == 148 and "c" not in prompt
+    assert str(report) == "148/150 tokens; context dropped (100), history 100->46"
+
+def test_section_below_min_tokens_is_dropped_with_its_header():
+    sections = _sections(min_tokens=60)
+    sections[2].header = "## Context\n"
+    prompt, report = _budgeter(260).fit(sections)
+    # 46 tokens would be left, under min_tokens: drop it rather than keep a stub.
+    assert report.cuts == [("context", 111, 0)]
+    assert "## Context" not in prompt and report.used == 202
+
+def test_keep_tail_keeps_the_newest_end():
+    history = "".join(f"{i:03d}" for i in range(100))
+    sections = [Section("system", "s" * 50), Section("history", history, priority=1, keep="tail", min_tokens=10)]
+    prompt, report = _budgeter(152).fit(sections)
+    assert report.cuts == [("history", 300, 100)]
+    assert prompt == "s" * 50 + "\n\n" + history[-100:]
+
+def test_priority_zero_is_never_cut_and_reports_over_budget():
+    sections = [Section("system", "s" * 200), Section("query", "q" * 50)]
+    prompt, report = _budgeter(100).fit(sections)
+    assert report.cuts == [] and report.over_budget
+    assert prompt == "s" * 200 + "\n\n" + "q" * 50
+
+def test_stable_sections_use_the_cached_counter():
+    cached = []
+    def count_cached(text):
+        cached.append(text)
+        return len(text)
+    sections = [Section("system", "s" * 100, stable=True), Section("query", "q" * 10)]
+    _, report = _budgeter(1000, count_cached=count_cached).fit(sections)
+    assert "s" * 100 in cached and "q" * 10 not in cached
+    assert report.used == 112
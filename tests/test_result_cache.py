@@ -0,0 +1,19 @@
+# tests/test_result_cache.py
+import asyncio
+from src.tools.result_cache import CachePolicy, ToolResultCache, norm_text
+
+def test_uncacheable_result_is_returned_but_not_stored():
+    policy = CachePolicy(ttl_sec=60, key=(("query", norm_text),), cacheable=lambda r: "[Error" not in r)
+    cache = ToolResultCache({"read": policy})
+    results = iter(["[Error fetching a]", "page a", "unused"])
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        return next(results)
+
+    async def main():
+        return [await cache.run("read", {"query": "A "}, fn) for _ in range(3)]
+
+    assert asyncio.run(main()) == ["[Error fetching a]", "page a", "page a"]
+    assert len(calls) == 2
@@ -0,0 +1,158 @@
+# tests/test_session_exec.py
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("nacl")
+from src.services.session_exec import SessionExec, TokenBucket
+from src.tools.registry_async import ToolView
+
+class _Registry:
+    """Tool calls park until the test releases them."""
+
+    def __init__(self):
+        self.interactive_turns, self.started, self._idle = 0, [], []
+        self._gates = {}
+
+    def on_idle(self, cb): self._idle.append(cb)
+    def list_tools(self): return ["kb_query"]
+    def restricted(self, names): return ToolView(self, names)
+
+    def begin_turn(self): self.interactive_turns += 1
+
+    def end_turn(self):
+        self.interactive_turns -= 1
+        if not self.interactive_turns:
+            for cb in self._idle: cb()
+
+    async def call(self, name, args, session_id=None):
+        tag = args["tag"]
+        self.started.append(tag)
+        self._gates[tag] = gate = asyncio.Event()
+        await gate.wait()
+        return f"done {tag}"
+
+    def finish(self, tag): self._gates[tag].set()
+
+class _Sessions:
+    def __init__(self, peers):
+        self.sessions = {sid: SimpleNamespace(peer_id=p) for sid, p in peers.items()}
+        self.sent = []
+        self.on_session_message = None
+
+    async def send_session(self, sid, msg): self.sent.append((sid, msg))
+
+def _exec(peers, **kw):
+    sm, reg = _Sessions(peers), _Registry()
+    se = SessionExec(sm, **kw)
+    se.register_tools(reg)
+    return se, sm, reg
+
+async def _task(se, sid, tag, rid=None):
+    msg = {"type": "task", "tool": "kb_query", "args": {"tag": tag}}
+    if rid is not None:
+        msg["id"] = rid
+    await se._handle(sid, msg)
+
+async def _settle():
+    for _ in range(5): await asyncio.sleep(0)
+
+def test_token_bucket_refills_at_rate():
+    b = TokenBucket(rate=10.0, burst=2)
+    assert b.take() == 0.0 and b.take() == 0.0
+    wait = b.take()
+    assert 0 < wait <= 0.1
+    b.at -= 0.1  # a tenth of a second later one token is back
+    assert b.take() == 0.0
+
+def test_rate_limited_peer_gets_busy_with_retry_after():
+    async def main():
+        se, sm, reg = _exec({"s1": "A"}, total=8, per_peer=8, rate_per_min=60, burst=2)
+        for i in range(3): await _task(se, "s1", i, rid=f"r{i}")
+        await _settle()
+        assert reg.started == [0, 1]
+        (sid, busy), = sm.sent
+        assert sid == "s1" and busy["id"] == "r2"
+        assert busy["error"] == "busy" and busy["reason"] == "rate" and busy["retry_after"] > 0
+        assert se.stats()["rejected_rate"] == 1
+        for t in (0, 1): reg.finish(t)
+        await _settle()
+    asyncio.run(main())
+
+def test_queue_is_bounded_by_max_queued():
+    async def main():
+        peers = {f"s{i}": f"P{i}" for i in range(5)}
+        se, sm, reg = _exec(peers, total=1, per_peer=1, max_queued=2, burst=5)
+        for i in range(5): await _task(se, f"s{i}", i)
+        await _settle()
+        assert reg.started == [0] and len(se._queue) == 2
+        assert [m["reason"] for _, m in sm.sent] == ["queue", "queue"]
+        # Queued tasks start in arrival order as the slot frees.
+        reg.finish(0); await _settle()
+        assert reg.started == [0, 1]
+        reg.finish(1); await _settle()
+        assert reg.started == [0, 1, 2]
+        reg.finish(2); await _settle()
+        assert se._running == 0 and not se._queue
+        assert se.stats()["max_queue_depth"] == 2
+    asyncio.run(main())
+
+def test_peer_at_its_cap_does_not_hold_up_others():
+    async def main():
+        se, sm, reg = _exec({"s1": "A", "s2": "B"}, total=4, per_peer=2, burst=5)
+        for t in ("a1", "a2", "a3"): await _task(se, "s1", t)
+        await _task(se, "s2", "b1")
+        await _settle()
+        assert reg.started == ["a1", "a2", "b1"]
+        assert se._running_by_peer == {"A": 2, "B": 1}
+        reg.finish("b1"); await _settle()
+        assert "a3" not in reg.started  # B's slot does not lift A's own cap
+        reg.finish("a1"); await _settle()
+        assert reg.started[-1] == "a3"
+        for t in ("a2", "a3"): reg.finish(t)
+        await _settle()
+        assert se._running == 0 and se._running_by_peer == {}
+    asyncio.run(main())
+
+def test_capacity_drops_to_during_turn_while_a_turn_runs():
+    async def main():
+        se, sm, reg = _exec({"s1": "A", "s2": "B"}, total=3, per_peer=3, during_turn=1, burst=5)
+        reg.begin_turn()
+        for t in ("a1", "a2"): await _task(se, "s1", t)
+        await _task(se, "s2", "b1")
+        await _settle()
+        assert reg.started == ["a1"] and se.stats()["capacity"] == 1
+        # A finished task frees only the one slot.
+        reg.finish("a1"); await _settle()
+        assert reg.started == ["a1", "a2"]
+        # The turn ending releases the held-back slots.
+        reg.end_turn(); await _settle()
+        assert reg.started == ["a1", "a2", "b1"] and se.stats()["capacity"] == 3
+        for t in ("a2", "b1"): reg.finish(t)
+        await _settle()
+    asyncio.run(main())
+
+def test_cancel_queued_and_running_tasks():
+    async def main():
+        se, sm, reg = _exec({"s1": "A"}, total=1, per_peer=1, burst=5)
+        for i in range(3): await _task(se, "s1", i, rid=f"r{i}")
+        await _settle()
+        assert reg.started == [0] and len(se._queue) == 2
+
+        # A queued task leaves the queue and never runs.
+        await se._handle("s1", {"type": "cancel", "id": "r1"})
+        await _settle()
+        assert len(se._queue) == 1 and ("s1", "r1") not in se._by_id
+
+        # A running task gives its slot to the next in line.
+        await se._handle("s1", {"type": "cancel", "id": "r0"})
+        await _settle()
+        assert reg.started == [0, 2] and se._running == 1 and not se._queue
+
+        reg.finish(2); await _settle()
+        assert se._running == 0 and not se._tasks
+        assert [m.get("id") for _, m in sm.sent] == ["r2"]
+        # Cancels for unknown or non-string ids are ignored.
+        await se._handle("s1", {"type": "cancel", "id": "r9"})
+        await se._handle("s1", {"type": "cancel", "id": ["r2"]})
+    asyncio.run(main())
@@ -0,0 +1,128 @@
+# tests/test_session_request.py
+import asyncio, json
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("nacl")
+from src.mesh.session import SessionManager
+from src.secure.crypto import b64, b64d
+from src.tools.session_tools import SessionTools
+
+class _Box:
+    """Stands in for the session's nacl Box: plaintext on the wire."""
+    def encrypt(self, data, nonce): return SimpleNamespace(ciphertext=data)
+    def decrypt(self, ct, nonce): return ct
+
+class _P2P:
+    peer_id = "me"
+
+    def __init__(self):
+        self.sent, self.error, self.responder = [], None, None
+
+    def on(self, kind, handler): pass
+    def decrypt_from(self, sender_pub, nonce, ciphertext): return ciphertext
+
+    async def send_encrypted(self, peer, kind, payload):
+        if self.error:
+            return self.error
+        msg = json.loads(b64d(payload["ciphertext_s"]))
+        self.sent.append(msg)
+        if self.responder and (reply := self.responder(msg)) is not None:
+            asyncio.get_running_loop().call_soon(lambda: asyncio.ensure_future(_deliver(self.sm, "s1", reply)))
+
+def _manager():
+    p2p = _P2P()
+    sm = SessionManager(p2p, own_sk=None, contacts_verify=lambda _: None)
+    sm.sessions["s1"] = SimpleNamespace(session_id="s1", peer_id="peer", box=_Box())
+    p2p.sm = sm
+    return sm, p2p
+
+async def _deliver(sm, sid, msg):
+    inner = {"session_id": sid, "nonce_s": b64(b"n"), "ciphertext_s": b64(json.dumps(msg).encode())}
+    await sm._on_session_msg({"sender_pub": "", "nonce": "", "ciphertext": inner})
+
+def test_replies_are_matched_by_id_in_any_order():
+    async def main():
+        sm, p2p = _manager()
+        other = []
+        async def on_msg(sid, msg): other.append(msg)
+        sm.on_session_message = on_msg
+        first = asyncio.ensure_future(sm.request("s1", {"type": "task", "tool": "a"}))
+        second = asyncio.ensure_future(sm.request("s1", {"type": "task", "tool": "b"}))
+        await asyncio.sleep(0)
+        rid_a, rid_b = (m["id"] for m in p2p.sent)
+        assert rid_a != rid_b
+        # Garbage and replies for unknown ids neither raise nor resolve anything.
+        await _deliver(sm, "s1", ["not", "a", "dict"])
+        await _deliver(sm, "s1", {"type": "result", "id": 7, "result": "x"})
+        await _deliver(sm, "s1", {"type": "result", "id": "nope", "result": "x"})
+        await _deliver(sm, "s1", {"type": "result", "id": rid_b, "result": "B"})
+        assert (await second)["result"] == "B" and not first.done()
+        await _deliver(sm, "s1", {"type": "result", "id": rid_a, "result": "A"})
+        assert (await first)["result"] == "A"
+        assert other == [] and sm._calls == {}
+    asyncio.run(main())
+
+def test_timeout_sends_cancel_and_drops_the_late_reply():
+    async def main():
+        sm, p2p = _manager()
+        other = []
+        async def on_msg(sid, msg): other.append(msg)
+        sm.on_session_message = on_msg
+        with pytest.raises(asyncio.TimeoutError):
+            await sm.request("s1", {"type": "task", "tool": "a"}, timeout=0.02)
+        task, cancel = p2p.sent
+        assert cancel == {"type": "cancel", "id": task["id"]}
+        assert sm._calls == {}
+        await _deliver(sm, "s1", {"type": "result", "id": task["id"], "result": "late"})
+        assert other == []
+    asyncio.run(main())
+
+def test_unsent_request_raises_connection_error():
+    async def main():
+        sm, p2p = _manager()
+        p2p.error = "Error: not connected"
+        with pytest.raises(ConnectionError, match="^not connected$"):
+            await sm.request("s1", {"type": "task", "tool": "a"})
+        assert sm._calls == {}
+    asyncio.run(main())
+
+def test_expired_session_fails_pending_calls():
+    async def main():
+        sm, p2p = _manager()
+        pending = asyncio.ensure_future(sm.request("s1", {"type": "task", "tool": "a"}))
+        await asyncio.sleep(0)
+        sm.sessions.pop("s1")
+        sm._fail_calls("s1")
+        with pytest.raises(ConnectionError):
+            await pending
+        assert len(p2p.sent) == 1  # no cancel for a session that is gone
+    asyncio.run(main())
+
+def test_delegate_retries_once_when_peer_is_busy():
+    async def main():
+        sm, p2p = _manager()
+        replies = iter([{"error": "busy", "reason": "rate", "retry_after": 0.01}, {"result": "42"}])
+        p2p.responder = lambda m: {"type": "result", "id": m["id"], **next(replies)}
+        tools = SessionTools(sm, kb=None, timeout=1.0)
+        assert await tools.delegate_in_session({"session_id": "s1", "tool": "kb_query", "args": {}}) == "42"
+        assert len(p2p.sent) == 2
+
+        # Too long a wait is reported instead of retried.
+        p2p.sent.clear()
+        p2p.responder = lambda m: {"type": "result", "id": m["id"], "error": "busy", "retry_after": 60}
+        out = await tools.delegate_in_session({"session_id": "s1", "tool": "kb_query"})
+        assert out == "Error: session peer busy, retry after 60s" and len(p2p.sent) == 1
+    asyncio.run(main())
+
+def test_delegate_reports_timeouts_and_send_errors():
+    async def main():
+        sm, p2p = _manager()
+        tools = SessionTools(sm, kb=None, timeout=0.02)
+        out = await tools.delegate_in_session({"session_id": "s1", "tool": "kb_query"})
+        assert out == "Error: session peer did not answer within 0.02s"
+        assert p2p.sent[-1]["type"] == "cancel"
+        assert await tools.delegate_in_session({"session_id": "s9", "tool": "kb_query"}) == "Error: Unknown session"
+        p2p.error = "Error: not connected"
+        assert await tools.delegate_in_session({"session_id": "s1", "tool": "kb_query"}) == "Error: not connected"
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+# tests/test_turn_recall.py
+import numpy as np
+from src.memory.conversation_store import ConversationMemory
+from src.memory.turn_recall import TurnRecall
+from src.memory.vector_store import LiteVectorStore
+
+class _Encoder:
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def encode(self, texts, normalize_embeddings=True):
+        return np.ones((len(texts), self.dim), dtype=np.float32) / np.sqrt(self.dim)
+
+def test_embedding_model_change_reindexes_turns(tmp_path):
+    mem = ConversationMemory(str(tmp_path / "conv.db"))
+    kb = LiteVectorStore(str(tmp_path / "kb.db"), "stub", encoder=_Encoder(4))
+    for i in range(3):
+        mem.add_message("s", f"q{i}", f"a{i}", "")
+    recall = TurnRecall(mem, kb)
+    assert recall.index_pending() == 3
+
+    kb.model = _Encoder(8)
+    q = kb.embed_query("q1")
+    assert recall.search_vector(q) == []
+    mem.add_message("s", "q3", "a3", "")
+    assert recall.index_pending() == 4
+    assert len(recall.search_vector(q, k=10)) == 4
+    # A fresh instance loads only vectors of the new size.
+    assert len(TurnRecall(mem, kb).search_vector(q, k=10)) == 4